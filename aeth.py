@@ -3,15 +3,81 @@
 #
 # Aethalometer(datafile, model): Object for to contain datafiles (models 'AE33' or 'AE31')
 #                                self.df contains a datetime indexed dataframe.
+#                                fast = True reads with the explicit dtypes and datetime format from MODELS,
+#                                columns = [...] reads only the listed columns.
+#                                Aethalometer.from_files(paths, model, workers) parses several files on a process
+#                                pool and concatenates them once (sorted, overlapping timestamps removed).
 #                                The object returns dataframe subset with the function getSubset(self, start, end),
 #                                where 'start' and 'end' are datetime values 
-# create_plot(y):                function can be used to plot the data
+#                                quality(rules, tape_window) drops the rows flagged by the status columns
+#                                (quality_mask, default rules in MODELS[model]['quality']) in one vectorized pass.
+#                                compact() drops Date/Time, downcasts numeric columns where lossless and moves the raw
+#                                signals to a memory-mapped SignalStore; signal(column) reads any column back.
+#                                recompute(correction, f, k, scattering) replaces BC1-BC7 by values recomputed from the
+#                                raw signals (recompute_bc: attenuation per filter spot, loading_factor) and adds ATN1-7.
+# FileCache(path, max_size):     On-disk cache of parsed datafiles (Feather, or pickle without pyarrow) keyed by
+#                                path, size, mtime, model and reader options, with LRU eviction above max_size bytes.
+#                                Pass it to Aethalometer(datafile, cache = ...) to load files through the cache.
+#                                default_cache_path(data_path): the default path (user cache directory, not DATA_PATH).
+# Profiler(enabled, cprofile, tracemalloc): per-stage wall/CPU time, rows and peak RSS. The module-level 'profiler'
+#                                (disabled: stages cost one attribute check) is used by the readers and the CLI.
+# FileCatalog(path, data_path, file_mask, model):
+#                                Persistent index (model, first/last timestamp, rows, size, mtime) of the datafiles in
+#                                data_path, updated incrementally with os.scandir; files(start, end) returns the files
+#                                covering a time range, newest() the most recent file.
+# read_range(datafile, model, start, end): reads only the lines between start and end (byte range by bisection).
+# create_plot(y):                function can be used to plot the data (defined in aeth_plot.py, loaded on first use)
 #                                (one wavelength, use BC6 for eBC at 880nm)
+#                                outfile = 'plot.png' renders to a file without a display,
+#                                max_points = N decimates the plotted line (see decimate(values, max_points))
 # calculate_intervals_csv(intervalfile, data): calculates the mean BC value
 #                                (all wavelengths) for time intervals
-#                                defined on a intervalfile.
-#                                'data' is an object capable of returning a dataframe subset via self.getSubset() function.
+#                                defined on a intervalfile (unsorted and overlapping intervals allowed),
+#                                plus the number of samples ('count') and 'coverage' fraction per interval.
+#                                'data' is an Aethalometer-like object (self.df, self.BCKeys, self.timebase()).
 #                                The dataframe index musst be a 'Datetime'.
+# def calculate_intervals(data, freq = 'HOURLY', interval = 1, decimals = 0, compat = False, stats = None):
+#                                Calculates the mean of data.BCKeys for back-to-back 'interval' hours, minutes
+#                                or seconds ('HOURLY', 'MINUTELY', 'SECONDLY') in one vectorized pass over data.df.
+#                                compat = True reproduces the window boundaries of the calculate_*_intervals functions.
+#                                stats = ['count', 'mean', 'std', 'min', 'max', 'median', 'p5', ...] returns one
+#                                '<key>_<stat>' column per BC key and statistic instead of the means (window_stats).
+#                                'data' is an object with a 'Datetime' indexed dataframe self.df and a self.BCKeys list.
+# calculate_intervals_incremental(data, store, freq, interval, decimals, compat):
+#                                Same as calculate_intervals, reusing the table saved in an IntervalStore by the
+#                                previous run; only intervals at/after the last saved one or touched by changed
+#                                files (data.sources from Aethalometer.from_files) are recomputed.
+# IntervalAccumulator(keys, freq, interval, decimals):
+#                                Running per-interval sums/counts for data added in time order (chunk by chunk);
+#                                add(df) and flush() return the finished intervals (calculate_intervals format).
+# stream_intervals(paths, model, freq, interval, decimals, chunksize):
+#                                Generator reading the files in chunks and yielding the intervals as they close.
+# follow_intervals(path, catalog, model, freq, interval):
+#                                Generator following a file while it is written (FileFollower reads only the
+#                                appended lines) and yielding the intervals as they close. Continues with newer files.
+# RingBuffer(columns, capacity):  The last 'capacity' records of a live stream in preallocated arrays (append(df),
+#                                records(start, end), frame(start, end)); RingIntervals(buffer, freq, interval) averages
+#                                the IntervalAccumulator windows from the records of the buffer.
+# ingest_intervals(sources, model, freq, interval, reconnect, buffers):
+#                                Async generator reading instrument records sent over TCP by one or more sources
+#                                (ingest_records, RecordParser) and yielding the intervals as they close; the recent
+#                                records of each source are kept in a RingBuffer and averaged from it (RingIntervals).
+# ResultWriter(path, format, units, columns):
+#                                Writes interval tables as they are produced (write(df) chunk by chunk, close()) as
+#                                'csv' (stdout without path), 'csv.gz', 'parquet' or 'feather'; the units go in a header
+#                                row (CSV) or in the file metadata.
+# read_stations(config, names): stations of the [STATION:<name>] sections of the INI-file (model, DATA_PATH, FILE_EXT,
+#                                FREQ, INTERVAL, BCKEY, OUT; GENERAL_SETTINGS for missing keys).
+# run_stations(stations, workers, options): processes stations on a process pool (process_station: newest file or
+#                                --start/--end range, intervals, result file, plot) and yields (station, result, error);
+#                                a failing station does not stop the others. batch_summary(results) prints the timings.
+# render_report(frame, keys, periods, out, labels, workers): create_plot figures of keys x periods (report_periods: days,
+#                                weeks, months) rendered on a process pool, one reused figure per worker, into a
+#                                directory of images or a multi-page PDF.
+# IntervalServer(catalog, model, levels, memory, cache):
+#                                In-memory query engine of --serve: per-file segments (BC columns and the interval sums of
+#                                the LEVELS) in LRU order within 'memory' bytes; refresh() appends new lines, query(start,
+#                                end, freq, interval, keys) merges the precomputed levels. serve_intervals() answers HTTP.
 # def calculate_hourly_intervals(data, interval = 1, decimals = 0):
 #                                Calculate hourly averaging groups, the interval variable sets the number of hours.
 #                                e.g. 1 for each hour, or 4 for every 4 hours.
@@ -29,69 +95,205 @@
 #                                The dataframe index musst be a 'Datetime'.
 
 import configparser, argparse # for argument parsing
-from dateutil.parser import parse
-import sys, time, os, glob
-from dateutil import rrule
+import sys, time, os, fnmatch, hashlib, io, importlib.util, pickle, collections, threading
 from datetime import datetime, timedelta
-import platform
-
-import pandas as pd
-from pandas.plotting import register_matplotlib_converters
-
-import matplotlib.pyplot as plt
-import matplotlib.pyplot as plt
-import matplotlib.dates as mdates
-from matplotlib.ticker import FuncFormatter
-
-def my_date_formater(ax, delta):
-    if delta.days < 3:
-        ax.xaxis.set_major_locator(mdates.DayLocator())
-        ax.xaxis.set_major_formatter(mdates.DateFormatter('%d-%m-%y'))
-        ax.xaxis.set_minor_formatter(mdates.DateFormatter('%H:%M'))
-        ax.xaxis.grid(True, which='minor')
-        ax.tick_params(axis="x", which="major", pad=15)
-        if delta.days < 0.75:
-            ax.xaxis.set_minor_locator(mdates.HourLocator())
-        if delta.days < 1:
-            ax.xaxis.set_minor_locator(mdates.HourLocator((0,3,6,9,12,15,18,21,)))
-        else:
-            ax.xaxis.set_minor_locator(mdates.HourLocator((0,6,12,18,)))
-    elif delta.days < 8:
-        ax.xaxis.set_major_locator(mdates.MonthLocator())
-        ax.xaxis.set_major_formatter(mdates.DateFormatter('%b %Y'))
-        ax.xaxis.set_minor_formatter(mdates.DateFormatter('%a %d'))
-        ax.xaxis.grid(True, which='minor')
-        ax.tick_params(axis="x", which="major", pad=15)
-        ax.xaxis.set_minor_locator(mdates.DayLocator())
-        ax.set(xlabel='date')
-    else:
-        xtick_locator = mdates.AutoDateLocator()
-        xtick_formatter = mdates.AutoDateFormatter(xtick_locator)
-        xtick_formatter.scaled[30.] = FuncFormatter(my_days_format_function)
-        xtick_formatter.scaled[1.] = FuncFormatter(my_days_format_function)
-        ax.xaxis.set_major_locator(xtick_locator)
-        ax.xaxis.set_major_formatter(xtick_formatter)
-        ax.set(xlabel='date')
-
-def my_days_format_function(x, pos=None):
-    dt = mdates.num2date(x)
-    if pos == 0:
-        fmt = '%b %d\n%Y'
-    else:
-        # Use platform-specific day formatting
-        if platform.system() == 'Windows':
-            fmt = '%b %#d'
-        else:
-            fmt = '%b %-d'
-    label = dt.strftime(fmt)
-    return label
-    
+
+class LazyModule(object):
+    # Stand-in for a module that is imported on first attribute access, so that e.g.
+    # 'aeth.py --help' does not load pandas. After the import the module attributes are
+    # copied into the instance, so later lookups cost the same as on the module itself.
+    def __init__(self, name):
+        self.__dict__['_LazyModule__name'] = name
+
+    def __getattr__(self, attr):
+        module = importlib.import_module(self.__name)
+        self.__dict__.update(module.__dict__)
+        return getattr(module, attr)
+
+np = LazyModule('numpy')
+pd = LazyModule('pandas')
+
+PLOT_FUNCTIONS = ('create_plot', 'decimate', 'my_date_formater', 'my_days_format_function', 'pyplot', 'plot_axes',
+                  'draw_plot', 'plot_figure')
+
+def __getattr__(name):
+    # The plotting functions live in aeth_plot, which is only imported when they are used
+    if name in PLOT_FUNCTIONS:
+        import aeth_plot
+        return getattr(aeth_plot, name)
+    raise AttributeError("module 'aeth' has no attribute '{}'".format(name))
+
+class ProfileStage(object):
+    # One timed stage of a Profiler (see Profiler.stage); set 'rows' inside the with block
+    def __init__(self, profiler, name, rows = None):
+        self.profiler = profiler
+        self.name = name
+        self.rows = rows
+        self.dump = None
+
+    def __enter__(self):
+        if self.name == self.profiler.dump_stage:
+            self.dump = self.profiler.start_dump()
+        times = os.times()
+        self.cpu = times[0] + times[1] + times[2] + times[3]     # children: pool workers
+        self.wall = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        wall = time.perf_counter() - self.wall
+        times = os.times()
+        cpu = times[0] + times[1] + times[2] + times[3] - self.cpu
+        if self.dump:
+            self.profiler.stop_dump(self.dump)
+        self.profiler.stages.append({'stage': self.name, 'wall': wall, 'cpu': cpu,
+                                     'rows': self.rows, 'rss': self.profiler.rss()})
+        return False
+
+class NoProfileStage(object):
+    # Shared stage of a disabled Profiler: does nothing
+    rows = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+NO_PROFILE_STAGE = NoProfileStage()
+
+class Profiler(object):
+    # Records wall time, CPU time (including finished child processes), rows and peak RSS of
+    # the stages of a run:
+    #     with profiler.stage('intervals') as stage:
+    #         ...
+    #         stage.rows = len(df)
+    # A disabled profiler returns a shared no-op stage. The stage named dump_stage can be
+    # run under cProfile (stats saved to 'cprofile') and/or tracemalloc (top allocations
+    # written to 'tracemalloc').
+    def __init__(self, enabled = True, cprofile = None, tracemalloc = None, dump_stage = 'intervals'):
+        self.enabled = enabled
+        self.cprofile = cprofile
+        self.tracemalloc = tracemalloc
+        self.dump_stage = dump_stage
+        self.stages = []
+        self.start = time.perf_counter()
+
+    def stage(self, name, rows = None):
+        if not self.enabled:
+            return NO_PROFILE_STAGE
+        return ProfileStage(self, name, rows)
+
+    def rss(self):
+        # Peak resident set size of the process so far in bytes (None if unknown)
+        try:
+            import resource
+        except ImportError:
+            return None
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return maxrss if sys.platform == 'darwin' else maxrss * 1024
+
+    def start_dump(self):
+        dump = {}
+        if self.tracemalloc:
+            import tracemalloc
+            tracemalloc.start()
+            dump['tracemalloc'] = tracemalloc
+        if self.cprofile:
+            import cProfile
+            dump['cprofile'] = cProfile.Profile()
+            dump['cprofile'].enable()
+        return dump
+
+    def stop_dump(self, dump):
+        if 'cprofile' in dump:
+            dump['cprofile'].disable()
+            dump['cprofile'].dump_stats(self.cprofile)
+        if 'tracemalloc' in dump:
+            tracemalloc = dump['tracemalloc']
+            snapshot = tracemalloc.take_snapshot().filter_traces([
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, '*/cProfile.py'), tracemalloc.Filter(False, '*/profile.py')])
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            with open(self.tracemalloc, 'w') as f:
+                f.write('{0}: peak {1:.1f} MB traced\n'.format(self.dump_stage, peak/2**20))
+                for line in snapshot.statistics('lineno')[:25]:
+                    f.write(str(line) + '\n')
+
+    def summary(self):
+        # Stages aggregated by name, in order of first use, plus the total run time
+        rows = {}
+        for entry in self.stages:
+            row = rows.setdefault(entry['stage'], {'stage': entry['stage'], 'calls': 0, 'wall': 0.0,
+                                                    'cpu': 0.0, 'rows': None, 'rss': None})
+            row['calls'] += 1
+            row['wall'] += entry['wall']
+            row['cpu'] += entry['cpu']
+            if entry['rows'] is not None:
+                row['rows'] = (row['rows'] or 0) + entry['rows']
+            if entry['rss'] is not None:
+                row['rss'] = max(row['rss'] or 0, entry['rss'])
+        return list(rows.values()), time.perf_counter() - self.start
+
+    def report(self, out = sys.stderr):
+        rows, total = self.summary()
+        out.write('{0:<14}{1:>6}{2:>10}{3:>10}{4:>12}{5:>12}{6:>10}\n'.format(
+            'stage', 'calls', 'wall [s]', 'cpu [s]', 'rows', 'rows/s', 'RSS [MB]'))
+        for row in rows:
+            rate = row['rows'] / row['wall'] if row['rows'] and row['wall'] > 0 else None
+            out.write('{0:<14}{1:>6}{2:>10.3f}{3:>10.3f}{4:>12}{5:>12}{6:>10}\n'.format(
+                row['stage'], row['calls'], row['wall'], row['cpu'],
+                '-' if row['rows'] is None else row['rows'],
+                '-' if rate is None else '{:.0f}'.format(rate),
+                '-' if row['rss'] is None else '{:.0f}'.format(row['rss']/2**20)))
+        out.write('{0:<14}{1:>6}{2:>10.3f}\n'.format('total', '', total))
+
+    def save(self, path):
+        import json
+        rows, total = self.summary()
+        with open(path, 'w') as f:
+            json.dump({'argv': sys.argv, 'total': total, 'summary': rows, 'stages': self.stages}, f, indent=2)
+
+profiler = Profiler(enabled = False)    # enabled by --profile, or by setting aeth.profiler
+
 def check_positive(value):
     ivalue = int(value)
     if ivalue <= 0:
         raise argparse.ArgumentTypeError("%s is an invalid positive int value" % value)
     return ivalue
 
+def check_file(value):
+    # A datafile path, or '-' for stdin (pipes and devices are read without the cache)
+    if value != '-' and (not os.path.exists(value) or os.path.isdir(value)):
+        raise argparse.ArgumentTypeError("can't open '%s': no such file" % value)
+    return value
+
+def regular_file(path):
+    # True for the path of a regular file, False for '-' (stdin), pipes and devices
+    return isinstance(path, str) and path != '-' and os.path.isfile(path)
+
+def check_rule(value):
+    # COLUMN=BITS quality rule, e.g. Status=0x3 or LedStatus=0
+    column, sep, bits = value.partition('=')
+    try:
+        return column.strip(), int(bits, 0)
+    except ValueError:
+        raise argparse.ArgumentTypeError("%s is not a COLUMN=BITS rule (e.g. Status=0x3)" % value)
+
+def check_source(value):
+    # HOST:PORT of a TCP data source
+    host, sep, port = value.rpartition(':')
+    try:
+        return host or 'localhost', int(port)
+    except ValueError:
+        raise argparse.ArgumentTypeError("%s is not a HOST:PORT address" % value)
+
+def check_datetime(value):
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError("%s is not a valid date/time (e.g. '2018-02-27 13:00')" % value)
+
 def hour_rounder(t):
     # Rounds to nearest hour by adding a timedelta hour if minute >= 30
     return (t.replace(second=0, microsecond=0, minute=0, hour=t.hour)
@@ -102,269 +304,1719 @@ def minute_rounder(t):
     return (t.replace(second=0, microsecond=0, minute=t.minute, hour=t.hour)
                +timedelta(minutes=t.second//30))
 
-def create_plot(y, x=None, yunits='ng/m$^3$', title="Aethalometer", ytitle='eBC'):
-    plt.style.use('ggplot')
-    register_matplotlib_converters()
-    
-    # definitions for the axes
-    left, width = 0.1, 0.7
-    bottom, height = 0.15, 0.75
-    spacing = 0.005
-    box_width = 1 - (1.5*left + width + spacing)
-
-    rect_scatter = [left, bottom, width, height]
-    rect_box = [left + width + spacing, bottom, box_width, height]
-
-    # start with a rectangular Figure
-    box = plt.figure("boxplot", figsize=(12, 6))
-
-    ax_scatter = plt.axes(rect_scatter)
-    ax_scatter.tick_params(direction='in', top=True, right=True)
-    ax_box = plt.axes(rect_box)
-    ax_box.tick_params(direction='in', labelleft=False, labelbottom=False)
-
-    # the scatter plot:
-    if x==None:
-        ax_scatter.plot(y) # change plot type to scatter to have markers
-        tdelta = y.index.max() - y.index.min()
-    else:
-        ax_scatter.plot(x, y) # change plot type to scatter to have markers
-        tdelta = x.max() - x.min()
-    ax_scatter.set(xlabel='date', ylabel=ytitle + ' (' + yunits + ')', title=title)
-    my_date_formater(ax_scatter, tdelta)
-
-    # now determine nice limits by hand:
-    binwidth = 0.25
-    lim0 = y.min()
-    lim1 = y.max()
-    if x==None:
-        tlim0 = y.index.min()
-        tlim1 = y.index.max()
-    else:
-        tlim0 = x.min()
-        tlim1 = x.max()
-    extra_space = (lim1 - lim0)/10
-    extra_t = (tlim1 - tlim0)/10
-    ax_scatter.set_xlim((tlim0-extra_t, tlim1+extra_t))
-    ax_scatter.set_ylim((lim0-extra_space, lim1+extra_space))
-
-    meanpointprops = dict(marker='D')
-    ax_box.boxplot(y.dropna(), showmeans=True, meanprops=meanpointprops)
-    ax_box.set_ylim(ax_scatter.get_ylim())
-    mu = y.mean()
-    sigma = y.std()
-    text = r'$\mu={0:.2f},\ \sigma={1:.3f}$'.format(mu, sigma)
-    ax_box.text(1, lim1 + extra_space/2, text, horizontalalignment="center", verticalalignment="center")
-    
-    plt.show()
-    plt.close()
-
-def calculate_intervals_csv(intervalfile, data, decimals = 0):
+def calculate_intervals_csv(intervalfile, data, decimals = 0, stats = None):
+    # Intervals may be unsorted and overlapping; both 'start' and 'end' are included.
+    # Adds the number of samples ('count') and the fraction of the interval covered by
+    # them ('coverage', based on the instrument timebase) to each interval, and the number of
+    # rows dropped by data.quality() ('rejected') if it was applied.
+    # stats = ['mean', 'p95', ...] returns '<key>_<stat>' columns instead of the means
+    # (see window_stats).
     df = pd.read_csv(intervalfile,
                      index_col = False,
                      parse_dates=['start','end'])
-    for index, row in df.iterrows():
-        subset = data.getSubset(row['start'], row['end'])
-        for key, value in subset.mean().round(decimals).items():
-            df.loc[index, key] = value
+    df['start'] = pd.to_datetime(df['start'])
+    df['end'] = pd.to_datetime(df['end'])
+    valid = (df['start'].notna() & df['end'].notna()).to_numpy()
+    starts = df['start'].where(valid, df['end'])
+    ends = df['end'].where(valid, df['start'])
+
+    data_df = data.df
+    if not data_df.index.is_monotonic_increasing:
+        data_df = data_df.sort_index()
+    if stats:
+        means = window_stats(data_df, data.BCKeys, starts, ends, stats, closed = 'both', decimals = decimals)
+    else:
+        means = window_means(data_df, data.BCKeys, starts, ends, closed = 'both', decimals = decimals)
+    lo, hi = window_bounds(data_df.index, starts, ends, closed = 'both')
+    count = np.where(valid, hi - lo, 0)
+    for key in means.columns:
+        df[key] = np.where(valid, means[key].to_numpy(), 0 if key.endswith('_count') else np.nan)
+    df['count'] = count
+
+    expected = (ends - starts).dt.total_seconds().to_numpy() / data.timebase()
+    with np.errstate(invalid='ignore', divide='ignore'):
+        coverage = np.where(expected > 0, np.minimum(count / expected, 1), np.nan)
+    df['coverage'] = np.where(valid, coverage, np.nan).round(3)
+    rejected = rejected_counts(data, starts, ends)
+    if rejected is not None:
+        df['rejected'] = np.where(valid, rejected, 0)
     df = df.set_index('end')
     return df
 
+FREQUENCIES = {
+    'HOURLY':   'h',
+    'MINUTELY': 'min',
+    'SECONDLY': 's'
+    }
+
+# interval boundaries of the command line (BOUNDARIES of the INI-file, --compat/--aligned):
+# 'COMPAT' (calculate_intervals(compat = True), as earlier versions) or 'ALIGNED'
+BOUNDARIES = ['COMPAT', 'ALIGNED']
+
+def window_bounds(index, starts, ends, closed='both'):
+    # Row positions [lo, hi) of each [start, end] window in the sorted 'index', found with
+    # one binary search per window boundary. Windows may overlap and need not be sorted.
+    # closed='both' includes samples at 'end' (as DataFrame.loc slicing does),
+    # closed='left' excludes them.
+    index = np.asarray(index, dtype='datetime64[ns]')
+    starts = np.asarray(starts, dtype='datetime64[ns]')
+    ends = np.asarray(ends, dtype='datetime64[ns]')
+    lo = np.searchsorted(index, starts, side='left')
+    hi = np.searchsorted(index, ends, side='right' if closed == 'both' else 'left')
+    return lo, np.maximum(hi, lo)
+
+def window_sums(index, values, starts, ends, closed='both'):
+    # Sums and non-NaN counts of 'values' (2d array, rows sorted along 'index') for each
+    # window, computed from cumulative sums over the data: O(N + M) for N rows and M windows.
+    lo, hi = window_bounds(index, starts, ends, closed)
+
+    values = np.asarray(values, dtype='float64')
+    valid = ~np.isnan(values)
+    csum = np.zeros((len(values) + 1, values.shape[1]))
+    np.cumsum(np.where(valid, values, 0), axis=0, out=csum[1:])
+    ccount = np.zeros((len(values) + 1, values.shape[1]), dtype='int64')
+    np.cumsum(valid, axis=0, out=ccount[1:])
+    return csum[hi] - csum[lo], ccount[hi] - ccount[lo]
+
+def window_means(df, keys, starts, ends, closed='both', decimals=0):
+    # Mean of the 'keys' columns of a Datetime indexed dataframe for each [start, end]
+    # window, returned as a DataFrame with one row per window
+    if not df.index.is_monotonic_increasing:
+        df = df.sort_index()
+    sums, counts = window_sums(df.index, df[keys].to_numpy(), starts, ends, closed)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = np.where(counts > 0, sums / counts, np.nan)
+    return pd.DataFrame(means, columns=keys).round(decimals)
+
+STATISTICS = ['count', 'mean', 'std', 'min', 'max', 'median']     # and percentiles 'p5', 'p95', ...
+
+def stat_quantile(stat):
+    # Quantile (0-1) of a 'median' or 'pN' statistic, None for the other statistics
+    if stat == 'median':
+        return 0.5
+    if stat.startswith('p'):
+        return float(stat[1:]) / 100
+    return None
+
+def check_stats(value):
+    stats = [stat.strip().lower() for stat in value.split(',') if stat.strip()]
+    for stat in stats:
+        try:
+            valid = stat in STATISTICS or 0 <= stat_quantile(stat) <= 1
+        except (TypeError, ValueError):
+            valid = False
+        if not valid:
+            raise argparse.ArgumentTypeError("%s is not a statistic (use %s or p0 to p100)"
+                                             % (stat, ", ".join(STATISTICS)))
+    if not stats:
+        raise argparse.ArgumentTypeError("no statistics given")
+    return stats
+
+def column_unit(units, column):
+    # Unit of an output column: '<key>_<stat>' columns have the unit of the key, counts none
+    if column in units:
+        return units[column]
+    key, sep, stat = column.rpartition('_')
+    if sep and stat != 'count':
+        return units.get(key, '-')
+    return '-'
+
+def window_quantiles(values, lo, n, quantiles, max_rows = 10000000):
+    # Exact quantiles (linear interpolation, as pandas) of the windows values[lo:lo+n] (2d array,
+    # one column per key). The windows are expanded to one row per sample (np.repeat) and
+    # sorted at once per key, as integers: window number * (N + 1) + rank of the value in the
+    # data. To bound the memory, consecutive windows are expanded in batches of at most
+    # max_rows samples (a longer window in a batch of its own).
+    result = np.full((len(quantiles), len(n), values.shape[1]), np.nan)
+    total = np.zeros(len(n) + 1, dtype='int64')
+    np.cumsum(n, out=total[1:])
+    batches = [0]
+    while batches[-1] < len(n):
+        stop = np.searchsorted(total, total[batches[-1]] + max_rows, side='right') - 1
+        batches.append(max(int(stop), batches[-1] + 1))
+    span = len(values) + 1
+    for column in range(values.shape[1]):
+        order = np.argsort(values[:, column], kind='stable')    # NaN last
+        ordered = values[order, column]
+        finite = np.count_nonzero(~np.isnan(ordered))
+        rank = np.empty(len(values), dtype='int64')
+        rank[order] = np.arange(len(values))
+        for a, b in zip(batches[:-1], batches[1:]):
+            m = n[a:b]
+            offsets = total[a:b + 1] - total[a]
+            ids = np.repeat(np.arange(b - a), m)
+            key = rank[lo[a:b][ids] + np.arange(offsets[-1]) - offsets[ids]]
+            valid = np.bincount(ids, weights=key < finite, minlength=b - a).astype('int64')
+            key += ids * span
+            key.sort()
+            v = ordered[key % span]           # sorted within each window, NaN last
+            has = valid > 0
+            first = offsets[:-1][has]
+            for i, q in enumerate(quantiles):
+                p = q * (valid[has] - 1)
+                below = np.floor(p).astype('int64')
+                above = np.minimum(below + 1, valid[has] - 1)
+                result[i, a + np.flatnonzero(has), column] = (v[first + below]
+                                                              + (p - below) * (v[first + above] - v[first + below]))
+    return result
+
+def window_stats(df, keys, starts, ends, stats = ('mean',), closed = 'both', decimals = 0, max_rows = 10000000):
+    # Statistics ('count', 'mean', 'std', 'min', 'max', 'median' and percentiles 'p5', 'p95', ...)
+    # of the 'keys' columns for each [start, end] window, returned as a DataFrame with one
+    # '<key>_<stat>' column per key and statistic. count, mean and std come from cumulative
+    # sums, min and max from one np.fmin/np.fmax.reduceat over the windows ordered by start,
+    # exact quantiles from window_quantiles (windows expanded max_rows samples at a time).
+    if not df.index.is_monotonic_increasing:
+        df = df.sort_index()
+    values = df[keys].to_numpy(dtype='float64')
+    lo, hi = window_bounds(df.index, starts, ends, closed)
+    n = hi - lo
+    # std from the squared deviations to the column means (less cancellation)
+    center = df[keys].mean().fillna(0).to_numpy()
+    sums, counts = window_sums(df.index, np.hstack([values, (values - center)**2]), starts, ends, closed)
+    width = len(keys)
+    sums, squares, counts = sums[:, :width], sums[:, width:], counts[:, :width]
+    table = {}
+    with np.errstate(invalid='ignore', divide='ignore'):
+        table['count'] = counts
+        table['mean'] = np.where(counts > 0, sums / counts, np.nan)
+        deviation = sums - counts * center
+        table['std'] = np.where(counts > 1, np.sqrt(np.maximum(
+            squares - deviation * deviation / counts, 0) / (counts - 1)), np.nan)
+    if 'min' in stats or 'max' in stats:
+        # windows in descending start order: each reduceat segment between two windows
+        # [hi_i, lo_i+1) is then empty
+        order = np.argsort(-lo, kind='stable')
+        indices = np.empty(2 * len(order), dtype='int64')
+        indices[0::2], indices[1::2] = lo[order], hi[order]
+        padded = np.vstack([values, np.full((1, width), np.nan)])
+        for stat, ufunc in [('min', np.fmin), ('max', np.fmax)]:
+            if stat in stats:
+                table[stat] = np.full((len(lo), width), np.nan)
+                if len(order):
+                    reduced = ufunc.reduceat(padded, indices, axis=0)[0::2]
+                    table[stat][order] = np.where((n[order] > 0)[:, None], reduced, np.nan)
+    quantiles = [stat for stat in stats if stat_quantile(stat) is not None]
+    if quantiles:
+        result = window_quantiles(values, lo, n, [stat_quantile(stat) for stat in quantiles], max_rows)
+        for stat, q in zip(quantiles, result):
+            table[stat] = q
+    columns = {}
+    for k, key in enumerate(keys):
+        for stat in stats:
+            column = table[stat][:, k]
+            columns['{}_{}'.format(key, stat)] = column if stat == 'count' else column.round(decimals)
+    return pd.DataFrame(columns)
+
+def interval_windows(first, last, freq = 'HOURLY', interval = 1, compat = False):
+    # Returns (starts, ends, closed) of the averaging windows covering first..last.
+    # compat=False: back-to-back windows of 'interval' hours, minutes or seconds,
+    #               aligned to midnight of the first day, end excluded.
+    # compat=True:  the boundaries of the original per-interval loops: a window starts every
+    #               'interval' units from the rounded first timestamp, each window is one
+    #               hour (HOURLY) or one minute (MINUTELY, SECONDLY) long, end included.
+    unit = FREQUENCIES[freq]
+    step = pd.Timedelta(interval, unit=unit)
+    if compat:
+        if freq == 'HOURLY':
+            width = pd.Timedelta(hours=1)
+            tmin = hour_rounder(first)
+            tmax = hour_rounder(last) - width
+        else:
+            width = pd.Timedelta(minutes=1)
+            tmin = minute_rounder(first)
+            tmax = minute_rounder(last) - width
+        starts = pd.date_range(tmin, tmax, freq=step) if tmin <= tmax else pd.DatetimeIndex([])
+        return starts, starts + width, 'both'
+    origin = first.floor('D')
+    nmin = (first - origin) // step
+    nmax = (last - origin) // step
+    starts = origin + step * np.arange(nmin, nmax + 1)
+    return pd.DatetimeIndex(starts), pd.DatetimeIndex(starts + step), 'left'
+
+def window_start(t, freq = 'HOURLY', interval = 1, compat = False):
+    # Time to read data from so that the window of calculate_intervals containing t is complete:
+    # the hour (HOURLY) or minute (MINUTELY, SECONDLY) of t with compat=True (windows start at the
+    # rounded first sample), otherwise the start of the aligned window containing t
+    t = pd.Timestamp(t)
+    if compat:
+        return t.floor('h' if freq == 'HOURLY' else 'min').to_pydatetime()
+    step = pd.Timedelta(interval, unit=FREQUENCIES[freq])
+    origin = t.floor('D')
+    return (origin + (t - origin) // step * step).to_pydatetime()
+
+def interval_grid(df, freq = 'HOURLY', interval = 1, compat = False):
+    # Windows of calculate_intervals for the sorted dataframe df
+    if df.empty:
+        return pd.DatetimeIndex([]), pd.DatetimeIndex([]), 'left'
+    return interval_windows(df.first_valid_index(), df.last_valid_index(),
+                            freq = freq, interval = interval, compat = compat)
+
+def rejected_counts(data, starts, ends, closed = 'both'):
+    # Number of rows dropped by data.quality() in each window, None if it was not applied
+    rejected = getattr(data, 'rejected', None)
+    if rejected is None:
+        return None
+    lo, hi = window_bounds(rejected, starts, ends, closed)
+    return hi - lo
+
+def interval_table(starts, ends, means):
+    # calculate_intervals output format: 'start' and the means, indexed by 'end'
+    means.insert(0, 'start', starts)
+    means.index = pd.DatetimeIndex(ends, name='end')
+    return means
+
+def calculate_intervals(data, freq = 'HOURLY', interval = 1, decimals = 0, compat = False, stats = None):
+    df = data.df
+    if not df.index.is_monotonic_increasing:
+        df = df.sort_index()
+    starts, ends, closed = interval_grid(df, freq, interval, compat)
+    if stats:
+        means = window_stats(df, data.BCKeys, starts, ends, stats, closed = closed, decimals = decimals)
+    else:
+        means = window_means(df, data.BCKeys, starts, ends, closed = closed, decimals = decimals)
+    rejected = rejected_counts(data, starts, ends, closed)
+    if rejected is not None:
+        means['rejected'] = rejected
+    return interval_table(starts, ends, means)
+
+class IntervalStore(object):
+    # Keeps the interval tables of previous runs on disk, one entry per model, BC keys, freq,
+    # interval length, decimals, compat setting and data.options (reader options, quality
+    # rules, recompute options), together with the data.sources they were computed from
+    # (see calculate_intervals_incremental).
+    def __init__(self, path):
+        self.path = path
+
+    def key(self, data, freq, interval, decimals, compat):
+        options = repr(sorted(getattr(data, 'options', {}).items()))
+        text = '|'.join([data.model, ','.join(data.BCKeys), freq, str(interval), str(decimals), str(compat),
+                         options])
+        return hashlib.sha1(text.encode()).hexdigest()
+
+    def load(self, key):
+        entry = os.path.join(self.path, key + '.pkl')
+        try:
+            state = pd.read_pickle(entry)
+            return state['table'], state['sources']
+        except Exception:
+            return None, {}
+
+    def save(self, key, table, sources):
+        try:
+            os.makedirs(self.path, exist_ok=True)
+            entry = os.path.join(self.path, key + '.pkl')
+            tmp = entry + '.tmp{}'.format(os.getpid())
+            pd.to_pickle({'table': table, 'sources': sources}, tmp)
+            os.replace(tmp, entry)
+        except OSError as e:
+            print('could not save intervals to {0}: {1}'.format(self.path, e), file=sys.stderr)
+
+def changed_ranges(previous, current):
+    # (first, last) time ranges of the data that changed between two data.sources lists
+    # (given as dictionaries by path). A file that grew without changing its first timestamp
+    # is treated as appended to: only the range after its previous last timestamp changed.
+    ranges = []
+    for path, new in current.items():
+        old = previous.get(path)
+        if old is None:
+            ranges.append((new['first'], new['last']))
+        elif new['size'] is None or (old['size'], old['mtime']) != (new['size'], new['mtime']):
+            # (no size: stdin or a pipe, always changed)
+            if new['size'] is not None and old['first'] is not None and new['first'] == old['first'] and new['size'] > old['size']:
+                ranges.append((old['last'], new['last']))
+            else:
+                firsts = [x for x in (old['first'], new['first']) if x is not None]
+                lasts = [x for x in (old['last'], new['last']) if x is not None]
+                if firsts:
+                    ranges.append((min(firsts), max(lasts)))
+    for path, old in previous.items():
+        if path not in current:
+            ranges.append((old['first'], old['last']))
+    return [(first, last) for first, last in ranges if first is not None]
+
+def calculate_intervals_incremental(data, store, freq = 'HOURLY', interval = 1, decimals = 0, compat = False):
+    # Same result as calculate_intervals, but reuses the table saved by the previous run in
+    # 'store' (an IntervalStore): only the last saved interval, the intervals after it and
+    # the intervals overlapping changed files (data.sources) are recomputed. Everything is
+    # recomputed if the window grid changed (e.g. earlier data was added).
+    df = data.df
+    if not df.index.is_monotonic_increasing:
+        df = df.sort_index()
+    starts, ends, closed = interval_grid(df, freq, interval, compat)
+    key = store.key(data, freq, interval, decimals, compat)
+    table, sources = store.load(key)
+    current = {source['path']: source for source in data.sources}
+
+    recompute = np.ones(len(starts), dtype=bool)
+    values = np.full((len(starts), len(data.BCKeys)), np.nan)
+    if (table is not None and current and len(table) and len(starts)
+        and table['start'].iloc[0] == starts[0] and list(table.columns[1:]) == data.BCKeys):
+        n = min(len(table) - 1, len(starts))
+        if (table['start'].iloc[:n].to_numpy(dtype='datetime64[ns]') == starts[:n].to_numpy(dtype='datetime64[ns]')).all():
+            recompute[:n] = False
+            values[:n] = table[data.BCKeys].to_numpy(dtype='float64')[:n]
+            for first, last in changed_ranges(sources, current):
+                recompute |= (starts <= last) & (ends >= first)
+    todo = np.flatnonzero(recompute)
+    if len(todo):
+        values[todo] = window_means(df, data.BCKeys, starts[todo], ends[todo],
+                                    closed = closed, decimals = decimals).to_numpy()
+    print('incremental: {0} of {1} intervals recomputed'.format(len(todo), len(starts)), file=sys.stderr)
+
+    result = interval_table(starts, ends, pd.DataFrame(values, columns = data.BCKeys))
+    store.save(key, result, current)
+    return result
+
+class IntervalAccumulator(object):
+    # Running per-interval sums and counts of the 'keys' columns for back-to-back windows of
+    # 'interval' hours, minutes or seconds aligned to midnight of the first sample (the
+    # windows of calculate_intervals(compat = False)). Data must be added in time order;
+    # samples not later than the last one added (e.g. overlapping files) are dropped.
+    # add() and flush() return the finished intervals in the calculate_intervals format.
+    def __init__(self, keys, freq = 'HOURLY', interval = 1, decimals = 0):
+        self.keys = list(keys)
+        self.step = pd.Timedelta(interval, unit = FREQUENCIES[freq]).value   # in ns
+        self.decimals = decimals
+        self.origin = None      # midnight of the first sample, in ns
+        self.last = np.iinfo('int64').min
+        self.next = None        # number of the first interval not returned yet
+        self.bin = None         # number of the open interval
+        self.sums = None
+        self.counts = None
+        self.dropped = 0
+
+    def add(self, df):
+        if df.empty:
+            return self.rows(np.array([], dtype='int64'), None, None, self.next or 0)
+        t = np.asarray(df.index, dtype='datetime64[ns]').view('int64')
+        previous = np.maximum.accumulate(np.concatenate(([self.last], t[:-1])))
+        keep = t > previous
+        if not keep.all():
+            self.dropped += int((~keep).sum())
+            t = t[keep]
+            df = df[keep]
+            if not len(t):
+                return self.rows(np.array([], dtype='int64'), None, None, self.next or 0)
+        self.last = t[-1]
+        if self.origin is None:
+            self.origin = pd.Timestamp(t[0]).floor('D').value
+            self.next = (t[0] - self.origin) // self.step
+
+        values = df[self.keys].to_numpy(dtype='float64')
+        valid = ~np.isnan(values)
+        bins = (t - self.origin) // self.step
+        first = np.concatenate(([0], np.flatnonzero(np.diff(bins)) + 1))
+        numbers = bins[first]
+        sums = np.add.reduceat(np.where(valid, values, 0), first, axis=0)
+        counts = np.add.reduceat(valid.astype('int64'), first, axis=0)
+        if self.bin is not None:
+            if numbers[0] == self.bin:
+                sums[0] += self.sums
+                counts[0] += self.counts
+            else:
+                numbers = np.concatenate(([self.bin], numbers))
+                sums = np.vstack((self.sums, sums))
+                counts = np.vstack((self.counts, counts))
+        # the last interval stays open until a later sample arrives
+        self.bin, self.sums, self.counts = numbers[-1], sums[-1], counts[-1]
+        return self.rows(numbers[:-1], sums[:-1], counts[:-1], self.bin)
+
+    def flush(self):
+        # Returns the open interval (if any) as finished
+        if self.bin is None:
+            return self.rows(np.array([], dtype='int64'), None, None, self.next or 0)
+        rows = self.rows(np.array([self.bin]), self.sums[None, :], self.counts[None, :], self.bin + 1)
+        self.bin = self.sums = self.counts = None
+        return rows
+
+    def rows(self, numbers, sums, counts, stop):
+        # Intervals self.next ... stop - 1, empty intervals are returned as NaN
+        start = self.next if self.next is not None else stop
+        means = np.full((max(stop - start, 0), len(self.keys)), np.nan)
+        if len(numbers):
+            with np.errstate(invalid='ignore', divide='ignore'):
+                means[numbers - start] = np.where(counts > 0, sums / counts, np.nan)
+        starts = pd.DatetimeIndex(((self.origin or 0) + self.step * np.arange(start, stop)).astype('datetime64[ns]'))
+        df = pd.DataFrame(means, columns = self.keys).round(self.decimals)
+        df.insert(0, 'start', starts)
+        df.index = pd.DatetimeIndex(starts + pd.Timedelta(self.step), name = 'end')
+        self.next = max(start, stop)
+        return df
+
+def stream_intervals(paths, model = 'AE33', freq = 'HOURLY', interval = 1, decimals = 0,
+                     chunksize = 100000, keys = None, **options):
+    # Reads the files (in time order) in chunks of 'chunksize' rows and yields the finished
+    # intervals (see IntervalAccumulator) as soon as they close. Memory use is bounded by the
+    # chunk size. 'options' are passed to iter_datafile.
+    if keys is None:
+        keys = Aethalometer(model = model).BCKeys
+    accumulator = IntervalAccumulator(keys, freq, interval, decimals)
+    for path in paths:
+        for chunk in iter_datafile(path, model, chunksize = chunksize, **options):
+            rows = accumulator.add(chunk)
+            if len(rows):
+                yield rows
+    rows = accumulator.flush()
+    if len(rows):
+        yield rows
+    if accumulator.dropped:
+        print('{0} samples dropped (not later than the previous sample)'.format(accumulator.dropped), file=sys.stderr)
+
+class FileFollower(object):
+    # Returns the complete lines appended to a growing datafile since the previous read(),
+    # parsed into a 'Datetime' indexed dataframe. Only the new bytes are read; an incomplete
+    # last line is kept for the next call. The file header is skipped at offset 0, and the
+    # file is read again from the start if it shrinks.
+    def __init__(self, path, model = 'AE33', offset = 0, **options):
+        self.path = path
+        self.model = model
+        self.offset = offset
+        self.options = options      # passed to read_datafile
+        self.skip = MODELS[model]['skiprows'] if offset == 0 else 0
+
+    def read(self):
+        size = os.stat(self.path).st_size
+        if size < self.offset:      # file was truncated or replaced
+            self.offset = 0
+            self.skip = MODELS[self.model]['skiprows']
+        if size == self.offset:
+            return None
+        with open(self.path, 'rb') as f:
+            f.seek(self.offset)
+            block = f.read(size - self.offset)
+        end = block.rfind(b'\n') + 1
+        if not end:
+            return None
+        self.offset += end
+        lines = block[:end].split(b'\n')
+        skipped = min(self.skip, len(lines) - 1)
+        self.skip -= skipped
+        block = b'\n'.join(lines[skipped:])
+        if not block.strip():
+            return None
+        return read_datafile(io.BytesIO(block), self.model, skiprows = 0, **self.options)
+
+def follow_intervals(path, catalog = None, model = 'AE33', freq = 'HOURLY', interval = 1,
+                     decimals = 0, poll = 1.0, keys = None):
+    # Follows the instrument file 'path' as it is being written and yields each interval as
+    # soon as it closes (see IntervalAccumulator). The file size is polled every 'poll'
+    # seconds; when no new data arrived, the FileCatalog of the data directory (if given) is
+    # updated and its newest file is followed once the current file has been read.
+    if keys is None:
+        keys = Aethalometer(model = model).BCKeys
+    accumulator = IntervalAccumulator(keys, freq, interval, decimals)
+    follower = FileFollower(path, model, **stream_options(keys))
+    print('following file: {0}'.format(path), file=sys.stderr)
+    while True:
+        df = follower.read()
+        if df is not None:
+            rows = accumulator.add(df)
+            if len(rows):
+                yield rows
+            continue
+        newest = catalog.update().newest() if catalog is not None else None
+        if newest and os.path.abspath(newest) != os.path.abspath(follower.path):
+            follower = FileFollower(newest, model, **stream_options(keys))
+            print('following file: {0}'.format(newest), file=sys.stderr)
+            continue
+        time.sleep(poll)
+
+class RingBuffer(object):
+    # The last 'capacity' records of the 'columns' in preallocated arrays (timestamps in ns
+    # and float64 values), for recent raw data of a live stream without growing memory.
+    # append(df) adds a 'Datetime' indexed dataframe; records not later than the last one are
+    # dropped (counted in self.dropped), so the buffer stays in time order. records(start, end)
+    # returns the (times, values) arrays and frame(start, end) a dataframe of the records
+    # from 'start' on and before 'end'.
+    def __init__(self, columns, capacity = 86400):
+        self.columns = list(columns)
+        self.capacity = capacity
+        self.times = np.zeros(capacity, dtype='int64')
+        self.values = np.full((capacity, len(self.columns)), np.nan)
+        self.head = 0           # position of the next record
+        self.size = 0
+        self.total = 0          # records appended since creation
+        self.dropped = 0
+        self.last = np.iinfo('int64').min       # time of the newest record, in ns
+        self.evicted = np.iinfo('int64').min    # time of the newest overwritten record, in ns
+
+    def __len__(self):
+        return self.size
+
+    def append(self, df):
+        n = len(df)
+        if not n:
+            return
+        self.total += n
+        t = np.asarray(df.index, dtype='datetime64[ns]').view('int64')
+        values = df.reindex(columns = self.columns).to_numpy(dtype='float64')
+        previous = np.maximum.accumulate(np.concatenate(([self.last], t[:-1])))
+        keep = t > previous
+        if not keep.all():
+            self.dropped += int((~keep).sum())
+            t, values = t[keep], values[keep]
+            if not len(t):
+                return
+        if len(t) > self.capacity:
+            self.evicted = t[-self.capacity - 1]
+            t, values = t[-self.capacity:], values[-self.capacity:]
+        else:
+            overwritten = self.size + len(t) - self.capacity
+            if overwritten > 0:
+                self.evicted = self.times[(self.head - self.size + overwritten - 1) % self.capacity]
+        m = len(t)
+        positions = (self.head + np.arange(m)) % self.capacity
+        self.times[positions] = t
+        self.values[positions] = values
+        self.head = (self.head + m) % self.capacity
+        self.size = min(self.size + m, self.capacity)
+        self.last = t[-1]
+
+    def records(self, start = None, end = None):
+        order = (self.head - self.size + np.arange(self.size)) % self.capacity
+        times = self.times[order]
+        first = np.searchsorted(times, pd.Timestamp(start).value) if start is not None else 0
+        stop = np.searchsorted(times, pd.Timestamp(end).value) if end is not None else self.size
+        order = order[first:stop]
+        return self.times[order], self.values[order]
+
+    def frame(self, start = None, end = None):
+        times, values = self.records(start, end)
+        return pd.DataFrame(values, columns = self.columns,
+                            index = pd.DatetimeIndex(times.astype('datetime64[ns]'), name = 'Datetime'))
+
+class RingIntervals(IntervalAccumulator):
+    # The intervals of IntervalAccumulator (same windows and format) averaged from the records
+    # of a RingBuffer: add(df) appends the records to the buffer and returns the intervals
+    # closed by them, computed from the buffered records; flush() returns the open interval.
+    # An interval with more records than the buffer holds is averaged from the records still
+    # buffered (counted in self.truncated), so the capacity should cover an interval.
+    def __init__(self, buffer, freq = 'HOURLY', interval = 1, decimals = 0):
+        IntervalAccumulator.__init__(self, buffer.columns, freq, interval, decimals)
+        self.buffer = buffer
+        self.truncated = 0
+
+    def add(self, df):
+        self.buffer.append(df)
+        self.dropped = self.buffer.dropped
+        if not len(self.buffer):
+            return self.rows(np.array([], dtype='int64'), None, None, self.next or 0)
+        if self.origin is None:
+            first = self.buffer.records()[0][0]
+            self.origin = pd.Timestamp(first).floor('D').value
+            self.next = (first - self.origin) // self.step
+        # the interval of the newest record stays open until a later record arrives
+        return self.closed((self.buffer.last - self.origin) // self.step)
+
+    def flush(self):
+        if self.origin is None:
+            return self.rows(np.array([], dtype='int64'), None, None, 0)
+        return self.closed(max((self.buffer.last - self.origin) // self.step + 1, self.next))
+
+    def closed(self, stop):
+        # Intervals self.next ... stop - 1 from the buffered records
+        begin = self.origin + self.step * self.next
+        t, values = self.buffer.records(begin, self.origin + self.step * stop)
+        if self.buffer.evicted >= begin:
+            self.truncated += int(max(min((self.buffer.evicted - self.origin) // self.step + 1, stop) - self.next, 0))
+        if not len(t):
+            return self.rows(np.array([], dtype='int64'), None, None, stop)
+        valid = ~np.isnan(values)
+        bins = (t - self.origin) // self.step
+        first = np.concatenate(([0], np.flatnonzero(np.diff(bins)) + 1))
+        sums = np.add.reduceat(np.where(valid, values, 0), first, axis=0)
+        counts = np.add.reduceat(valid.astype('int64'), first, axis=0)
+        return self.rows(bins[first], sums, counts, stop)
+
+class RecordParser(object):
+    # Parses the data lines of a live instrument stream (the record layout of the model's
+    # datafiles) fed as blocks of bytes. feed() returns the complete lines received so far as
+    # a 'Datetime' indexed dataframe (or None); an incomplete last line is kept for the next
+    # block. Header and malformed lines are skipped and counted in self.skipped.
+    def __init__(self, model = 'AE33', **options):
+        self.model = model
+        self.options = options      # passed to read_datafile
+        self.rest = b''
+        self.skipped = 0
+
+    def feed(self, block):
+        block = self.rest + block
+        end = block.rfind(b'\n') + 1
+        self.rest = block[end:]
+        lines = [line for line in block[:end].splitlines() if line.strip()]
+        records = [line for line in lines if line.lstrip(b'"')[:1].isdigit()]
+        self.skipped += len(lines) - len(records)
+        if not records:
+            return None
+        try:
+            df = self.parse(records)
+        except (ValueError, IndexError):
+            # a malformed line fails the whole block: parse line by line, dropping bad ones
+            frames = []
+            for line in records:
+                try:
+                    frames.append(self.parse([line]))
+                except (ValueError, IndexError):
+                    self.skipped += 1
+            df = pd.concat(frames) if frames else None
+        return df
+
+    def parse(self, lines):
+        df = read_datafile(io.BytesIO(b'\n'.join(lines) + b'\n'), self.model, skiprows = 0, **self.options)
+        if df.index.hasnans:
+            self.skipped += int(df.index.isna().sum())
+            df = df[df.index.notna()]
+        return df
+
+async def ingest_records(host, port, model = 'AE33', reconnect = 5.0, keys = None, buffer_size = 65536):
+    # Async generator connecting to an instrument (or data logger) sending its records over
+    # TCP and yielding them parsed (RecordParser) as they arrive. On a closed or failed
+    # connection it reconnects after 'reconnect' seconds (0: ends instead).
+    import asyncio
+    if keys is None:
+        keys = Aethalometer(model = model).BCKeys
+    while True:
+        try:
+            reader, writer = await asyncio.open_connection(host, port)
+        except OSError as e:
+            print('{0}:{1}: {2}'.format(host, port, e), file=sys.stderr)
+        else:
+            print('connected to {0}:{1}'.format(host, port), file=sys.stderr)
+            parser = RecordParser(model, **stream_options(keys))
+            try:
+                while True:
+                    block = await reader.read(buffer_size)
+                    if not block:
+                        break
+                    df = parser.feed(block)
+                    if df is not None and len(df):
+                        yield df
+                if parser.rest.strip():
+                    df = parser.feed(b'\n')
+                    if df is not None and len(df):
+                        yield df
+            except OSError as e:
+                print('{0}:{1}: {2}'.format(host, port, e), file=sys.stderr)
+            finally:
+                writer.close()
+            if parser.skipped:
+                print('{0}:{1}: {2} lines skipped'.format(host, port, parser.skipped), file=sys.stderr)
+            print('disconnected from {0}:{1}'.format(host, port), file=sys.stderr)
+        if not reconnect:
+            return
+        await asyncio.sleep(reconnect)
+
+async def ingest_intervals(sources, model = 'AE33', freq = 'HOURLY', interval = 1, decimals = 0,
+                           reconnect = 5.0, buffers = None, capacity = 86400):
+    # Async generator reading the records of one or more TCP sources [(host, port), ...]
+    # concurrently and yielding ((host, port), intervals) as intervals close. The last
+    # 'capacity' records of each source are kept in a RingBuffer and the intervals are
+    # averaged from it (RingIntervals); if a dict is given as 'buffers', it receives the
+    # buffer per source. With reconnect = 0 the generator ends (after the open intervals)
+    # once all connections are closed.
+    import asyncio
+    keys = Aethalometer(model = model).BCKeys
+    if buffers is None:
+        buffers = {}
+    queue = asyncio.Queue()
+
+    async def read(source):
+        buffer = buffers.setdefault(source, RingBuffer(keys, capacity))
+        accumulator = RingIntervals(buffer, freq, interval, decimals)
+        try:
+            async for df in ingest_records(source[0], source[1], model, reconnect, keys):
+                rows = accumulator.add(df)
+                if len(rows):
+                    await queue.put((source, rows))
+            rows = accumulator.flush()
+            if len(rows):
+                await queue.put((source, rows))
+        finally:
+            if accumulator.truncated:
+                print('{0}:{1}: {2} intervals averaged from their last {3} records (buffer capacity)'
+                      .format(source[0], source[1], accumulator.truncated, capacity), file=sys.stderr)
+            await queue.put((source, None))
+
+    tasks = [asyncio.ensure_future(read(source)) for source in sources]
+    try:
+        running = len(tasks)
+        while running:
+            source, rows = await queue.get()
+            if rows is None:
+                running -= 1
+            else:
+                yield source, rows
+    finally:
+        for task in tasks:
+            task.cancel()
+
+OUTPUT_FORMATS = {
+    # format: file name extensions
+    'csv':     ('.csv',),
+    'csv.gz':  ('.csv.gz', '.gz'),
+    'parquet': ('.parquet', '.pq'),
+    'feather': ('.feather', '.arrow'),
+    }
+
+def output_format(path):
+    # Output format of a file name (by extension), 'csv' if not known
+    for format, extensions in OUTPUT_FORMATS.items():
+        if path.lower().endswith(extensions):
+            return format
+    return 'csv'
+
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+def dates_only(values):
+    # True if all (non-NaT) datetime values are midnights, which to_csv writes as dates only
+    t = np.asarray(values, dtype='datetime64[ns]')
+    t = t[~np.isnat(t)].view('int64')
+    return not (t % (86400 * 10**9)).any()
+
+class ResultWriter(object):
+    # Writes interval tables (calculate_intervals format, indexed by 'end') to 'path' as they are
+    # produced, 'chunksize' rows at a time, so the result is never held in memory as text.
+    # CSV ('csv', 'csv.gz', stdout if path is None, or an open text file) starts with the column
+    # names and a units row;
+    # 'parquet' and 'feather' keep the datetime types and store the units as JSON in the schema
+    # metadata (b'units'), one row group / record batch per chunk. Needs pyarrow for those.
+    def __init__(self, path = None, format = None, units = None, columns = None, chunksize = 100000):
+        self.path = path
+        self.format = format or (output_format(path) if isinstance(path, str) else 'csv')
+        if self.format not in OUTPUT_FORMATS:
+            raise ValueError('unknown output format {0}'.format(self.format))
+        self.units = units or {}
+        self.chunksize = chunksize
+        self.columns = None
+        self.schema = None
+        self.writer = None
+        self.rows = 0
+        if self.format == 'csv.gz':
+            import gzip
+            # zlib's default level: level 9 is several times slower for a few % smaller files
+            self.f = gzip.open(path, 'wt', compresslevel = 6)
+        elif self.format == 'csv':
+            if path is None:
+                self.f = sys.stdout
+            elif hasattr(path, 'write'):
+                self.f = path
+            else:
+                self.f = open(path, 'w')
+        elif path is None:
+            raise ValueError('{0} output needs a file name'.format(self.format))
+        if columns is not None:
+            self.header(columns)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def column_units(self):
+        units = {'end': '-'}
+        units.update((column, column_unit(self.units, column)) for column in self.columns)
+        return units
+
+    def header(self, columns):
+        # Column names (and the units row for CSV), written before the first rows
+        self.columns = list(columns)
+        if self.format.startswith('csv'):
+            units = self.column_units()
+            self.f.write('end,' + ','.join(self.columns) + '\n')
+            self.f.write(','.join(units[column] for column in ['end'] + self.columns) + '\n')
+            self.f.flush()
+
+    def write(self, df):
+        if self.columns is None:
+            self.header(df.columns)
+        if self.format.startswith('csv'):
+            for i in range(0, len(df), self.chunksize):
+                chunk = df.iloc[i:i + self.chunksize]
+                # pandas formats timestamps as '2018-02-27 13:00:00' (fractions only when present)
+                # in a vectorized way, but writes a column of midnights as dates only. date_format
+                # calls strftime for every value and is only used for those chunks.
+                columns = [chunk.index] + [chunk[c] for c in chunk.columns if chunk[c].dtype.kind == 'M']
+                midnights = any(len(values) and dates_only(values) for values in columns)
+                chunk.to_csv(self.f, header=False, date_format=DATE_FORMAT if midnights else None)
+            self.f.flush()
+        else:
+            for i in range(0, max(len(df), 1), self.chunksize):
+                self.write_table(df.iloc[i:i + self.chunksize])
+        self.rows += len(df)
+
+    def write_table(self, df):
+        import pyarrow as pa
+        table = pa.Table.from_pandas(df.reset_index(), preserve_index=False)
+        if self.writer is None:
+            import json
+            metadata = dict(table.schema.metadata or {})
+            metadata[b'units'] = json.dumps(self.column_units()).encode()
+            self.schema = table.schema.with_metadata(metadata)
+            if self.format == 'parquet':
+                import pyarrow.parquet as pq
+                self.writer = pq.ParquetWriter(self.path, self.schema)
+            else:
+                # Feather V2 is the Arrow IPC file format (lz4 compressed, as DataFrame.to_feather)
+                compression = 'lz4' if pa.Codec.is_available('lz4') else None
+                self.writer = pa.ipc.new_file(self.path, self.schema,
+                                              options = pa.ipc.IpcWriteOptions(compression = compression))
+        self.writer.write_table(table.cast(self.schema))
+
+    def close(self):
+        if self.format.startswith('csv'):
+            if self.f is sys.stdout or self.f is self.path:
+                self.f.flush()
+            else:
+                self.f.close()
+        else:
+            if self.writer is None:
+                # nothing written: an empty table with the known columns
+                if self.columns is None:
+                    self.header([])
+                df = pd.DataFrame(columns = self.columns, dtype = float,
+                                  index = pd.DatetimeIndex([], name = 'end'))
+                if 'start' in df:
+                    df['start'] = pd.to_datetime(df['start'])
+                self.write_table(df)
+            self.writer.close()
+
 def calculate_hourly_intervals(data, interval = 1, decimals = 0):
-    df = pd.DataFrame(columns=['start','end'])
-    tmin = hour_rounder(data.df.first_valid_index())
-    tmax = hour_rounder(data.df.last_valid_index()) - timedelta(hours=1)
-    for dt in rrule.rrule(rrule.HOURLY, interval = interval, dtstart=tmin, until=tmax):
-        start = dt
-        end = dt+timedelta(hours=1)
-        subset = data.getSubset(start, end)
-        index = len(df)
-        df.loc[index, 'start'] = start
-        df.loc[index, 'end'] = end
-        for key, value in subset.mean().round(decimals).items():
-            df.loc[index, key] = value
-    df = df.set_index('end')
-    return df
+    return calculate_intervals(data, 'HOURLY', interval = interval, decimals = decimals, compat = True)
 
 def calculate_minutely_intervals(data, interval = 1, decimals = 0):
-    df = pd.DataFrame(columns=['start','end'])
-    tmin = minute_rounder(data.df.first_valid_index())
-    tmax = minute_rounder(data.df.last_valid_index()) - timedelta(minutes=1)
-    for dt in rrule.rrule(rrule.MINUTELY, interval = interval, dtstart=tmin, until=tmax):
-        start = dt
-        end = dt+timedelta(minutes=1)
-        subset = data.getSubset(start, end)
-        index = len(df)
-        df.loc[index, 'start'] = start
-        df.loc[index, 'end'] = end
-        for key, value in subset.mean().round(decimals).items():
-            df.loc[index, key] = value
-    df = df.set_index('end')
-    return df
+    return calculate_intervals(data, 'MINUTELY', interval = interval, decimals = decimals, compat = True)
 
 def calculate_secondly_intervals(data, interval = 10, decimals = 0):
-    df = pd.DataFrame(columns=['start','end'])
-    tmin = minute_rounder(data.df.first_valid_index())
-    tmax = minute_rounder(data.df.last_valid_index()) - timedelta(minutes=1)
-    for dt in rrule.rrule(rrule.SECONDLY, interval = interval, dtstart=tmin, until=tmax):
-        start = dt
-        end = dt+timedelta(minutes=1)
-        subset = data.getSubset(start, end)
-        index = len(df)
-        df.loc[index, 'start'] = start
-        df.loc[index, 'end'] = end
-        for key, value in subset.mean().round(decimals).items():
-            df.loc[index, key] = value
-    df = df.set_index('end')
-    return df   
+    return calculate_intervals(data, 'SECONDLY', interval = interval, decimals = decimals, compat = True)
+
+AE33_COLUMNS = [
+    'Date',
+    'Time',
+    'Timebase',
+    'RefCh1',
+    'Sen1Ch1',
+    'Sen2Ch1',
+    'RefCh2',
+    'Sen1Ch2',
+    'Sen2Ch2',
+    'RefCh3',
+    'Sen1Ch3',
+    'Sen2Ch3',
+    'RefCh4',
+    'Sen1Ch4',
+    'Sen2Ch4',
+    'RefCh5',
+    'Sen1Ch5',
+    'Sen2Ch5',
+    'RefCh6',
+    'Sen1Ch6',
+    'Sen2Ch6',
+    'RefCh7',
+    'Sen1Ch7',
+    'Sen2Ch7',
+    'Flow1',
+    'Flow2',
+    'FlowC',
+    'Pressure',
+    'Temperature',
+    'BB',
+    'ContTemp',
+    'SupplyTemp',
+    'Status',
+    'ContStatus',
+    'DetectStatus',
+    'LedStatus',
+    'ValveStatus',
+    'LedTemp',
+    'BC11',
+    'BC12',
+    'BC1',
+    'BC21',
+    'BC22',
+    'BC2',
+    'BC31',
+    'BC32',
+    'BC3',
+    'BC41',
+    'BC42',
+    'BC4',
+    'BC51',
+    'BC52',
+    'BC5',
+    'BC61',
+    'BC62',
+    'BC6',
+    'BC71',
+    'BC72',
+    'BC7',
+    'K1',
+    'K2',
+    'K3',
+    'K4',
+    'K5',
+    'K6',
+    'K7',
+    'TapeAdvCount',
+    'ID_com1',
+    'ID_com2',
+    'ID_com3']
+
+AE31_COLUMNS = [
+    'Date',
+    'Time',
+    'BC1',
+    'BC2',
+    'BC3',
+    'BC4',
+    'BC5',
+    'BC6',
+    'BC7',
+    'vflow',
+    'Sample zero signal 1',
+    'sensing beam signal 1',
+    'reference zero signal 1',
+    'reference beam signal 1',
+    'fra 1',
+    'optical attenuation 1',
+    'Sample zero signal 2',
+    'sensing beam signal 2',
+    'reference zero signal 2',
+    'reference beam signal 2',
+    'fra 2',
+    'optical attenuation 2',
+    'Sample zero signal 3',
+    'sensing beam signal 3',
+    'reference zero signal 3',
+    'reference beam signal 3',
+    'fra 3',
+    'optical attenuation 3',
+    'Sample zero signal 4',
+    'sensing beam signal 4',
+    'reference zero signal 4',
+    'reference beam signal 4',
+    'fra 4',
+    'optical attenuation 4',
+    'Sample zero signal 5',
+    'sensing beam signal 5',
+    'reference zero signal 5',
+    'reference beam signal 5',
+    'fra 5',
+    'optical attenuation 5',
+    'Sample zero signal 6',
+    'sensing beam signal 6',
+    'reference zero signal 6',
+    'reference beam signal 6',
+    'fra 6',
+    'optical attenuation 6',
+    'Sample zero signal 7',
+    'sensing beam signal 7',
+    'reference zero signal 7',
+    'reference beam signal 7',
+    'fra 7',
+    'optical attenuation 7',
+    'massfl']
+
+# dtypes used by the fast reader (Aethalometer(..., fast = True)); the averaged columns (BC1-BC7, BB)
+# stay float64, so that the interval means are those of the default reader
+AE33_DTYPES = {'Date': 'str', 'Time': 'str', 'Timebase': 'int16'}
+for n in range(1, 8):
+    AE33_DTYPES.update({'RefCh{}'.format(n): 'float64',
+                        'Sen1Ch{}'.format(n): 'float64',
+                        'Sen2Ch{}'.format(n): 'float64',
+                        'BC{}1'.format(n): 'float32',
+                        'BC{}2'.format(n): 'float32',
+                        'BC{}'.format(n): 'float64',
+                        'K{}'.format(n): 'float64'})
+AE33_DTYPES.update({key: 'float32' for key in ['Flow1', 'Flow2', 'FlowC', 'Pressure', 'Temperature',
+                                               'ContTemp', 'SupplyTemp', 'LedTemp']})
+AE33_DTYPES['BB'] = 'float64'
+AE33_DTYPES.update({key: 'int16' for key in ['ContStatus', 'DetectStatus', 'LedStatus', 'ValveStatus',
+                                             'ID_com1', 'ID_com2', 'ID_com3']})
+AE33_DTYPES.update({'Status': 'int32', 'TapeAdvCount': 'int32'})
+
+AE31_DTYPES = {'Date': 'str', 'Time': 'str', 'vflow': 'float32', 'massfl': 'float32'}
+for n in range(1, 8):
+    AE31_DTYPES.update({'BC{}'.format(n): 'float64',
+                        'Sample zero signal {}'.format(n): 'float64',
+                        'sensing beam signal {}'.format(n): 'float64',
+                        'reference zero signal {}'.format(n): 'float64',
+                        'reference beam signal {}'.format(n): 'float64',
+                        'fra {}'.format(n): 'float32',
+                        'optical attenuation {}'.format(n): 'float64'})
+
+# AE33 Status codes (the Status column is the sum of the active codes)
+AE33_STATUS = {
+    0x0001: 'tape advance',             # 1, 2, 3: operation state
+    0x0002: 'first measurement (ATN0)', # 3 = stopped
+    0x0004: 'flow out of range',
+    0x0010: 'LED calibration',
+    0x0020: 'LED calibration error',
+    0x0040: 'chamber error',
+    0x0080: 'tape low',
+    0x0100: 'tape critical',
+    0x0200: 'tape error',
+    0x0400: 'stability test',
+    0x0800: 'clean air test',
+    0x1000: 'change tape procedure'
+    }
+
+MODELS = {
+    'AE33': {
+        'columns':     AE33_COLUMNS,
+        'dtypes':      AE33_DTYPES,
+        'separator':   " ",
+        'skiprows':    8,
+        'append_text': "",
+        'datetime_format': '%Y/%m/%d %H:%M:%S',    # 2018/02/27 00:00:00
+        # status column: bits that invalidate a row (all AE33_STATUS codes but the tape warnings)
+        'quality':     {'Status': 0x1e77},
+        'tape_column': 'TapeAdvCount',
+        # raw detector signals, kept out of memory by Aethalometer.compact()
+        'signals':     [name + str(n) for n in range(1, 8) for name in ['RefCh', 'Sen1Ch', 'Sen2Ch']],
+        # BC from the raw signals (recompute_bc): spot 1 signals, Flow1 in ml/min, spot area in m2,
+        # M8020 tape C and leakage (these reproduce the BCn1 columns), mass absorption cross
+        # sections in m2/g; ATN relative to the first sample of each spot after the tape advance
+        # (Status 'tape advance' and 'first measurement' rows are skipped)
+        'optics':      {'reference': 'RefCh{}', 'sensing': 'Sen1Ch{}', 'reference_zero': None,
+                        'sensing_zero': None, 'flow': 'Flow1', 'flow_factor': 1e-6/60,
+                        'spot_area': 0.785e-4, 'C': 1.57, 'leakage': 0.07,
+                        'mac': [18.47, 14.54, 13.14, 11.58, 10.35, 7.77, 7.19],
+                        'spot_reference': True, 'settling': {'Status': 0x0003},
+                        'compensation': ('BC{}1', 'BC{}', 'K{}')}
+        },
+    'AE31': {
+        'columns':     AE31_COLUMNS,
+        'dtypes':      AE31_DTYPES,
+        'separator':   ",",
+        'skiprows':    0,
+        'append_text': ":00",
+        'datetime_format': '%d-%b-%y %H:%M:%S',    # "27-feb-18","00:05" + ":00"
+        'quality':     {},
+        'tape_column': None,
+        'signals':     [name.format(n) for n in range(1, 8)
+                        for name in ['Sample zero signal {}', 'sensing beam signal {}',
+                                     'reference zero signal {}', 'reference beam signal {}']],
+        # zero signals subtracted, flow in l/min, standard spot; the instrument uses 14625/lambda
+        # m2/g for the attenuation cross section, i.e. C = 2.14 times the mass absorption one.
+        # ATN as measured (a tape advance shows as a drop)
+        'optics':      {'reference': 'reference beam signal {}', 'sensing': 'sensing beam signal {}',
+                        'reference_zero': 'reference zero signal {}', 'sensing_zero': 'Sample zero signal {}',
+                        'flow': 'vflow', 'flow_factor': 1e-3/60, 'spot_area': 1.67e-4, 'C': 2.14,
+                        'leakage': 0,
+                        'mac': [14625/2.14/wavelength for wavelength in [370, 470, 520, 590, 660, 880, 950]],
+                        'spot_reference': False, 'settling': {}, 'compensation': None}
+        }
+    }
+
+def quality_mask(df, rules, tape_column = None, tape_window = 0):
+    # Boolean array of the rows of a sorted 'Datetime' indexed dataframe that fail the quality
+    # rules: {column: bits} rejects rows with any of the bits set in the column, and rows
+    # within tape_window seconds before or after a change of the tape_column counter.
+    rejected = np.zeros(len(df), dtype=bool)
+    for column, bits in rules.items():
+        if column in df:
+            rejected |= (df[column].fillna(0).to_numpy().astype('int64') & bits) != 0
+    if tape_window and tape_column in df and len(df) > 1:
+        counter = df[tape_column].to_numpy()
+        changes = np.flatnonzero(counter[1:] != counter[:-1]) + 1
+        t = df.index.to_numpy(dtype='datetime64[ns]')
+        window = np.timedelta64(int(tape_window * 1e9), 'ns')
+        lo = np.searchsorted(t, t[changes] - window, side='left')
+        hi = np.searchsorted(t, t[changes] + window, side='right')
+        # +1 at the start and -1 past the end of each window: rejected where the sum is > 0
+        marks = np.zeros(len(df) + 1, dtype='int64')
+        np.add.at(marks, lo, 1)
+        np.add.at(marks, hi, -1)
+        rejected |= np.cumsum(marks[:-1]) > 0
+    return rejected
+
+def optics_columns(model = 'AE33', correction = None):
+    # Columns read by recompute_bc (signals, flow, tape counter, status, compensation)
+    optics = MODELS[model]['optics']
+    names = [optics[key] for key in ['reference', 'sensing', 'reference_zero', 'sensing_zero'] if optics[key]]
+    if correction == 'ae33' and optics['compensation']:
+        names += list(optics['compensation'])
+    columns = [name.format(n) for name in names for n in range(1, 8)]
+    columns += [optics['flow']] + list(optics['settling'])
+    if MODELS[model]['tape_column']:
+        columns.append(MODELS[model]['tape_column'])
+    return columns
+
+def spot_starts(atn, counter = None, reset = 10):
+    # Rows starting a new filter spot: the tape counter changes, or the attenuation of any
+    # wavelength (rows x wavelengths array) drops by more than 'reset' from the previous row
+    starts = np.zeros(len(atn), dtype=bool)
+    if len(atn):
+        starts[0] = True
+        with np.errstate(invalid='ignore'):
+            starts[1:] = (np.diff(atn, axis=0) < -reset).any(axis=1)
+        if counter is not None:
+            starts[1:] |= counter[1:] != counter[:-1]
+    return starts
+
+LOADING_CORRECTIONS = ['none', 'weingartner', 'virkkula', 'ae33']
+
+def loading_factor(atn, correction = None, f = None, k = None, compensation = None):
+    # Factor applied to the BC of a loaded spot with attenuation 'atn' (rows x wavelengths):
+    #   'weingartner': 1/R, R = (1/f - 1) (ln ATN - ln 10) / (ln 50 - ln 10) + 1 (R = 1 below ATN 10)
+    #   'virkkula':    1 + k ATN (k: one value or one per wavelength)
+    #   'ae33':        1 / (1 - K ATN), with the K of the instrument ('compensation' array)
+    if correction in (None, 'none'):
+        return 1.0
+    with np.errstate(invalid='ignore'):
+        if correction == 'weingartner':
+            if not f:
+                raise ValueError('the weingartner correction needs f')
+            return 1 / ((1/f - 1) * (np.log(np.fmax(atn, 10)) - np.log(10)) / (np.log(50) - np.log(10)) + 1)
+        if correction == 'virkkula':
+            if k is None:
+                raise ValueError('the virkkula correction needs k')
+            return 1 + np.asarray(k, dtype='float64') * atn
+        if correction == 'ae33':
+            if compensation is None:
+                raise ValueError('the ae33 correction needs the K1-K7 columns of AE33 files')
+            return 1 / (1 - compensation * atn)
+    raise ValueError('unknown loading correction {0} (use {1})'.format(correction, ', '.join(LOADING_CORRECTIONS)))
+
+def check_correction(value):
+    # Loading correction of --recompute: none, weingartner:F, virkkula:K[,K,...] or ae33
+    name, sep, parameters = value.lower().partition(':')
+    try:
+        if name == 'weingartner':
+            return {'correction': name, 'f': float(parameters)}
+        if name == 'virkkula':
+            k = [float(x) for x in parameters.split(',')]
+            if len(k) not in (1, 7):
+                raise argparse.ArgumentTypeError("%s: give one K or seven (one per wavelength)" % value)
+            return {'correction': name, 'k': k[0] if len(k) == 1 else k}
+    except ValueError:
+        raise argparse.ArgumentTypeError("%s needs parameters (e.g. weingartner:1.2, virkkula:0.004)" % value)
+    if name in ('none', 'ae33') and not parameters:
+        return {'correction': name}
+    raise argparse.ArgumentTypeError("%s is not a loading correction (use none, weingartner:F, "
+                                     "virkkula:K or ae33)" % value)
+
+def recompute_bc(data, correction = None, f = None, k = None, scattering = None, spot_area = None, reset = 10):
+    # Attenuation (ATN1-ATN7) and BC (BC1-BC7 in ng/m3) of an Aethalometer object recomputed from
+    # its raw signals (MODELS[model]['optics']) in array operations over all rows and wavelengths:
+    #   ATN = 100 ln(reference / sensing), zero signals subtracted
+    #   BC  = spot_area dATN/100 / ((1 - leakage) flow dt C mac) * loading_factor(ATN)
+    # with C = 'scattering' (multiple scattering constant) if given. Differences are not taken
+    # across tape advances (spot_starts): the first row of each spot has no BC. For models with
+    # 'spot_reference' ATN starts at 0 on each spot; the ATN of the spot loaded before the data
+    # begins is estimated from the compensation columns (BCn = BCn1 / (1 - Kn ATN)) if they are
+    # loaded, otherwise it starts at 0 too. Returns the dataframe and the spot start mask.
+    spec = MODELS[data.model]
+    optics = spec['optics']
+    n = len(data.df)
+    signals = lambda name: np.column_stack([data.signal(name.format(i)).to_numpy(dtype='float64')
+                                            for i in range(1, 8)]) if n else np.zeros((0, 7))
+    reference = signals(optics['reference'])
+    sensing = signals(optics['sensing'])
+    if optics['reference_zero']:
+        reference -= signals(optics['reference_zero'])
+        sensing -= signals(optics['sensing_zero'])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        atn = 100 * np.log(reference / sensing)
+    del reference, sensing
+    tape = spec['tape_column']
+    counter = data.signal(tape).to_numpy() if tape and tape in data.df else None
+    starts = spot_starts(atn, counter, reset)
+    first = np.flatnonzero(starts)
+    spot = np.cumsum(starts) - 1
+
+    # rows of the tape advance procedure have no valid signals
+    settling = np.zeros(n, dtype=bool)
+    for column, bits in optics['settling'].items():
+        if column in data.df:
+            settling |= (data.signal(column).fillna(0).to_numpy().astype('int64') & bits) != 0
+    atn[settling] = np.nan
+
+    compensation = None
+    names = optics['compensation']
+    if names and all(name.format(i) in data.df for name in names for i in range(1, 8)):
+        bc1, bc, compensation = [signals(name) for name in names]
+    if optics['spot_reference'] and len(first):
+        # ATN of the first valid row of each spot
+        positions = np.where(settling, n, np.arange(n))
+        zero = np.minimum.reduceat(positions, first)
+        valid = zero < np.append(first[1:], n)
+        atn0 = np.full((len(first), 7), np.nan)
+        atn0[valid] = atn[zero[valid]]
+        atn -= atn0[spot]
+        if compensation is not None:
+            # instrument ATN of the first spot, from BCn = BCn1 / (1 - Kn ATN)
+            rows = spot == 0
+            with np.errstate(divide='ignore', invalid='ignore'):
+                offset = np.nanmedian((1 - bc1[rows] / bc[rows]) / compensation[rows] - atn[rows], axis=0)
+            atn[rows] += np.where(np.isfinite(offset), offset, 0)
+
+    t = np.asarray(data.df.index, dtype='datetime64[ns]').view('int64')
+    dt = np.full(n, np.nan)
+    dt[1:] = np.diff(t) / 1e9
+    dt[dt <= 0] = np.nan
+    datn = np.full_like(atn, np.nan)
+    datn[1:] = np.diff(atn, axis=0)
+    datn[starts] = np.nan
+    flow = data.signal(optics['flow']).to_numpy(dtype='float64') * optics['flow_factor']
+    C = scattering or optics['C']
+    bc = datn * ((spot_area or optics['spot_area']) * 1e9 / 100 / C)
+    bc /= ((1 - optics['leakage']) * flow * dt)[:, np.newaxis]
+    bc /= np.asarray(optics['mac'])
+    bc *= loading_factor(atn, correction, f, k, compensation)
+    columns = ['ATN{}'.format(i) for i in range(1, 8)] + ['BC{}'.format(i) for i in range(1, 8)]
+    return pd.DataFrame(np.hstack((atn, bc)), index = data.df.index, columns = columns), starts
+
+def parse_datetime(date, time, model = 'AE33', datetime_format = None):
+    # Vectorized Date + Time (+ append_text) to datetime conversion using the fixed format
+    # of the model. Falls back to per-row format inference if the format does not match.
+    spec = MODELS[model]
+    text = date.str.cat(time, sep=" ") + spec['append_text']
+    try:
+        return pd.to_datetime(text, format=datetime_format or spec['datetime_format'])
+    except ValueError:
+        print("datetime format did not match, inferring format", file=sys.stderr)
+        return pd.to_datetime(text)
+
+def read_options(model = 'AE33', fast = False, columns = None, dtypes = None, **kwargs):
+    # pd.read_csv keyword arguments for a datafile of the given model (see read_datafile)
+    spec = MODELS[model]
+    usecols = None
+    if columns is not None:
+        usecols = ['Date', 'Time'] + [key for key in spec['columns'] if key in columns and key not in ('Date', 'Time')]
+    options = dict(
+        index_col = False,
+        names = spec['columns'],    # use list of names
+        sep = spec['separator'],    # Space-separated (AE33) or comma-separated (AE31) value file.
+        quotechar = '"',            # double quote allowed as quote character
+        skiprows = spec['skiprows'],# Skip the header rows of the file
+        usecols = usecols
+        )
+    options.update(kwargs)
+    if fast:
+        types = dict(spec['dtypes'])
+        if dtypes:
+            types.update(dtypes)
+        options['dtype'] = {key: value for key, value in types.items() if usecols is None or key in usecols}
+        options['engine'] = 'c'
+    return options
+
+def index_datetime(df, model = 'AE33', fast = False):
+    #Date(yyyy/MM/dd); Time(hh:mm:ss)
+    if fast:
+        df['Datetime'] = parse_datetime(df['Date'], df['Time'], model)
+    else:
+        #df['Datetime'] = pd.to_datetime(df['Date'] + " " + df['Time'], infer_datetime_format=True)
+        df['Datetime'] = pd.to_datetime(df['Date'] + " " + df['Time'])
+    return df.set_index('Datetime')
+
+def read_datafile(datafile, model = 'AE33', fast = False, columns = None, dtypes = None, compact = False,
+                  **kwargs):
+    # Reads an aethalometer file into a 'Datetime' indexed dataframe. Extra keyword
+    # arguments are passed to pd.read_csv (e.g. skiprows = 0 for a file object that is
+    # already positioned past the header). '-' reads stdin.
+    # compact = True parses the file in chunks and drops the Date and Time strings and
+    # downcasts each chunk (compact_frame) before the next one is read, so that the full
+    # float64/string frame of the file is never in memory.
+    if isinstance(datafile, str) and datafile == '-':
+        datafile = sys.stdin
+    if compact:
+        with profiler.stage('read_csv') as stage:
+            frames = [compact_frame(df) for df in iter_datafile(datafile, model, fast = fast, columns = columns,
+                                                                dtypes = dtypes, **kwargs)]
+            stage.rows = sum(len(df) for df in frames)
+        if not frames:
+            return pd.DataFrame(index = pd.DatetimeIndex([], name = 'Datetime'))
+        return compact_dtypes(pd.concat(frames)) if len(frames) > 1 else frames[0]
+    with profiler.stage('read_csv') as stage:
+        df = pd.read_csv(datafile, **read_options(model, fast, columns, dtypes, **kwargs))
+        stage.rows = len(df)
+    with profiler.stage('datetime', len(df)):
+        return index_datetime(df, model, fast)
+
+def iter_datafile(datafile, model = 'AE33', chunksize = 100000, fast = False, columns = None, dtypes = None, **kwargs):
+    # Same as read_datafile, but yields 'Datetime' indexed dataframes of at most chunksize rows
+    if isinstance(datafile, str) and datafile == '-':
+        datafile = sys.stdin
+    options = read_options(model, fast, columns, dtypes, **kwargs)
+    with pd.read_csv(datafile, chunksize = chunksize, **options) as reader:
+        for df in reader:
+            yield index_datetime(df, model, fast)
+
+def _read_datafile_task(task):
+    # process pool worker for Aethalometer.from_files. With 'profile' the stages recorded
+    # by the worker are returned with the dataframe.
+    filename, model, options, start, end, profile = task
+    if profile:
+        profiler.enabled = True
+        first = len(profiler.stages)
+    if start is not None or end is not None:
+        df = read_range(filename, model, start, end, **options)
+    else:
+        df = read_datafile(filename, model, **options)
+    if profile:
+        return df, profiler.stages[first:]
+    return df
+
+def default_cache_path(data_path):
+    # CACHE_PATH if none is configured: a directory per DATA_PATH in the user cache directory
+    # ($XDG_CACHE_HOME or ~/.cache), so that nothing is written to (or creates) DATA_PATH
+    data_path = os.path.abspath(data_path)
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    name = '{0}-{1}'.format(os.path.basename(data_path), hashlib.sha1(data_path.encode()).hexdigest()[:12])
+    return os.path.join(base, 'aeth', name)
+
+class FileCache(object):
+    # On-disk cache of parsed datafiles. Each entry stores the 'Datetime' indexed dataframe
+    # of one file in a columnar format (Feather if pyarrow is installed, pickle otherwise) and
+    # is keyed by the file path, size, mtime, model and reader options. Entries are evicted
+    # least recently used first once the cache grows beyond max_size bytes; only the files
+    # named 'file_<key>' are entries, other files in 'path' (the FileCatalog) are kept.
+    prefix = 'file_'
+
+    def __init__(self, path, max_size = 512*1024*1024, rebuild = False):
+        self.path = path
+        self.max_size = max_size
+        self.rebuild = rebuild      # re-parse and overwrite existing entries
+        self.hits = 0
+        self.misses = 0
+        if importlib.util.find_spec('pyarrow'):
+            self.ext = '.feather'
+        else:
+            self.ext = '.pkl'
+
+    def key(self, filename, model = 'AE33', **options):
+        stat = os.stat(filename)
+        text = '|'.join([os.path.abspath(filename), str(stat.st_size), str(stat.st_mtime_ns),
+                         model, repr(sorted(options.items()))])
+        return hashlib.sha1(text.encode()).hexdigest()
+
+    def entry(self, filename, model = 'AE33', **options):
+        return os.path.join(self.path, self.prefix + self.key(filename, model, **options) + self.ext)
+
+    def get(self, filename, model = 'AE33', **options):
+        # Returns the cached dataframe of 'filename', or None on a cache miss
+        entry = self.entry(filename, model, **options)
+        if not self.rebuild and os.path.exists(entry):
+            try:
+                df = self.read(entry)
+                os.utime(entry)     # mark as recently used
+                self.hits += 1
+                return df
+            except Exception as e:
+                print('could not read cache entry {0}: {1}'.format(entry, e), file=sys.stderr)
+        self.misses += 1
+        return None
+
+    def put(self, filename, df, model = 'AE33', **options):
+        self.store(self.entry(filename, model, **options), df)
+
+    def load(self, filename, model = 'AE33', **options):
+        # Returns the dataframe of 'filename', parsing and storing it on a cache miss
+        df = self.get(filename, model, **options)
+        if df is None:
+            df = read_datafile(filename, model, **options)
+            self.put(filename, df, model, **options)
+        return df
+
+    def read(self, entry):
+        if entry.endswith('.feather'):
+            return pd.read_feather(entry).set_index('Datetime')
+        return pd.read_pickle(entry)
+
+    def store(self, entry, df):
+        try:
+            os.makedirs(self.path, exist_ok=True)
+            tmp = entry + '.tmp{}'.format(os.getpid())
+            if entry.endswith('.feather'):
+                df.reset_index().to_feather(tmp)
+            else:
+                df.to_pickle(tmp)
+            os.replace(tmp, entry)
+            self.evict(keep = entry)
+        except OSError as e:
+            print('could not write cache entry {0}: {1}'.format(entry, e), file=sys.stderr)
+
+    def evict(self, keep = None):
+        # Removes the least recently used entries above max_size, never the entry 'keep'
+        entries = []
+        with os.scandir(self.path) as it:
+            for e in it:
+                if e.name.startswith(self.prefix) and e.name.endswith(('.feather', '.pkl')) and e.is_file():
+                    stat = e.stat()
+                    entries.append((stat.st_mtime, stat.st_size, e.path))
+        total = sum(size for mtime, size, path in entries)
+        for mtime, size, path in sorted(entries):
+            if total <= self.max_size:
+                break
+            if path != keep:
+                os.remove(path)
+                total -= size
+
+    def summary(self):
+        return 'cache: {0} hits, {1} misses ({2})'.format(self.hits, self.misses, self.path)
+
+def line_datetime(line, model = 'AE33'):
+    # Timestamp of one data line (bytes or str), None if it does not start with a date and
+    # time in the format of the model
+    spec = MODELS[model]
+    if isinstance(line, bytes):
+        line = line.decode('latin-1')
+    fields = line.strip().split(spec['separator'])
+    if len(fields) < 2:
+        return None
+    text = fields[0].strip('"') + " " + fields[1].strip('"') + spec['append_text']
+    try:
+        return datetime.strptime(text, spec['datetime_format'])
+    except ValueError:
+        return None
+
+def data_offset(f, model = 'AE33'):
+    # Byte offset of the first data line of a datafile opened in binary mode
+    f.seek(0)
+    for i in range(MODELS[model]['skiprows']):
+        f.readline()
+    return f.tell()
+
+def line_offset(f, model, t, lo, hi, after = False):
+    # Offset of the first data line between the offsets lo (start of a line) and hi with a
+    # timestamp >= t (> t if after = True), by bisection. Lines must be sorted by time, as
+    # written by the instrument; unparsable lines count as earlier than t.
+    while lo < hi:
+        mid = (lo + hi) // 2
+        f.seek(mid)
+        if mid > lo:
+            f.readline()    # move to the start of the next line
+        position = f.tell()
+        if position >= hi:
+            position = lo   # no line starts between mid and hi
+            f.seek(lo)
+        line = f.readline()
+        ts = line_datetime(line, model)
+        if ts is None or ts < t or (after and ts == t):
+            lo = f.tell()
+        else:
+            hi = position
+    return lo
+
+def read_range(datafile, model = 'AE33', start = None, end = None, **options):
+    # Same as read_datafile, but parses only the lines from 'start' to 'end' (both included),
+    # located by bisection on the byte offsets of the file (see line_offset)
+    with open(datafile, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        lo = data_offset(f, model)
+        hi = size
+        if start is not None:
+            lo = line_offset(f, model, start, lo, hi)
+        if end is not None:
+            hi = line_offset(f, model, end, lo, hi, after = True)
+        f.seek(lo)
+        text = f.read(max(hi - lo, 0))
+    return read_datafile(io.BytesIO(text), model, skiprows = 0, **options)
+
+def index_file(path, model = 'AE33', stat = None):
+    # Catalog entry of one datafile: model (None if the first data line does not match the
+    # format of the model), first and last timestamp, number of data rows, size and mtime
+    if stat is None:
+        stat = os.stat(path)
+    with open(path, 'rb') as f:
+        start = data_offset(f, model)
+        first = line_datetime(f.readline(), model)
+        rows = 0
+        tail = b''
+        f.seek(start)
+        for block in iter(lambda: f.read(1 << 20), b''):
+            rows += block.count(b'\n')
+            tail = (tail + block)[-4096:]
+    last = None
+    for line in reversed(tail.split(b'\n')):
+        if line.strip():
+            # an unterminated last line is counted as a row if it parses
+            last = line_datetime(line, model)
+            if last is not None:
+                break
+    if tail and not tail.endswith(b'\n') and line_datetime(tail.split(b'\n')[-1], model):
+        rows += 1
+    return {
+        'path': path,
+        'model': model if first is not None else None,
+        'first': first,
+        'last': last,
+        'rows': rows,
+        'size': stat.st_size,
+        'mtime': stat.st_mtime_ns
+        }
+
+class FileCatalog(object):
+    # Persistent index of the datafiles (data_path + file_mask) with one index_file entry per
+    # file, saved in the directory 'path'. update() rescans data_path with os.scandir only when
+    # its mtime changed (a file was added, removed or renamed); otherwise only the newest file
+    # (the one being written) is re-stat'ed. Files are re-indexed when their size or mtime
+    # changed. A file modified in place other than the newest is noticed on the next rescan
+    # (rebuild = True forces one).
+    def __init__(self, path, data_path, file_mask = '*', model = 'AE33', rebuild = False):
+        self.path = path
+        self.data_path = data_path
+        self.file_mask = file_mask
+        self.model = model
+        self.entries = {}       # file name: index_file entry
+        self.mtime = None       # mtime of data_path at the last scan
+        self.changed = False
+        text = '|'.join([os.path.abspath(data_path), file_mask, model])
+        self.entry = os.path.join(path, 'catalog_' + hashlib.sha1(text.encode()).hexdigest() + '.pkl')
+        if not rebuild:
+            self.load()
+
+    def load(self):
+        try:
+            with open(self.entry, 'rb') as f:
+                state = pickle.load(f)
+            self.entries, self.mtime = state['entries'], state['mtime']
+        except Exception:
+            self.entries, self.mtime = {}, None
+
+    def save(self):
+        try:
+            os.makedirs(self.path, exist_ok=True)
+            tmp = self.entry + '.tmp{}'.format(os.getpid())
+            with open(tmp, 'wb') as f:
+                pickle.dump({'entries': self.entries, 'mtime': self.mtime}, f)
+            os.replace(tmp, self.entry)
+            self.changed = False
+        except OSError as e:
+            print('could not save the file catalog to {0}: {1}'.format(self.path, e), file=sys.stderr)
+
+    def refresh(self, name, stat = None):
+        # Re-indexes the file 'name' if its size or mtime changed
+        path = os.path.join(self.data_path, name)
+        if stat is None:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                return
+        entry = self.entries.get(name)
+        if entry is None or (entry['size'], entry['mtime']) != (stat.st_size, stat.st_mtime_ns):
+            self.entries[name] = index_file(path, self.model, stat)
+            self.changed = True
+
+    def update(self):
+        mtime = os.stat(self.data_path).st_mtime_ns
+        if mtime == self.mtime:
+            newest = self.newest()
+            if newest:
+                self.refresh(os.path.basename(newest))
+        else:
+            names = set()
+            with os.scandir(self.data_path) as it:
+                for e in it:
+                    if fnmatch.fnmatch(e.name, self.file_mask) and e.is_file():
+                        names.add(e.name)
+                        self.refresh(e.name, e.stat())
+            for name in set(self.entries) - names:
+                del self.entries[name]
+            self.mtime = mtime
+            self.changed = True
+        if self.changed:
+            self.save()
+        return self
+
+    def newest(self):
+        # Path of the most recently modified file
+        if not self.entries:
+            return None
+        return max(self.entries.values(), key=lambda entry: entry['mtime'])['path']
+
+    def files(self, start = None, end = None):
+        # Paths of the files of the model with data between start and end, by first timestamp
+        entries = [entry for entry in self.entries.values()
+                   if entry['model'] == self.model and entry['first'] is not None
+                   and (end is None or entry['first'] <= end)
+                   and (start is None or entry['last'] is None or entry['last'] >= start)]
+        return [entry['path'] for entry in sorted(entries, key=lambda entry: entry['first'])]
+
+def compact_dtypes(df):
+    # Downcasts the numeric columns of df in place where lossless: integers to the smallest
+    # of int8/int16/int32 holding their range, floats to float32 if every value is exact
+    for column in df.columns:
+        values = df[column].to_numpy()
+        if values.dtype.kind in 'iu' and len(values):
+            for dtype in ['int8', 'int16', 'int32']:
+                info = np.iinfo(dtype)
+                if values.min() >= info.min and values.max() <= info.max:
+                    if values.dtype != dtype:
+                        df[column] = values.astype(dtype)
+                    break
+        elif values.dtype.kind == 'f' and values.dtype.itemsize > 4:
+            small = values.astype('float32')
+            if np.array_equal(small.astype(values.dtype), values, equal_nan=True):
+                df[column] = small
+    return df
+
+def compact_frame(df):
+    # A dataframe without the Date and Time strings (the index holds the time), downcast
+    # where lossless (compact_dtypes)
+    return compact_dtypes(df.drop(columns = [column for column in ['Date', 'Time'] if column in df]))
+
+def memory_usage(df):
+    # Bytes used by a dataframe, index and object (string) columns included
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+class SignalStore(object):
+    # Columns kept on disk as .npy files (one per column, plus the Datetime index) and read
+    # back memory-mapped. Without a path, a temporary directory removed with the store is used.
+    def __init__(self, path = None):
+        if path is None:
+            import tempfile
+            self.tmp = tempfile.TemporaryDirectory(prefix='aeth_signals_')
+            path = self.tmp.name
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.columns = []
+
+    def entry(self, name):
+        return os.path.join(self.path, hashlib.sha1(name.encode()).hexdigest() + '.npy')
+
+    def put(self, df):
+        # Stores the columns and the index of df
+        np.save(self.entry('Datetime'), df.index.to_numpy(dtype='datetime64[ns]'))
+        for column in df.columns:
+            np.save(self.entry(column), df[column].to_numpy())
+        self.columns = list(df.columns)
+
+    def get(self, column, index = None):
+        # Series of a stored column (memory-mapped), aligned to 'index' if given
+        values = np.load(self.entry(column), mmap_mode='r')
+        stored = pd.DatetimeIndex(np.load(self.entry('Datetime'), mmap_mode='r'), name='Datetime')
+        series = pd.Series(values, index=stored, name=column, copy=False)
+        if index is not None and not stored.equals(index):
+            series = series.reindex(index)
+        return series
+
+    def size(self):
+        return sum(os.path.getsize(self.entry(column)) for column in self.columns + ['Datetime'])
 
 class Aethalometer(object):
-    def __init__(self, datafile, model = 'AE33'): # datafile is a valid filepointer
-        AE33 = [
-            'Date',
-            'Time',
-            'Timebase',
-            'RefCh1',
-            'Sen1Ch1',
-            'Sen2Ch1',
-            'RefCh2',
-            'Sen1Ch2',
-            'Sen2Ch2',
-            'RefCh3',
-            'Sen1Ch3',
-            'Sen2Ch3',
-            'RefCh4',
-            'Sen1Ch4',
-            'Sen2Ch4',
-            'RefCh5',
-            'Sen1Ch5',
-            'Sen2Ch5',
-            'RefCh6',
-            'Sen1Ch6',
-            'Sen2Ch6',
-            'RefCh7',
-            'Sen1Ch7',
-            'Sen2Ch7',
-            'Flow1',
-            'Flow2',
-            'FlowC',
-            'Pressure',
-            'Temperature',
-            'BB',
-            'ContTemp',
-            'SupplyTemp',
-            'Status',
-            'ContStatus',
-            'DetectStatus',
-            'LedStatus',
-            'ValveStatus',
-            'LedTemp',
-            'BC11',
-            'BC12',
-            'BC1',
-            'BC21',
-            'BC22',
-            'BC2',
-            'BC31',
-            'BC32',
-            'BC3',
-            'BC41',
-            'BC42',
-            'BC4',
-            'BC51',
-            'BC52',
-            'BC5',
-            'BC61',
-            'BC62',
-            'BC6',
-            'BC71',
-            'BC72',
-            'BC7',
-            'K1',
-            'K2',
-            'K3',
-            'K4',
-            'K5',
-            'K6',
-            'K7',
-            'TapeAdvCount',
-            'ID_com1',
-            'ID_com2',
-            'ID_com3']
-
-        AE31 = [
-            'Date',
-            'Time',
-            'BC1',
-            'BC2',
-            'BC3',
-            'BC4',
-            'BC5',
-            'BC6',
-            'BC7',
-            'vflow',
-            'Sample zero signal 1',
-            'sensing beam signal 1',
-            'reference zero signal 1',
-            'reference beam signal 1',
-            'fra 1',
-            'optical attenuation 1',
-            'Sample zero signal 2',
-            'sensing beam signal 2',
-            'reference zero signal 2',
-            'reference beam signal 2',
-            'fra 2',
-            'optical attenuation 2',
-            'Sample zero signal 3',
-            'sensing beam signal 3',
-            'reference zero signal 3',
-            'reference beam signal 3',
-            'fra 3',
-            'optical attenuation 3',
-            'Sample zero signal 4',
-            'sensing beam signal 4',
-            'reference zero signal 4',
-            'reference beam signal 4',
-            'fra 4',
-            'optical attenuation 4',
-            'Sample zero signal 5',
-            'sensing beam signal 5',
-            'reference zero signal 5',
-            'reference beam signal 5',
-            'fra 5',
-            'optical attenuation 5',
-            'Sample zero signal 6',
-            'sensing beam signal 6',
-            'reference zero signal 6',
-            'reference beam signal 6',
-            'fra 6',
-            'optical attenuation 6',
-            'Sample zero signal 7',
-            'sensing beam signal 7',
-            'reference zero signal 7',
-            'reference beam signal 7',
-            'fra 7',
-            'optical attenuation 7',
-            'massfl'
-            ]
-        
+    def __init__(self, datafile = None, model = 'AE33', fast = False, columns = None, dtypes = None,
+                 cache = None):
+        # datafile is a valid filepointer or path (None for an empty object).
+        # cache is an optional FileCache used to load datafile paths.
+        # fast = True reads with explicit dtypes (MODELS[model]['dtypes'], updated by 'dtypes')
+        # and the fixed datetime format of the model. 'columns' restricts the columns read
+        # (Date and Time are always read).
         self.BCKeys = ['BC1', 'BC2', 'BC3', 'BC4', 'BC5', 'BC6', 'BC7']
         self.BCKey = 'BC6'
 
+        if model not in MODELS:
+            raise Exception("Aethalometer model {} unknown".format(model))
+        self.model = model
+        self.sources = []       # files loaded by from_files
+        self.options = {}       # reader (from_files), quality and recompute options applied to self.df
+        self.rejected = None    # Datetime index of the rows dropped by quality()
+        self.signals = None     # SignalStore of the columns moved out of self.df by compact()
         if model == 'AE33':
-            columns = AE33
-            separator = " "
-            skiprows = 8
-            append_text = ""
             self.BCKeys.append('BB')
-        elif model == 'AE31':
-            columns = AE31
-            separator = ","
-            skiprows = 0
-            append_text = ":00"
-        else:
-            raise Exception("Aethalometer model {} unknown".format(model)) 
-
 
         self.units = {
             'Timebase': 'seconds',
@@ -411,29 +2063,798 @@ class Aethalometer(object):
             'BC7': 950
             }
 
-        #Date(yyyy/MM/dd); Time(hh:mm:ss)
-        self.df = pd.read_csv(
-            datafile,               # relative python path to subdirectory
-            index_col = False,
-            names = columns,        # use list of names
-            sep=separator,          # Space-separated value file.
-            quotechar='"',          # double quote allowed as quote character
-            skiprows=skiprows       # Skip the first 8 rows of the file
-        )
+        if datafile is None:
+            self.df = pd.DataFrame(index=pd.DatetimeIndex([], name='Datetime'))
+        elif cache is not None and regular_file(datafile):
+            self.df = cache.load(datafile, model, fast = fast, columns = columns, dtypes = dtypes)
+        else:
+            self.df = read_datafile(datafile, model, fast = fast, columns = columns, dtypes = dtypes)
+
+    @classmethod
+    def from_files(cls, paths, model = 'AE33', workers = None, cache = None, start = None, end = None,
+                   **options):
+        # Loads several files into one object. Files missing from the (optional) cache are
+        # parsed on a pool of 'workers' processes (default: number of CPUs), the frames are
+        # concatenated once, sorted by time and overlapping timestamps (e.g. the midnight
+        # record repeated in consecutive AE33 daily files) are dropped, keeping the first.
+        # With 'start' and/or 'end' only that time range is kept; uncached files are then
+        # parsed only in the byte range of the lines in it (see read_range) and not cached.
+        # '-' (stdin), pipes and devices are read in this process, without the cache.
+        # data.sources lists path, size, mtime, first and last timestamp of each file
+        # (size and mtime are None for stdin and pipes).
+        data = cls(model = model)
+        data.options['reader'] = sorted(options.items())
+        stats = [os.stat(filename) if regular_file(filename) else None for filename in paths]
+        frames = [None] * len(paths)
+        missing = []
+        with profiler.stage('cache') as stage:
+            for i, filename in enumerate(paths):
+                if cache is not None and stats[i] is not None:
+                    frames[i] = cache.get(filename, model, **options)
+                if frames[i] is None and stats[i] is not None:
+                    missing.append(i)
+            stage.rows = sum(len(df) for df in frames if df is not None)
+
+        if workers is None:
+            workers = os.cpu_count() or 1
+        workers = min(workers, len(missing))
+        with profiler.stage('parse') as stage:
+            if workers > 1:
+                from concurrent.futures import ProcessPoolExecutor
+                tasks = [(paths[i], model, options, start, end, profiler.enabled) for i in missing]
+                with ProcessPoolExecutor(max_workers = workers) as pool:
+                    parsed = list(pool.map(_read_datafile_task, tasks))
+                if profiler.enabled:
+                    # stages recorded in the workers
+                    for df, stages in parsed:
+                        profiler.stages.extend(stages)
+                    parsed = [df for df, stages in parsed]
+            else:
+                parsed = [_read_datafile_task((paths[i], model, options, start, end, False)) for i in missing]
+            for i, filename in enumerate(paths):
+                if stats[i] is None:
+                    frames[i] = read_datafile(filename, model, **options)
+            stage.rows = sum(len(df) for df in parsed) + sum(len(frames[i]) for i in range(len(paths))
+                                                              if stats[i] is None)
+        with profiler.stage('cache_write'):
+            for i, df in zip(missing, parsed):
+                frames[i] = df
+                if cache is not None and start is None and end is None:
+                    cache.put(paths[i], df, model, **options)
+        if start is not None or end is not None:
+            # cached frames hold the whole file
+            for i, df in enumerate(frames):
+                keep = np.ones(len(df), dtype=bool)
+                if start is not None:
+                    keep &= df.index >= start
+                if end is not None:
+                    keep &= df.index <= end
+                frames[i] = df[keep]
+        for filename, stat, df in zip(paths, stats, frames):
+            data.sources.append({
+                'path': filename if stat is None else os.path.abspath(filename),
+                'size': None if stat is None else stat.st_size,
+                'mtime': None if stat is None else stat.st_mtime_ns,
+                'first': df.index.min() if len(df) else None,
+                'last': df.index.max() if len(df) else None
+                })
+
+        if frames:
+            with profiler.stage('concat') as stage:
+                df = pd.concat(frames) if len(frames) > 1 else frames[0]
+                if not df.index.is_monotonic_increasing:
+                    df = df.sort_index(kind = 'mergesort')
+                if df.index.has_duplicates:
+                    df = df[~df.index.duplicated(keep = 'first')]
+                data.df = df
+                stage.rows = len(df)
+        return data
+
+    def timebase(self):
+        # Sampling period in seconds, from the AE33 Timebase column or the median time step
+        if 'Timebase' in self.df and self.df['Timebase'].notna().any():
+            return float(self.df['Timebase'].median())
+        steps = self.df.index.to_series().diff().dt.total_seconds()
+        steps = steps[steps > 0]
+        return float(steps.median()) if len(steps) else np.nan
+
+    def quality(self, rules = None, tape_window = 0):
+        # Drops the rows failing the quality rules (default: MODELS[model]['quality']) or within
+        # tape_window seconds of a tape advance, see quality_mask. The mask is computed once
+        # for all columns; the dropped timestamps are kept in self.rejected, and the interval
+        # functions then report the number of rejected rows per interval.
+        if rules is None:
+            rules = MODELS[self.model]['quality']
+        if not self.df.index.is_monotonic_increasing:
+            self.df = self.df.sort_index(kind = 'mergesort')
+        rejected = quality_mask(self.df, rules, MODELS[self.model]['tape_column'], tape_window)
+        self.options['quality'] = (sorted(rules.items()), tape_window)
+        self.rejected = self.df.index[rejected]
+        self.df = self.df[~rejected]
+        return len(self.rejected)
+
+    def recompute(self, **options):
+        # Replaces BC1-BC7 by the values recomputed from the raw signals and adds the attenuation
+        # columns ATN1-ATN7 (see recompute_bc for the options). BB is left as read.
+        # Returns the number of filter spots.
+        df, starts = recompute_bc(self, **options)
+        self.options['recompute'] = sorted(options.items())
+        for column in df:
+            self.df[column] = df[column]
+        return int(starts.sum())
+
+    def compact(self, path = None):
+        # Reduces the memory used by self.df: drops the Date and Time strings, downcasts the
+        # numeric columns where lossless (compact_frame) and moves the raw signal columns
+        # (MODELS[model]['signals']) to a memory-mapped SignalStore in 'path' (a temporary
+        # directory if None), read back on demand with signal(column). Data read with the
+        # reader option compact = True (see read_datafile) is already downcast.
+        # Returns the bytes used by self.df before and after.
+        before = memory_usage(self.df)
+        df = self.df
+        signals = [column for column in MODELS[self.model]['signals'] if column in df]
+        if signals:
+            self.signals = SignalStore(path)
+            self.signals.put(compact_dtypes(df[signals].copy()))
+            df = df.drop(columns=signals)
+        self.df = compact_frame(df)
+        return before, memory_usage(self.df)
 
-        #self.df['Datetime'] = pd.to_datetime(self.df['Date'] + " " + self.df['Time'], infer_datetime_format=True)
-        self.df['Datetime'] = pd.to_datetime(self.df['Date'] + " " + self.df['Time'])
-        self.df = self.df.set_index('Datetime')
+    def signal(self, column):
+        # A column of self.df, or of the raw signals moved to the SignalStore by compact()
+        if column in self.df or self.signals is None or column not in self.signals.columns:
+            return self.df[column]
+        return self.signals.get(column, self.df.index)
 
     def getSubset(self, start, end):
         return self.df.loc[pd.to_datetime(start):pd.to_datetime(end), self.BCKeys]
 
+FAST_COLUMNS = ['Timebase', 'Status', 'BC1', 'BC2', 'BC3', 'BC4', 'BC5', 'BC6', 'BC7', 'BB']
+
+def fast_options(model = 'AE33', rules = None, recompute = None):
+    # Reader options of --fast: the BC columns, plus the columns of the quality rules if given
+    # and those of recompute_bc if 'recompute' (its options, e.g. {'correction': 'ae33'}) is given
+    columns = list(FAST_COLUMNS)
+    if rules is not None:
+        columns += list(rules) + [MODELS[model]['tape_column']]
+    if recompute is not None:
+        columns += optics_columns(model, recompute.get('correction'))
+    return dict(fast = True, columns = columns)
+
+def stream_options(keys):
+    # Reader options of the streaming modes: the fast reader for the 'keys' columns only
+    return dict(fast = True, columns = list(keys))
+
+def interval_series(interval_df, bckey, stats = None):
+    # Plotted column of an interval table: bckey, or with stats its mean (or first statistic)
+    if stats:
+        plotted = [stat for stat in stats if stat != 'count'] or stats
+        return interval_df[bckey + '_' + ('mean' if 'mean' in plotted else plotted[0])]
+    return interval_df[bckey]
+
+def plot_labels(data, key):
+    # create_plot keyword arguments title, ytitle and yunits of a BC key of 'data' (Aethalometer)
+    plotTitle = "Aethalometer Model " + data.model
+    if data.wavelengths.get(key):
+        plotTitle = plotTitle + " ($\lambda=$" + str(data.wavelengths.get(key)) + "nm)"
+        ytitle="Equivalent Black Carbon"
+    else:
+        ytitle = "Biomass Burning Fraction"
+    return dict(title=plotTitle, ytitle=ytitle, yunits=data.units.get(key))
+
+def plot_data(data, y, outfile = None, max_points = 5000):
+    # create_plot of a series of 'data' (Aethalometer) with the title and units of data.BCKey
+    from aeth_plot import create_plot
+    create_plot(y, outfile=outfile, max_points=max_points, **plot_labels(data, data.BCKey))
+
+STATION_SECTION = 'STATION:'
+
+def read_stations(config, names = None):
+    # Stations defined by the [STATION:<name>] sections of a configparser object, in file order.
+    # Each section may set MODEL, DATA_PATH, FILE_EXT, FREQ, INTERVAL, BOUNDARIES, BCKEY, CACHE_PATH,
+    # CACHE_SIZE and OUT (result file); missing keys are taken from [GENERAL_SETTINGS]. Values are python
+    # literals as in [GENERAL_SETTINGS]. A section that cannot be read gets an 'error' entry
+    # instead of stopping the others. 'names' selects stations (KeyError for unknown names).
+    general = dict(config['GENERAL_SETTINGS']) if config.has_section('GENERAL_SETTINGS') else {}
+    stations = []
+    for section in config.sections():
+        if not section.startswith(STATION_SECTION):
+            continue
+        name = section[len(STATION_SECTION):].strip()
+        if names and name not in names:
+            continue
+        settings = dict(general)
+        settings.update(config[section])
+        station = {'name': name}
+        try:
+            value = lambda key, default = None: eval(settings[key]) if settings.get(key) else default
+            station['model'] = value('model', 'AE33').upper()
+            if station['model'] not in MODELS:
+                raise ValueError('unknown model {0}'.format(station['model']))
+            data_path = value('data_path')
+            if not data_path:
+                raise ValueError('no DATA_PATH')
+            station['data_path'] = os.path.join(data_path, '')
+            station['file_mask'] = '*' + value('file_ext', '.dat')
+            station['freq'] = value('freq', 'HOURLY').upper()
+            if station['freq'] not in FREQUENCIES:
+                raise ValueError('FREQ must be one of {0}'.format(', '.join(FREQUENCIES)))
+            station['interval'] = value('interval') or (10 if station['freq'] == 'SECONDLY' else 1)
+            station['bckey'] = value('bckey', 'BC6').upper()
+            boundaries = value('boundaries', 'COMPAT').upper()
+            if boundaries not in BOUNDARIES:
+                raise ValueError('BOUNDARIES must be one of {0}'.format(', '.join(BOUNDARIES)))
+            station['compat'] = boundaries == 'COMPAT'
+            station['cache_path'] = value('cache_path') or default_cache_path(station['data_path'])
+            station['cache_size'] = value('cache_size', 512)
+            station['out'] = value('out')
+        except Exception as e:
+            station['error'] = 'invalid [{0}] settings: {1}'.format(section, e)
+        stations.append(station)
+    if names:
+        unknown = set(names) - set(station['name'] for station in stations)
+        if unknown:
+            raise KeyError('no station {0} in the configuration'.format(', '.join(sorted(unknown))))
+    return stations
+
+def process_station(station, options = None):
+    # Loads the newest file of a station (or the files covering options 'start'/'end', from
+    # its file catalog), calculates its intervals and writes them to station['out'] (default
+    # options 'out_dir'/<name>.<format>), plus a plot <name>.png there with options 'plot'.
+    # Other options: fast, quality, rules (replacing MODELS[model]['quality'] rules), tape_window,
+    # stats, nocache, rebuild, format, max_points. Returns the number of files, rows and
+    # intervals and the seconds per stage.
+    options = options or {}
+    t0 = time.perf_counter()
+    seconds = {}
+    model = station['model']
+    start, end = options.get('start'), options.get('end')
+    if start is not None:
+        start = window_start(start, station['freq'], station['interval'], station.get('compat', True))
+    catalog = FileCatalog(station['cache_path'], station['data_path'], station['file_mask'], model,
+                          rebuild = options.get('rebuild', False))
+    if not os.path.isdir(station['data_path']):
+        raise FileNotFoundError('no directory {0}'.format(station['data_path']))
+    catalog.update()
+    if start is not None or end is not None:
+        files = catalog.files(start, end)
+    else:
+        files = [catalog.newest()] if catalog.newest() else []
+    if not files:
+        raise FileNotFoundError('no {0} files in {1}'.format(station['file_mask'], station['data_path']))
+
+    rules = None
+    if options.get('quality'):
+        rules = dict(MODELS[model]['quality'])
+        rules.update(options.get('rules') or {})
+    reader_options = fast_options(model, rules) if options.get('fast') else {}
+    cache = None
+    if not options.get('nocache'):
+        cache = FileCache(station['cache_path'], max_size = station['cache_size']*1024*1024,
+                          rebuild = options.get('rebuild', False))
+    data = Aethalometer.from_files(files, model, workers = 1, cache = cache, start = start, end = end,
+                                   **reader_options)
+    if not len(data.df):
+        raise ValueError('no data in {0}'.format(', '.join(files)))
+    if rules is not None:
+        data.quality(rules, tape_window = options.get('tape_window', 60))
+    data.BCKey = station['bckey']
+    seconds['read'] = time.perf_counter() - t0
+
+    t = time.perf_counter()
+    interval_df = calculate_intervals(data, station['freq'], interval = station['interval'],
+                                      compat = station.get('compat', True), stats = options.get('stats'))
+    seconds['intervals'] = time.perf_counter() - t
+
+    t = time.perf_counter()
+    format = options.get('format') or 'csv'
+    out_dir = options.get('out_dir') or '.'
+    out = station['out'] or os.path.join(out_dir, station['name'] + '.' + format)
+    os.makedirs(os.path.dirname(out) or '.', exist_ok=True)
+    with ResultWriter(out, None if station['out'] else format, data.units) as writer:
+        writer.write(interval_df)
+    seconds['output'] = time.perf_counter() - t
+
+    if options.get('plot'):
+        t = time.perf_counter()
+        plot_data(data, interval_series(interval_df, data.BCKey, options.get('stats')),
+                  outfile = os.path.join(out_dir, station['name'] + '.png'),
+                  max_points = options.get('max_points', 5000))
+        seconds['plot'] = time.perf_counter() - t
+    seconds['total'] = time.perf_counter() - t0
+    return {'files': len(files), 'rows': len(data.df), 'intervals': len(interval_df), 'out': out,
+            'seconds': seconds}
+
+def _process_station_task(task):
+    # Pool task: (result, None) or (None, error message); exceptions do not leave the worker
+    station, options = task
+    try:
+        return process_station(station, options), None
+    except Exception as e:
+        return None, '{0}: {1}'.format(type(e).__name__, e)
+
+def run_stations(stations, workers = None, options = None):
+    # Processes the stations (read_stations) on a pool of 'workers' processes (default: number of
+    # CPUs), one station per task, and yields (station, result, error) as they finish. A station
+    # that fails is reported with its error and does not stop the others. The pool is created
+    # once, after pandas, numpy (and matplotlib for plots) are imported, so forked workers share
+    # the import cost.
+    # A worker that dies (e.g. killed for its memory use) breaks the pool; the stations it was
+    # running are then retried one at a time.
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+    from concurrent.futures.process import BrokenProcessPool
+    ready = []
+    for station in stations:
+        if station.get('error'):
+            yield station, None, station['error']
+        else:
+            ready.append(station)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = min(workers, len(ready))
+    if workers <= 1:
+        for station in ready:
+            yield (station,) + _process_station_task((station, options))
+        return
+
+    for module in ('numpy', 'pandas'):
+        importlib.import_module(module)
+    if (options or {}).get('plot'):
+        # plots are written to files: load matplotlib once, with the non-interactive backend
+        import aeth_plot
+        aeth_plot.pyplot('Agg')
+    broken = []
+    with ProcessPoolExecutor(max_workers = workers) as pool:
+        futures = {pool.submit(_process_station_task, (station, options)): station for station in ready}
+        for future in as_completed(futures):
+            try:
+                result, error = future.result()
+            except BrokenProcessPool:
+                broken.append(futures[future])
+                continue
+            yield (futures[future], result, error)
+    for station in broken:
+        with ProcessPoolExecutor(max_workers = 1) as pool:
+            try:
+                result, error = pool.submit(_process_station_task, (station, options)).result()
+            except BrokenProcessPool:
+                result, error = None, 'worker process died'
+        yield station, result, error
+
+def batch_summary(results, out = sys.stderr):
+    # Table of (station, result, error) from run_stations: counts and seconds per stage
+    print('{0:<16}{1:>6}{2:>7}{3:>10}{4:>11}{5:>9}{6:>11}{7:>9}{8:>9}{9:>9}  {10}'.format(
+          'station', 'model', 'files', 'rows', 'intervals', 'read', 'intervals', 'output', 'plot',
+          'total', 'status'), file=out)
+    for station, result, error in results:
+        if result is None:
+            print('{0:<16}{1:>6}{2:>75}  {3}'.format(station['name'], station.get('model', '-'), '', error),
+                  file=out)
+            continue
+        seconds = result['seconds']
+        print('{0:<16}{1:>6}{2:>7}{3:>10}{4:>11}{5:>9.2f}{6:>11.2f}{7:>9.2f}{8:>9}{9:>9.2f}  ok ({10})'.format(
+              station['name'], station['model'], result['files'], result['rows'], result['intervals'],
+              seconds['read'], seconds['intervals'], seconds['output'],
+              '{:.2f}'.format(seconds['plot']) if 'plot' in seconds else '-', seconds['total'], result['out']),
+              file=out)
+
+REPORT_PERIODS = {
+    'day':   ('D', '%Y-%m-%d'),
+    'week':  ('W', '%Y-%m-%d'),     # from Monday
+    'month': ('M', '%Y-%m'),
+    'all':   (None, None)
+    }
+
+def report_periods(index, period = 'day', closed = 'left'):
+    # (start, end, label) of the calendar periods ('day', 'week', 'month' or 'all') covering a DatetimeIndex;
+    # closed = 'right' for interval tables indexed by the window end (a period end belongs to the period before)
+    if not len(index):
+        return []
+    first, last = index.min(), index.max()
+    unit, label = REPORT_PERIODS[period]
+    if unit is None:
+        return [(first, last, 'all')]
+    if closed == 'right':
+        first, last = first - pd.Timedelta(1), last - pd.Timedelta(1)
+    starts = pd.period_range(first, last, freq = unit)
+    return [(p.start_time, (p + 1).start_time, p.start_time.strftime(label)) for p in starts]
+
+_report = {}    # state of the render_report workers: frame, options and the reused figure
+
+def _report_init(frame, labels, options):
+    # render_report worker initializer: one figure with the create_plot layout per process
+    from aeth_plot import plot_figure
+    _report.update(frame = frame, labels = labels, options = options, figure = plot_figure())
+
+def _render_report_task(task):
+    # Renders one (key, start, end, label, path) plot: (path, None) or (path, error message)
+    key, start, end, label, path = task
+    options = _report['options']
+    try:
+        y = _report['frame'][key]
+        if label != 'all':
+            if options['closed'] == 'right':
+                y = y[(y.index > start) & (y.index <= end)]
+            else:
+                y = y[(y.index >= start) & (y.index < end)]
+        if not y.notna().any():
+            return path, 'no data'
+        from aeth_plot import draw_plot
+        figure, ax_scatter, ax_box = _report['figure']
+        labels = dict(_report['labels'][key])
+        labels['title'] += ', ' + label
+        draw_plot(ax_scatter, ax_box, y, max_points = options['max_points'], **labels)
+        figure.savefig(path, dpi = options['dpi'])
+        return path, None
+    except Exception as e:
+        return path, '{0}: {1}'.format(type(e).__name__, e)
+
+def render_report(frame, keys, periods, out, labels, workers = None, max_points = 5000, closed = 'left',
+                  dpi = 100, format = 'png'):
+    # Renders the create_plot figure of each of the 'keys' columns of 'frame' (a Datetime indexed
+    # dataframe, e.g. an interval table) for each of the 'periods' (report_periods) on a pool of
+    # 'workers' processes (default: number of CPUs), as <out>/<key>_<label>.<format> files or,
+    # if 'out' ends with .pdf, as the pages of one PDF file (period by period, images of 'dpi').
+    # 'labels' gives the create_plot title, ytitle and yunits per key (plot_labels). Each worker
+    # gets the frame once (pool initializer) and reuses one figure for all its plots. Rows of
+    # a period are those with start <= t < end, or start < t <= end with closed = 'right' (for
+    # interval tables indexed by their end). Returns [(key, label, path, error)]; periods
+    # without data of a key are reported as 'no data' errors.
+    pdf = out.lower().endswith('.pdf')
+    if pdf:
+        import tempfile
+        directory = tempfile.mkdtemp(prefix = 'aeth_report_')
+        format = 'png'
+    else:
+        directory = out
+        os.makedirs(directory, exist_ok = True)
+    tasks = [(key, start, end, label, os.path.join(directory, '{0}_{1}.{2}'.format(key, label, format)))
+             for start, end, label in periods for key in keys]
+    options = dict(closed = closed, max_points = max_points, dpi = dpi)
+    frame = frame[list(keys)]
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = min(workers, len(tasks))
+    if workers <= 1:
+        _report_init(frame, labels, options)
+        results = [_render_report_task(task) for task in tasks]
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+        import aeth_plot                # imported once, before forking
+        with ProcessPoolExecutor(max_workers = workers, initializer = _report_init,
+                                 initargs = (frame, labels, options)) as pool:
+            results = list(pool.map(_render_report_task, tasks, chunksize = max(1, len(tasks) // (4*workers))))
+    results = [(task[0], task[3], path, error) for task, (path, error) in zip(tasks, results)]
+    if pdf:
+        from matplotlib.backends.backend_pdf import PdfPages
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.figure import Figure
+        import matplotlib.image
+        with PdfPages(out) as pages:
+            for key, label, path, error in results:
+                if error:
+                    continue
+                image = matplotlib.image.imread(path)
+                page = Figure(figsize = (image.shape[1] / dpi, image.shape[0] / dpi), dpi = dpi)
+                FigureCanvasAgg(page)
+                page.figimage(image)
+                pages.savefig(page, dpi = dpi)
+        import shutil
+        shutil.rmtree(directory, ignore_errors = True)
+        results = [(key, label, None if error else out, error) for key, label, path, error in results]
+    return results
+
+LEVELS = [('HOURLY', 1), ('MINUTELY', 1), ('SECONDLY', 10)]
+
+def level_sums(df, keys, step):
+    # Interval numbers (start // step, in ns since the epoch) of the samples of a sorted
+    # 'Datetime' indexed dataframe, with the sums and non-NaN counts of the 'keys' columns
+    t = np.asarray(df.index, dtype='datetime64[ns]').view('int64')
+    if not len(t):
+        return np.array([], dtype='int64'), np.zeros((0, len(keys))), np.zeros((0, len(keys)), dtype='int64')
+    values = df[keys].to_numpy(dtype='float64')
+    valid = ~np.isnan(values)
+    bins = t // step
+    first = np.concatenate(([0], np.flatnonzero(np.diff(bins)) + 1))
+    return (bins[first], np.add.reduceat(np.where(valid, values, 0), first, axis=0),
+            np.add.reduceat(valid.astype('int64'), first, axis=0))
+
+class IntervalServer(object):
+    # In-memory query engine of the 'aeth.py --serve' daemon. The files of a FileCatalog are
+    # loaded on demand as segments (one per file: the BC key columns and, for each of the
+    # 'levels', the per-interval sums and counts) and kept in LRU order within 'memory' bytes.
+    # refresh() updates the catalog, reads only the lines appended to loaded files and
+    # recomputes only their last intervals. query() merges the level sums of the segments in
+    # range (aggregation levels are aligned to midnight, so they need to divide a day), also
+    # for multiples of a level that divide a day (e.g. 4-hourly from hourly sums), or sums
+    # their raw data in the same epoch-aligned windows for other lengths.
+    def __init__(self, catalog, model = 'AE33', levels = LEVELS, memory = 512*1024*1024, cache = None):
+        self.catalog = catalog
+        self.model = model
+        self.keys = Aethalometer(model = model).BCKeys
+        self.units = Aethalometer(model = model).units
+        self.steps = {tuple(level): pd.Timedelta(level[1], unit = FREQUENCIES[level[0]]).value
+                      for level in levels}
+        self.memory = memory
+        self.cache = cache
+        self.segments = collections.OrderedDict()     # path: segment, least recently used first
+        self.lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def entries(self):
+        # Catalog entries of the model, by first timestamp
+        return sorted((entry for entry in self.catalog.entries.values()
+                       if entry['model'] == self.model and entry['first'] is not None),
+                      key = lambda entry: entry['first'])
+
+    def segment(self, path):
+        # The loaded segment of a file (loading it on a miss), marked as most recently used
+        segment = self.segments.get(path)
+        if segment is not None:
+            self.hits += 1
+            self.segments.move_to_end(path)
+            return segment
+        self.misses += 1
+        stat = os.stat(path)
+        options = stream_options(self.keys)
+        if self.cache is not None:
+            df = self.cache.load(path, self.model, **options)
+        else:
+            df = read_datafile(path, self.model, **options)
+        df = df[self.keys]
+        if not df.index.is_monotonic_increasing:
+            df = df.sort_index(kind = 'mergesort')
+        # samples of the previous file (e.g. the midnight record of AE33 daily files) are
+        # kept there, as Aethalometer.from_files keeps the first of duplicated timestamps
+        previous = None
+        for entry in self.entries():
+            if entry['path'] == path:
+                break
+            previous = entry
+        if previous is not None and previous['last'] is not None:
+            df = df[df.index > previous['last']]
+        df = df[~df.index.duplicated(keep = 'first')]
+        segment = {'df': df, 'stat': (stat.st_size, stat.st_mtime_ns),
+                   'follower': FileFollower(path, self.model, offset = stat.st_size, **options)}
+        segment['levels'] = {level: level_sums(df, self.keys, step) for level, step in self.steps.items()}
+        self.size(segment)
+        self.segments[path] = segment
+        return segment
+
+    def size(self, segment):
+        segment['size'] = memory_usage(segment['df']) + sum(
+            sum(array.nbytes for array in arrays) for arrays in segment['levels'].values())
+        return segment['size']
+
+    def append(self, segment, df):
+        # Adds newer samples to a segment; the level intervals from the first new one on are recomputed
+        df = df[self.keys]
+        old = segment['df']
+        if len(old):
+            df = df[df.index > old.index[-1]]
+        if not len(df):
+            return
+        segment['df'] = new = pd.concat([old, df])
+        t0 = df.index[0].value
+        for level, step in self.steps.items():
+            bins, sums, counts = segment['levels'][level]
+            keep = bins < t0 // step
+            lo = np.searchsorted(np.asarray(new.index, dtype='datetime64[ns]').view('int64'),
+                                 (t0 // step) * step)
+            tail = level_sums(new.iloc[lo:], self.keys, step)
+            segment['levels'][level] = (np.concatenate((bins[keep], tail[0])),
+                                        np.concatenate((sums[keep], tail[1])),
+                                        np.concatenate((counts[keep], tail[2])))
+        self.size(segment)
+
+    def refresh(self):
+        # Picks up new, grown, changed and removed files
+        with self.lock:
+            self.catalog.update()
+            entries = {entry['path']: entry for entry in self.catalog.entries.values()}
+            for path, segment in list(self.segments.items()):
+                entry = entries.get(path)
+                if entry is None:
+                    del self.segments[path]
+                elif (entry['size'], entry['mtime']) != segment['stat']:
+                    if entry['size'] > segment['stat'][0]:
+                        # appended lines only
+                        df = segment['follower'].read()
+                        if df is not None:
+                            self.append(segment, df)
+                        segment['stat'] = (entry['size'], entry['mtime'])
+                    else:
+                        del self.segments[path]     # rewritten: reloaded when queried
+            self.evict()
+
+    def evict(self, keep = ()):
+        # Drops least recently used segments while over the memory budget (not those in 'keep')
+        total = sum(segment['size'] for segment in self.segments.values())
+        for path in list(self.segments):
+            if total <= self.memory or len(self.segments) <= 1:
+                break
+            if path in keep:
+                continue
+            total -= self.segments.pop(path)['size']
+            self.evictions += 1
+
+    def warm(self):
+        # Loads the newest files until the memory budget is used
+        with self.lock:
+            total = 0
+            for entry in reversed(self.entries()):
+                total += self.segment(entry['path'])['size']
+                if total >= self.memory:
+                    break
+            self.evict()
+
+    def query(self, start = None, end = None, freq = 'HOURLY', interval = 1, keys = None):
+        # Intervals (calculate_intervals format, decimals = 0) of the 'keys' columns covering
+        # start..end (pd.Timestamp or None for the first/last sample). The windows are counted
+        # from the epoch (from midnight for lengths dividing a day) and always complete.
+        keys = list(keys or self.keys)
+        unknown = [key for key in keys if key not in self.keys]
+        if unknown:
+            raise ValueError('unknown key {0} (use {1})'.format(', '.join(unknown), ', '.join(self.keys)))
+        if freq not in FREQUENCIES:
+            raise ValueError('unknown frequency {0}'.format(freq))
+        if isinstance(interval, bool) or not isinstance(interval, (int, np.integer)) or interval < 1:
+            raise ValueError('interval must be a positive integer, not {0}'.format(interval))
+        columns = [self.keys.index(key) for key in keys]
+        # merged from the coarsest level dividing the step (if the step divides a day)
+        step = pd.Timedelta(interval, unit = FREQUENCIES[freq]).value
+        levels = [level for level, level_step in self.steps.items()
+                  if pd.Timedelta(days = 1).value % step == 0 and step % level_step == 0]
+        level = max(levels, key = self.steps.get) if levels else None
+        with self.lock:
+            paths = [entry['path'] for entry in self.entries()
+                     if (end is None or entry['first'] <= end)
+                     and (start is None or entry['last'] is None or entry['last'] >= start)]
+            segments = [self.segment(path) for path in paths]
+            if level is not None:
+                bins = np.concatenate([segment['levels'][level][0] for segment in segments] or [[]])
+                sums = np.concatenate([segment['levels'][level][1][:, columns]
+                                       for segment in segments] or [np.zeros((0, len(keys)))])
+                counts = np.concatenate([segment['levels'][level][2][:, columns]
+                                         for segment in segments] or [np.zeros((0, len(keys)))])
+            else:
+                frames = [segment['df'][keys] for segment in segments]
+            self.evict(keep = paths)
+
+        if level is None:
+            # the windows of the levels (counted from the epoch), whole also at start and end
+            df = pd.concat(frames) if frames else pd.DataFrame(columns = keys, dtype = float)
+            t = np.asarray(df.index, dtype='datetime64[ns]').view('int64')
+            lo = np.searchsorted(t, start.value // step * step) if start is not None else 0
+            hi = np.searchsorted(t, (end.value // step + 1) * step) if end is not None else len(t)
+            bins, sums, counts = level_sums(df.iloc[lo:hi], keys, step)
+        else:
+            bins = bins.astype('int64') * self.steps[level] // step
+        if len(bins):
+            # the same interval may be in two segments (files split within an interval) or levels
+            order = np.argsort(bins, kind = 'stable')
+            bins, sums, counts = bins[order], sums[order], counts[order]
+            first = np.concatenate(([0], np.flatnonzero(np.diff(bins)) + 1))
+            bins = bins[first]
+            sums = np.add.reduceat(sums, first, axis=0)
+            counts = np.add.reduceat(counts, first, axis=0)
+            keep = np.ones(len(bins), dtype=bool)
+            if start is not None:
+                keep &= bins >= start.value // step
+            if end is not None:
+                keep &= bins <= end.value // step
+            bins, sums, counts = bins[keep], sums[keep], counts[keep]
+        if not len(bins):
+            starts = pd.DatetimeIndex([])
+            return interval_table(starts, starts, pd.DataFrame(columns = keys, dtype = float))
+        # all intervals between the first and last one with data, empty ones as NaN
+        numbers = np.arange(bins[0], bins[-1] + 1)
+        means = np.full((len(numbers), len(keys)), np.nan)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            means[bins - bins[0]] = np.where(counts > 0, sums / counts, np.nan)
+        starts = pd.DatetimeIndex((numbers * step).astype('datetime64[ns]'))
+        return interval_table(starts, starts + pd.Timedelta(step), pd.DataFrame(means, columns = keys).round(0))
+
+    def status(self):
+        with self.lock:
+            entries = self.entries()
+            last = max((entry['last'] for entry in entries if entry['last'] is not None), default = None)
+            return {
+                'model': self.model,
+                'files': len(entries),
+                'first': str(entries[0]['first']) if entries else None,
+                'last': str(last) if last is not None else None,
+                'segments': len(self.segments),
+                'memory': sum(segment['size'] for segment in self.segments.values()),
+                'budget': self.memory,
+                'levels': ['{0}:{1}'.format(*level) for level in self.steps],
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions
+                }
+
+def serve_intervals(server, host = 'localhost', port = 8033, poll = 1.0):
+    # Answers HTTP queries from an IntervalServer, refreshing it every 'poll' seconds:
+    #   GET /intervals?freq=hourly&interval=1&keys=BC6,BB&start=...&end=...&format=csv
+    #       start/end as "2018-02-27 13:00", or last=24h (relative to the newest sample);
+    #       format=csv (header and units rows, as printed by aeth.py) or json
+    #   GET /status
+    import http.server, json
+    from urllib.parse import urlparse, parse_qs
+
+    def intervals(query):
+        freq = query.get('freq', 'hourly').upper()
+        interval = int(query.get('interval', 10 if freq == 'SECONDLY' else 1))
+        keys = [key.upper() for key in query['keys'].split(',')] if query.get('keys') else None
+        start = pd.Timestamp(query['start']) if query.get('start') else None
+        end = pd.Timestamp(query['end']) if query.get('end') else None
+        if query.get('last'):
+            last = server.status()['last']
+            if last is not None:
+                end = pd.Timestamp(last)
+                start = end - pd.Timedelta(query['last'])
+        df = server.query(start, end, freq, interval, keys)
+        if query.get('format', 'csv') == 'json':
+            units = {column: column_unit(server.units, column) for column in df.columns}
+            text = '{{"units": {0}, "table": {1}}}'.format(
+                json.dumps(units), df.reset_index().to_json(orient='split', index=False, date_format='iso'))
+            return 'application/json', text
+        f = io.StringIO()
+        with ResultWriter(f, 'csv', server.units) as writer:
+            writer.write(df)
+        return 'text/csv', f.getvalue()
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        disable_nagle_algorithm = True      # headers and body are separate writes
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+            try:
+                if url.path == '/intervals':
+                    status, (content_type, text) = 200, intervals(query)
+                elif url.path == '/status':
+                    status, content_type, text = 200, 'application/json', json.dumps(server.status())
+                else:
+                    status, content_type, text = 404, 'text/plain', 'use /intervals or /status\n'
+            except (ValueError, KeyError) as e:
+                status, content_type, text = 400, 'text/plain', '{0}\n'.format(e)
+            except Exception as e:
+                status, content_type, text = 500, 'text/plain', '{0}: {1}\n'.format(type(e).__name__, e)
+            body = text.encode()
+            self.send_response(status)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    def watch():
+        while True:
+            time.sleep(poll)
+            try:
+                server.refresh()
+            except Exception as e:
+                print('refresh failed: {0}'.format(e), file=sys.stderr)
+
+    threading.Thread(target = watch, daemon = True).start()
+    httpd = http.server.ThreadingHTTPServer((host, port), Handler)
+    print('serving on http://{0}:{1}/intervals'.format(*httpd.server_address[:2]), file=sys.stderr)
+    try:
+        httpd.serve_forever()
+    finally:
+        httpd.server_close()
+
 if __name__ == "__main__":
 
     config_file = os.path.abspath(os.path.abspath(os.path.dirname(sys.argv[0])) + "/config.ini")        
 
     parser = argparse.ArgumentParser(description='Aethalometer datafile utilities')
-    parser.add_argument('datafile', metavar='file', type=argparse.FileType('r'),
+    parser.add_argument('datafile', metavar='file', type=check_file,
                         nargs='*', help='List of aethalometer files to be processed. Leave empty for newest file')
     parser.add_argument('--inifile', required=False, dest='INI', default=config_file,
                         help="Path to configuration file ({} if omitted)".format(config_file))
@@ -462,12 +2883,155 @@ if __name__ == "__main__":
                              'First row must be the column names (i.e. "start" and "end"). '
                              'Uses hourly, minutely, or secondly intervals if this parameter'
                              'is missing (as defined in config.ini or by --freq).')
+    parser.add_argument('--min-coverage', required=False, dest='MINCOV', type=float,
+                        help='Drops --intervals rows whose samples cover less than this '
+                             'fraction (0-1) of the interval (needs --intervals)')
     parser.add_argument('--bckey', required=False, dest='bckey',
                         help='Selects BC1 through BC7 (or BB for AE33). '
                              'Default: BC6=880nm')
+    parser.add_argument('--fast', action='store_true',
+                        help='Reads only the BC columns (plus Timebase and Status for AE33) '
+                             'using explicit dtypes and the fixed datetime format of the model')
+    parser.add_argument('--workers', required=False, dest='workers', type=check_positive,
+                        help='Number of processes used to parse files (default: number of CPUs)')
+    cache_parser = parser.add_mutually_exclusive_group(required=False)
+    cache_parser.add_argument('--no-cache', action='store_true', dest='nocache',
+                              help='Parses all files without using the file cache')
+    cache_parser.add_argument('--rebuild-cache', action='store_true', dest='rebuild',
+                              help='Parses all files and replaces their cache entries')
+    parser.add_argument('--stream', action='store_true',
+                        help='Reads the files (in time order) in chunks and prints each interval '
+                             'as soon as it is complete. Memory use is bounded by --chunksize. '
+                             'No plot is shown; --intervals is not supported and intervals are --aligned.')
+    parser.add_argument('--chunksize', required=False, dest='CHUNK', type=check_positive, default=100000,
+                        help='Number of rows read at a time in --stream mode (default: 100000)')
+    parser.add_argument('--follow', action='store_true',
+                        help='Follows the (last or newest) file while it is being written, printing each '
+                             'interval as soon as it is complete, and continues with newer files '
+                             'appearing in DATA_PATH. Stop with Ctrl+C.')
+    parser.add_argument('--poll', required=False, dest='POLL', type=float, default=1.0,
+                        help='Seconds between checks for new data in --follow mode (default: 1)')
+    parser.add_argument('--connect', required=False, dest='CONNECT', type=check_source, action='append',
+                        metavar='HOST:PORT',
+                        help='Reads the records sent by an instrument (or data logger) over TCP, in the layout '
+                             'of its datafiles, and prints each interval as soon as it is complete. May be '
+                             'repeated; with several sources a "source" column is added. Stop with Ctrl+C.')
+    parser.add_argument('--reconnect', required=False, dest='RECONNECT', type=float, default=5.0,
+                        help='Seconds before reconnecting a closed --connect source; 0 stops when all '
+                             'sources are closed (default: 5)')
+    parser.add_argument('--serve', required=False, dest='SERVE', type=check_source, metavar='[HOST]:PORT',
+                        help='Runs a query daemon on HOST:PORT (e.g. ":8033" for localhost): the files of '
+                             'DATA_PATH are kept loaded (within --memory) with hourly, minutely and 10 s '
+                             'intervals precomputed, new data is picked up every --poll seconds, and '
+                             'GET /intervals?freq=hourly&keys=BC6&last=24h (or start=...&end=...) '
+                             'returns the intervals as CSV (format=json for JSON). GET /status for statistics.')
+    parser.add_argument('--memory', required=False, dest='MEMORY', type=check_positive, default=512,
+                        help='Memory budget of --serve in MB; least recently queried files are dropped '
+                             'first (default: 512)')
+    incremental_parser = parser.add_mutually_exclusive_group(required=False)
+    incremental_parser.add_argument('--incremental', action='store_true',
+                                    help='Reuses the intervals computed by the previous run (saved in '
+                                         'CACHE_PATH/intervals) and recomputes only the last one, newer ones '
+                                         'and those overlapping changed files')
+    incremental_parser.add_argument('--check-incremental', action='store_true', dest='check',
+                                    help='Compares the --incremental result with a full recompute and '
+                                         'exits with status 1 if they differ')
+    plot_parser = parser.add_mutually_exclusive_group(required=False)
+    plot_parser.add_argument('--plot-out', required=False, dest='PLOTOUT',
+                             help='Writes the plot to this file (png, svg, pdf, ...) without a display '
+                                  'instead of showing it')
+    plot_parser.add_argument('--no-plot', action='store_true', dest='noplot',
+                             help='Only prints the data, no plot is made (matplotlib is not loaded)')
+    plot_parser.add_argument('--report', required=False, dest='REPORT', metavar='DIR|FILE.pdf',
+                             help='Instead of one plot, renders the plot of each --report-keys key for each '
+                                  '--report-period on a pool of --workers processes, as <key>_<period>.png '
+                                  'files in DIR or as the pages of a PDF file')
+    parser.add_argument('--report-keys', required=False, dest='REPORTKEYS', metavar='KEYS',
+                        help='Comma separated BC keys of --report (default: all, BC1-BC7 and BB for AE33)')
+    parser.add_argument('--report-period', required=False, dest='PERIOD', choices=list(REPORT_PERIODS), default='day',
+                        help='Period of each --report plot (default: day)')
+    parser.add_argument('--max-points', required=False, dest='MAXPTS', type=check_positive, default=5000,
+                        help='Maximum number of points of the plotted line; longer series are decimated '
+                             'keeping the minimum and maximum of each bucket (default: 5000)')
+    parser.add_argument('--quality', action='store_true',
+                        help='Drops the rows flagged by the instrument status (AE33: all Status codes but '
+                             'the tape low/critical warnings) and those within --tape-window seconds of a '
+                             'tape advance before averaging and plotting. Intervals get a "rejected" column.')
+    parser.add_argument('--reject', required=False, dest='RULES', type=check_rule, action='append',
+                        metavar='COLUMN=BITS',
+                        help='Quality rule replacing the default for COLUMN: rows with any of BITS set are '
+                             'dropped (e.g. Status=0x7, ValveStatus=0xff, Status=0 to keep all). '
+                             'May be repeated; implies --quality.')
+    parser.add_argument('--tape-window', required=False, dest='TAPEWIN', type=float, default=60,
+                        help='Seconds dropped before and after each tape advance with --quality (default: 60)')
+    parser.add_argument('--recompute', required=False, dest='RECOMPUTE',
+                        type=check_correction, metavar='CORRECTION',
+                        help='Recomputes BC1-BC7 from the raw signals (attenuation and flow, restarting at '
+                             'each tape advance) with a filter loading correction: none, '
+                             'weingartner:F, virkkula:K (or seven comma separated K) or ae33 (the K1-K7 '
+                             'columns of AE33 files). Adds the columns ATN1-ATN7.')
+    parser.add_argument('--scattering', required=False, dest='SCATTERING', type=float, metavar='C',
+                        help='Multiple scattering constant C of --recompute (default: 1.57 for AE33, '
+                             '2.14 for AE31, as used by the instruments)')
+    parser.add_argument('--spot-area', required=False, dest='SPOTAREA', type=float, metavar='CM2',
+                        help='Filter spot area of --recompute in cm2 (default: 0.785 for AE33, 1.67 for AE31)')
+    parser.add_argument('--compact', action='store_true',
+                        help='Reduces the memory used by the loaded data: drops the Date/Time strings and '
+                             'downcasts numeric columns where lossless while reading (chunk by chunk), and '
+                             'keeps the raw signal columns in a memory-mapped temporary store. Reports the '
+                             'memory used and the peak RSS.')
+    parser.add_argument('--stats', required=False, dest='STATS', type=check_stats,
+                        help='Comma separated statistics per interval and BC key, e.g. '
+                             '"mean,median,p5,p95,count". Available: count, mean, std, min, max, '
+                             'median and percentiles p0 to p100. Columns are named <key>_<stat>.')
+    parser.add_argument('--out', required=False, dest='OUT', metavar='FILE',
+                        help='Writes the intervals to FILE as they are computed instead of printing them '
+                             '(format from the extension: .csv, .csv.gz, .parquet, .feather)')
+    parser.add_argument('--format', required=False, dest='FORMAT', choices=list(OUTPUT_FORMATS),
+                        help='Output format of --out (default: from the file extension, csv otherwise). '
+                             'parquet and feather keep the units in the file metadata and need pyarrow.')
+    parser.add_argument('--batch', required=False, dest='BATCH', nargs='*', metavar='STATION',
+                        help='Processes the stations defined by the [STATION:<name>] sections of the INI-file '
+                             '(all, or the named ones) on a pool of --workers processes, writing '
+                             '<name>.<format> and <name>.png (unless --no-plot) to the --out directory, '
+                             'and prints a summary of the timings. A failing station does not stop the others.')
+    parser.add_argument('--profile', required=False, dest='PROFILE', action='store_true',
+                        help='Records wall time, CPU time, rows and peak RSS of each stage (parsing, '
+                             'datetime, concat, intervals, output, plot, ...) and prints them as a table '
+                             'on stderr')
+    parser.add_argument('--profile-json', required=False, dest='PROFILEJSON', metavar='FILE',
+                        help='Writes the --profile stages as JSON to FILE instead (implies --profile)')
+    parser.add_argument('--cprofile', required=False, dest='CPROFILE', metavar='FILE',
+                        help='Saves cProfile stats of the interval calculation to FILE (implies --profile)')
+    parser.add_argument('--tracemalloc', required=False, dest='TRACEMALLOC', metavar='FILE',
+                        help='Writes the peak and top allocations (tracemalloc) of the interval calculation '
+                             'to FILE (implies --profile)')
+    parser.add_argument('--start', required=False, dest='START', type=check_datetime,
+                        help='Uses only data from this date/time on (e.g. "2018-02-27 13:00"), moved back to '
+                             'the start of its interval for interval output. Without '
+                             'files, the files covering --start/--end are looked up in the file catalog '
+                             'of DATA_PATH (saved in CACHE_PATH).')
+    parser.add_argument('--end', required=False, dest='END', type=check_datetime,
+                        help='Uses only data up to this date/time (included)')
+    boundary_parser = parser.add_mutually_exclusive_group(required=False)
+    boundary_parser.add_argument('--compat', action='store_const', const='COMPAT', dest='BOUNDARIES',
+                                 help='Uses the interval boundaries of earlier versions (default, unless '
+                                      'BOUNDARIES is set in the INI-file): windows of one hour (hourly) or '
+                                      'one minute (minutely, secondly) starting every --ilength units from '
+                                      'the rounded first timestamp, end timestamp included.')
+    boundary_parser.add_argument('--aligned', action='store_const', const='ALIGNED', dest='BOUNDARIES',
+                                 help='Uses back-to-back windows of --ilength units aligned to midnight, '
+                                      'end timestamp excluded (always used by --stream, --follow, --connect '
+                                      'and --serve)')
 
     args = parser.parse_args()
 
+    if args.MINCOV is not None:
+        if not args.CSV:
+            parser.error('--min-coverage needs --intervals')
+        if not 0 <= args.MINCOV <= 1:
+            parser.error('--min-coverage must be a fraction between 0 and 1')
+
     if args.ae31:
         print("using AE31 file structure", file=sys.stderr)
         model = 'AE31'
@@ -483,6 +3047,9 @@ if __name__ == "__main__":
         file_mask   = '*' + eval(config['GENERAL_SETTINGS']['FILE_EXT'])
         freq        = eval(config['GENERAL_SETTINGS']['FREQ'])
         interval_l  = eval(config['GENERAL_SETTINGS']['INTERVAL'])
+        cache_path  = eval(config['GENERAL_SETTINGS'].get('CACHE_PATH', 'None'))
+        cache_size  = eval(config['GENERAL_SETTINGS'].get('CACHE_SIZE', '512'))
+        boundaries  = eval(config['GENERAL_SETTINGS'].get('BOUNDARIES', "'COMPAT'")).upper()
         if not interval_l:
             if freq == 'SECONDLY':
                 interval_l = 10
@@ -494,24 +3061,144 @@ if __name__ == "__main__":
         file_mask   = '*.dat'
         freq        = 'HOURLY'
         interval_l  = 1
+        cache_path  = None
+        cache_size  = 512
+        boundaries  = 'COMPAT'
+    if not cache_path:
+        cache_path = default_cache_path(data_path)
+    if boundaries not in BOUNDARIES:
+        parser.error('BOUNDARIES in {0} must be one of {1}'.format(config_file, ', '.join(BOUNDARIES)))
+    compat = (args.BOUNDARIES or boundaries) == 'COMPAT'
 
-    if not args.datafile:
-        list_of_events = glob.glob(data_path + file_mask) # * means all if need specific format then *.csv
-        latest_event = max(list_of_events, key=os.path.getctime)
-        args.datafile = [open(latest_event, 'r')]
-
-    mydata = False
-    for f in args.datafile:
-        print('loading file: {0}'.format(f.name), file=sys.stderr)
-        if not mydata:
-            mydata = Aethalometer(f, model = model)
+    if args.PROFILE or args.PROFILEJSON or args.CPROFILE or args.TRACEMALLOC:
+        # never write the profile over an input: the datafiles, INI-file, interval file or DATA_PATH files
+        inputs = [config_file] + [f for f in args.datafile if f != '-'] + ([args.CSV.name] if args.CSV else [])
+        inputs = set(os.path.realpath(f) for f in inputs)
+        for option, path in (('--profile-json', args.PROFILEJSON), ('--cprofile', args.CPROFILE),
+                             ('--tracemalloc', args.TRACEMALLOC)):
+            if path and (os.path.realpath(path) in inputs
+                         or os.path.dirname(os.path.realpath(path)) == os.path.realpath(data_path)
+                         and fnmatch.fnmatch(os.path.basename(path), file_mask)):
+                parser.error('{0} {1} would overwrite an input or data file'.format(option, path))
+        import atexit
+        profiler.enabled = True
+        profiler.cprofile = args.CPROFILE
+        profiler.tracemalloc = args.TRACEMALLOC
+        if args.PROFILEJSON:
+            atexit.register(profiler.save, args.PROFILEJSON)
         else:
-            #mydata.df = mydata.df.append(Aethalometer(f, model = model).df)
-            mydata.df = pd.concat([mydata.df, Aethalometer(f, model = model).df])            
-            
-    if args.bckey:
-        mydata.BCKey = args.bckey.upper()
-        
+            atexit.register(profiler.report)
+
+    if args.BATCH is not None:
+        ### Process the stations of the INI-file, each with its own settings
+        if (args.datafile or args.CSV or args.stream or args.follow or args.incremental or args.check
+                or args.RECOMPUTE or args.REPORT):
+            parser.error('--batch cannot be combined with files, --intervals, --stream, --follow, --incremental, '
+                         '--recompute or --report')
+        if not os.path.exists(config_file):
+            parser.error('--batch needs a configuration file with [STATION:<name>] sections')
+        try:
+            stations = read_stations(config, args.BATCH)
+        except KeyError as e:
+            parser.error(e.args[0])
+        if not stations:
+            parser.error('no [STATION:<name>] sections in {0}'.format(config_file))
+        if args.FREQ == 'raw':
+            parser.error('--batch calculates intervals, --freq raw is not supported')
+        for station in stations:
+            # command line settings override those of the stations
+            if args.FREQ:
+                station['freq'] = args.FREQ.upper()
+            if args.ILEN:
+                station['interval'] = int(args.ILEN)
+            if args.bckey:
+                station['bckey'] = args.bckey.upper()
+            if args.BOUNDARIES:
+                station['compat'] = args.BOUNDARIES == 'COMPAT'
+        if args.FORMAT in ('parquet', 'feather') and not importlib.util.find_spec('pyarrow'):
+            parser.error('--format {0} needs pyarrow'.format(args.FORMAT))
+        options = dict(start = args.START, end = args.END, fast = args.fast, stats = args.STATS,
+                       quality = args.quality or bool(args.RULES),
+                       rules = dict(args.RULES or []), tape_window = args.TAPEWIN,
+                       nocache = args.nocache, rebuild = args.rebuild, format = args.FORMAT,
+                       out_dir = args.OUT or '.', plot = not args.noplot, max_points = args.MAXPTS)
+        t0 = time.perf_counter()
+        results = []
+        for station, result, error in run_stations(stations, args.workers, options):
+            print('{0}: {1}'.format(station['name'], error or 'done'), file=sys.stderr)
+            results.append((station, result, error))
+        batch_summary(results)
+        failed = sum(1 for station, result, error in results if error)
+        print('{0} stations in {1:.1f} s, {2} failed'.format(len(results), time.perf_counter() - t0, failed),
+              file=sys.stderr)
+        sys.exit(1 if failed else 0)
+
+    if args.FORMAT and args.FORMAT != 'csv' and not args.OUT:
+        parser.error('--format {0} needs --out'.format(args.FORMAT))
+    out_format = args.FORMAT or (output_format(args.OUT) if args.OUT else 'csv')
+    if out_format in ('parquet', 'feather') and not importlib.util.find_spec('pyarrow'):
+        parser.error('--format {0} needs pyarrow'.format(out_format))
+
+    if args.BOUNDARIES == 'COMPAT' and (args.stream or args.follow or args.CONNECT or args.SERVE):
+        parser.error('--compat cannot be combined with --stream, --follow, --connect or --serve '
+                     '(their intervals are --aligned)')
+    if args.follow and args.datafile and not regular_file(args.datafile[-1]):
+        parser.error('--follow needs a regular file, not stdin or a pipe')
+    ranged = args.START is not None or args.END is not None
+    if ranged and (args.stream or args.follow or args.incremental or args.check):
+        parser.error('--start/--end cannot be combined with --stream, --follow or --incremental')
+    if args.STATS and (args.stream or args.follow or args.incremental or args.check):
+        parser.error('--stats cannot be combined with --stream, --follow or --incremental')
+    if args.STATS and args.FREQ == 'raw':
+        parser.error('--stats needs intervals, not --freq raw')
+    quality = args.quality or bool(args.RULES)
+    if quality and (args.stream or args.follow or args.incremental or args.check):
+        parser.error('--quality cannot be combined with --stream, --follow or --incremental')
+    report_keys = None
+    if args.REPORT:
+        if args.stream or args.follow or args.CONNECT or args.SERVE or args.BATCH is not None:
+            parser.error('--report cannot be combined with --stream, --follow, --connect, --serve or --batch')
+        if args.REPORTKEYS:
+            report_keys = [key.strip().upper() for key in args.REPORTKEYS.split(',') if key.strip()]
+            unknown = [key for key in report_keys if key not in Aethalometer(model = model).BCKeys]
+            if unknown or not report_keys:
+                parser.error('--report-keys: unknown key {0} (use {1})'.format(
+                    ', '.join(unknown), ', '.join(Aethalometer(model = model).BCKeys)))
+    elif args.REPORTKEYS or args.PERIOD != 'day':
+        parser.error('--report-keys and --report-period need --report')
+    if args.RECOMPUTE and (args.stream or args.follow or args.incremental or args.check):
+        parser.error('--recompute cannot be combined with --stream, --follow or --incremental')
+    if (args.SCATTERING or args.SPOTAREA) and not args.RECOMPUTE:
+        parser.error('--scattering and --spot-area need --recompute')
+    if args.CONNECT and (args.datafile or args.stream or args.follow or args.incremental or args.check
+                         or args.CSV or ranged or args.STATS or quality or args.RECOMPUTE):
+        parser.error('--connect cannot be combined with files, --stream, --follow, --incremental, '
+                     '--intervals, --start/--end, --stats, --quality or --recompute')
+    if args.SERVE:
+        ### Answer interval queries from memory
+        if (args.datafile or args.stream or args.follow or args.CONNECT or args.incremental or args.check
+                or args.RECOMPUTE):
+            parser.error('--serve uses the files of DATA_PATH and cannot be combined with files, '
+                         '--stream, --follow, --connect, --incremental or --recompute')
+        if not os.path.isdir(data_path):
+            parser.error('no directory {0}'.format(data_path))
+        catalog = FileCatalog(cache_path, data_path, file_mask, model, rebuild = args.rebuild)
+        cache = None
+        if not args.nocache:
+            cache = FileCache(cache_path, max_size = cache_size*1024*1024, rebuild = args.rebuild)
+        server = IntervalServer(catalog, model, memory = int(args.MEMORY)*1024*1024, cache = cache)
+        server.refresh()
+        t0 = time.perf_counter()
+        server.warm()
+        status = server.status()
+        print('{0} of {1} files loaded in {2:.1f} s ({3:.0f} MB)'.format(
+            status['segments'], status['files'], time.perf_counter() - t0, status['memory']/2**20), file=sys.stderr)
+        try:
+            serve_intervals(server, args.SERVE[0], args.SERVE[1], poll = args.POLL)
+        except KeyboardInterrupt:
+            pass
+        sys.exit()
+
     if args.FREQ == 'raw':
         interval = False             # use raw data
     elif args.FREQ:                  # overide INI-file averaging frequency   
@@ -523,32 +3210,195 @@ if __name__ == "__main__":
     if args.ILEN:
         interval_l = int(args.ILEN)  # overide INI-file averaging intervals   
         
+    if args.START is not None and interval and not args.CSV:
+        # the first interval starts at --start or before: it is not built from a partial window
+        start = window_start(args.START, freq if freq in FREQUENCIES else 'HOURLY', interval_l, compat)
+        if start != args.START:
+            print('--start moved to the start of its interval: {0}'.format(start), file=sys.stderr)
+            args.START = start
+
+    catalog = None
+    if not args.datafile and not args.CONNECT:
+        catalog = FileCatalog(cache_path, data_path, file_mask, model, rebuild = args.rebuild)
+        if not os.path.isdir(data_path):
+            parser.error('no {0} files found in {1}'.format(file_mask, data_path))
+        with profiler.stage('catalog'):
+            catalog.update()
+        if ranged:
+            args.datafile = catalog.files(args.START, args.END)
+            if not args.datafile:
+                parser.error('no {0} files in {1} with data between {2} and {3}'.format(
+                    file_mask, data_path, args.START or 'the first', args.END or 'the last sample'))
+        else:
+            latest_event = catalog.newest()
+            if not latest_event:
+                parser.error('no {0} files found in {1}'.format(file_mask, data_path))
+            args.datafile = [latest_event]
+
+    if args.stream:
+        ### Stream the average values per interval while reading the files in chunks
+        if freq not in FREQUENCIES:
+            freq = 'HOURLY'
+        mydata = Aethalometer(model = model)
+        with ResultWriter(args.OUT, out_format, mydata.units, ['start'] + mydata.BCKeys) as writer:
+            for rows in stream_intervals(args.datafile, model, freq, interval = interval_l, chunksize = args.CHUNK,
+                                         **stream_options(mydata.BCKeys)):
+                writer.write(rows)
+        if args.OUT:
+            print('{0} intervals written to {1}'.format(writer.rows, args.OUT), file=sys.stderr)
+        sys.exit()
+
+    if args.follow:
+        ### Print the average values per interval while the instrument writes the file
+        if freq not in FREQUENCIES:
+            freq = 'HOURLY'
+        mydata = Aethalometer(model = model)
+        if catalog is None and os.path.isdir(data_path):
+            # newer files are looked for in DATA_PATH also when following a given file
+            catalog = FileCatalog(cache_path, data_path, file_mask, model, rebuild = args.rebuild)
+        with ResultWriter(args.OUT, out_format, mydata.units, ['start'] + mydata.BCKeys) as writer:
+            try:
+                for rows in follow_intervals(args.datafile[-1], catalog, model, freq,
+                                             interval = interval_l, poll = args.POLL):
+                    writer.write(rows)
+            except KeyboardInterrupt:
+                pass
+        if args.OUT:
+            print('{0} intervals written to {1}'.format(writer.rows, args.OUT), file=sys.stderr)
+        sys.exit()
+
+    if args.CONNECT:
+        ### Print the average values per interval of the records received over TCP
+        import asyncio
+        if freq not in FREQUENCIES:
+            freq = 'HOURLY'
+        mydata = Aethalometer(model = model)
+        columns = ['start'] + mydata.BCKeys
+        if len(args.CONNECT) > 1:
+            columns.insert(0, 'source')
+        buffers = {}
+
+        async def ingest(writer):
+            async for source, rows in ingest_intervals(args.CONNECT, model, freq, interval = interval_l,
+                                                       reconnect = args.RECONNECT, buffers = buffers):
+                if len(args.CONNECT) > 1:
+                    rows.insert(0, 'source', '{0}:{1}'.format(*source))
+                writer.write(rows)
+
+        with ResultWriter(args.OUT, out_format, mydata.units, columns) as writer:
+            try:
+                asyncio.run(ingest(writer))
+            except KeyboardInterrupt:
+                pass
+        for source, buffer in buffers.items():
+            print('{0}:{1}: {2} records received'.format(source[0], source[1], buffer.total), file=sys.stderr)
+            if buffer.dropped:
+                print('{0}:{1}: {2} records dropped (not later than the previous record)'
+                      .format(source[0], source[1], buffer.dropped), file=sys.stderr)
+        if args.OUT:
+            print('{0} intervals written to {1}'.format(writer.rows, args.OUT), file=sys.stderr)
+        sys.exit()
+
+    rules = dict(MODELS[model]['quality'])
+    if args.RULES:
+        rules.update(args.RULES)
+    reader_options = {}
+    if args.fast:
+        reader_options = fast_options(model, rules if quality else None, args.RECOMPUTE)
+    if args.compact:
+        reader_options['compact'] = True    # downcast file by file, chunk by chunk
+
+    cache = None
+    if not args.nocache:
+        cache = FileCache(cache_path, max_size = cache_size*1024*1024, rebuild = args.rebuild)
+
+    for f in args.datafile:
+        print('loading file: {0}'.format(f), file=sys.stderr)
+    mydata = Aethalometer.from_files(args.datafile, model = model, workers = args.workers,
+                                     cache = cache, start = args.START, end = args.END, **reader_options)
+    if cache:
+        print(cache.summary(), file=sys.stderr)
+    if args.RECOMPUTE:
+        # before quality(): the signal differences need the rows it drops
+        with profiler.stage('recompute', len(mydata.df)):
+            spots = mydata.recompute(scattering = args.SCATTERING,
+                                     spot_area = args.SPOTAREA * 1e-4 if args.SPOTAREA else None, **args.RECOMPUTE)
+        print('recompute: BC1-BC7 from the raw signals, {0} filter spots, {1} correction'.format(
+            spots, args.RECOMPUTE['correction']), file=sys.stderr)
+    if quality:
+        with profiler.stage('quality', len(mydata.df)):
+            rejected = mydata.quality(rules, tape_window = args.TAPEWIN)
+        print('quality: {0} of {1} rows rejected'.format(rejected, rejected + len(mydata.df)), file=sys.stderr)
+    if args.compact:
+        with profiler.stage('compact', len(mydata.df)):
+            before, after = mydata.compact()
+        mapped = mydata.signals.size() if mydata.signals else 0
+        print('memory: {0:.1f} MB as read (downcast while reading) -> {1:.1f} MB ({2:.1f} MB of raw signals '
+              'memory-mapped), peak RSS {3:.1f} MB'.format(before/2**20, after/2**20, mapped/2**20,
+                                                         (profiler.rss() or 0)/2**20), file=sys.stderr)
+            
+    if args.bckey:
+        mydata.BCKey = args.bckey.upper()
+        
 
 #    if args.interval:
     if interval:
         ### Output the csv file with the average values per interval
-        if args.CSV:
-            interval_df = calculate_intervals_csv(args.CSV, mydata)
-        else:
-            if freq == 'SECONDLY':
-                interval_df = calculate_secondly_intervals(mydata, interval = interval_l)
-            elif freq == 'MINUTELY':
-                interval_df = calculate_minutely_intervals(mydata, interval = interval_l)
+        with profiler.stage('intervals', len(mydata.df)):
+            if args.CSV:
+                interval_df = calculate_intervals_csv(args.CSV, mydata, stats = args.STATS)
             else:
-                interval_df = calculate_hourly_intervals(mydata, interval = interval_l)
-        columns = interval_df.columns.values
-        print("end," + ",".join(columns))
-        units = (mydata.units[key] for key in columns if key in mydata.units)
-        print("-,-," + ",".join(units))
-        print(interval_df.to_csv(header=False))
-        y = interval_df[mydata.BCKey]
+                if freq not in FREQUENCIES:
+                    freq = 'HOURLY'
+                if args.incremental or args.check:
+                    store = IntervalStore(os.path.join(cache_path, 'intervals'))
+                    interval_df = calculate_intervals_incremental(mydata, store, freq, interval = interval_l,
+                                                                  compat = compat)
+                else:
+                    interval_df = calculate_intervals(mydata, freq, interval = interval_l, compat = compat,
+                                                      stats = args.STATS)
+                if args.check:
+                    full_df = calculate_intervals(mydata, freq, interval = interval_l, compat = compat)
+                    if interval_df.equals(full_df):
+                        print('incremental intervals identical to full recompute', file=sys.stderr)
+                        sys.exit(0)
+                    differ = (interval_df.ne(full_df) & ~(interval_df.isna() & full_df.isna())).any(axis=1)
+                    print('incremental intervals differ from full recompute:', file=sys.stderr)
+                    print(interval_df[differ].to_csv(), file=sys.stderr)
+                    store.save(store.key(mydata, freq, interval_l, 0, compat), full_df,
+                               {source['path']: source for source in mydata.sources})
+                    print('saved intervals replaced by the full recompute', file=sys.stderr)
+                    sys.exit(1)
+        if args.MINCOV is not None and 'coverage' in interval_df:
+            interval_df = interval_df[interval_df['coverage'] >= args.MINCOV]
+        with profiler.stage('output', len(interval_df)):
+            with ResultWriter(args.OUT, out_format, mydata.units) as writer:
+                writer.write(interval_df)
+        if args.OUT:
+            print('{0} intervals written to {1}'.format(writer.rows, args.OUT), file=sys.stderr)
+        y = interval_series(interval_df, mydata.BCKey, args.STATS)
     else:
         y = mydata.df[mydata.BCKey]
 
-    plotTitle = "Aethalometer Model " + model
-    if mydata.wavelengths.get(mydata.BCKey):
-        plotTitle = plotTitle + " ($\lambda=$" + str(mydata.wavelengths.get(mydata.BCKey)) + "nm)"
-        ytitle="Equivalent Black Carbon"
-    else:
-        ytitle = "Biomass Burning Fraction"
-    create_plot(y, yunits=mydata.units.get(mydata.BCKey), title=plotTitle, ytitle=ytitle)
+    if args.REPORT:
+        ### Plots of all keys and periods
+        keys = report_keys or mydata.BCKeys
+        if interval:
+            frame = pd.DataFrame({key: interval_series(interval_df, key, args.STATS) for key in keys})
+        else:
+            frame = mydata.df
+        closed = 'right' if interval else 'left'
+        periods = report_periods(frame.index, args.PERIOD, closed)
+        t0 = time.perf_counter()
+        with profiler.stage('report', len(keys) * len(periods)):
+            results = render_report(frame, keys, periods, args.REPORT, {key: plot_labels(mydata, key) for key in keys},
+                                    workers = args.workers, max_points = args.MAXPTS, closed = closed)
+        for key, label, path, error in results:
+            if error and error != 'no data':
+                print('{0} {1}: {2}'.format(key, label, error), file=sys.stderr)
+        print('{0} plots ({1} keys x {2} periods) written to {3} in {4:.1f} s, {5} without data'.format(
+            sum(1 for result in results if not result[3]), len(keys), len(periods), args.REPORT,
+            time.perf_counter() - t0, sum(1 for result in results if result[3] == 'no data')), file=sys.stderr)
+    elif not args.noplot:
+        with profiler.stage('plot', len(y)):
+            plot_data(mydata, y, outfile=args.PLOTOUT, max_points=args.MAXPTS)
@@ -0,0 +1,202 @@
+#!/usr/bin/env python
+# Plotting functions for Aethalometer data (see aeth.py). This module is only imported
+# when a plot is made, so that runs without plots do not pay for loading matplotlib.
+#
+# create_plot(y):                function can be used to plot the data
+#                                (one wavelength, use BC6 for eBC at 880nm)
+#                                outfile = 'plot.png' renders to a file without a display,
+#                                max_points = N decimates the plotted line (see decimate(values, max_points))
+# decimate(values, max_points):  positions of a min/max preserving reduction of a series to about max_points points
+# pyplot(backend):               returns matplotlib.pyplot after selecting the backend (e.g. 'Agg' for files)
+# plot_axes(figure), draw_plot(ax_scatter, ax_box, y): the layout and drawing of create_plot, separately
+#                                (draw_plot replaces the previous plot of the axes, see clear_axes);
+# plot_figure():                 a reusable Agg Figure with that layout (for rendering many plots, see aeth.render_report)
+
+import platform
+
+import numpy as np
+from pandas.plotting import register_matplotlib_converters
+
+import matplotlib
+import matplotlib.dates as mdates
+import matplotlib.style
+from matplotlib.ticker import FuncFormatter, NullFormatter, NullLocator
+
+def pyplot(backend = None):
+    # Returns matplotlib.pyplot, selecting 'backend' first (e.g. 'Agg' to render files
+    # without a display)
+    if backend:
+        matplotlib.use(backend)
+    import matplotlib.pyplot as plt
+    return plt
+
+def my_date_formater(ax, delta):
+    if delta.days < 3:
+        ax.xaxis.set_major_locator(mdates.DayLocator())
+        ax.xaxis.set_major_formatter(mdates.DateFormatter('%d-%m-%y'))
+        ax.xaxis.set_minor_formatter(mdates.DateFormatter('%H:%M'))
+        ax.xaxis.grid(True, which='minor')
+        ax.tick_params(axis="x", which="major", pad=15)
+        if delta.days < 0.75:
+            ax.xaxis.set_minor_locator(mdates.HourLocator())
+        if delta.days < 1:
+            ax.xaxis.set_minor_locator(mdates.HourLocator((0,3,6,9,12,15,18,21,)))
+        else:
+            ax.xaxis.set_minor_locator(mdates.HourLocator((0,6,12,18,)))
+    elif delta.days < 8:
+        ax.xaxis.set_major_locator(mdates.MonthLocator())
+        ax.xaxis.set_major_formatter(mdates.DateFormatter('%b %Y'))
+        ax.xaxis.set_minor_formatter(mdates.DateFormatter('%a %d'))
+        ax.xaxis.grid(True, which='minor')
+        ax.tick_params(axis="x", which="major", pad=15)
+        ax.xaxis.set_minor_locator(mdates.DayLocator())
+        ax.set(xlabel='date')
+    else:
+        xtick_locator = mdates.AutoDateLocator()
+        xtick_formatter = mdates.AutoDateFormatter(xtick_locator)
+        xtick_formatter.scaled[30.] = FuncFormatter(my_days_format_function)
+        xtick_formatter.scaled[1.] = FuncFormatter(my_days_format_function)
+        ax.xaxis.set_major_locator(xtick_locator)
+        ax.xaxis.set_major_formatter(xtick_formatter)
+        ax.set(xlabel='date')
+
+def my_days_format_function(x, pos=None):
+    dt = mdates.num2date(x)
+    if pos == 0:
+        fmt = '%b %d\n%Y'
+    else:
+        # Use platform-specific day formatting
+        if platform.system() == 'Windows':
+            fmt = '%b %#d'
+        else:
+            fmt = '%b %-d'
+    label = dt.strftime(fmt)
+    return label
+    
+def decimate(values, max_points):
+    # Positions of the points kept when reducing a series to about max_points points: the
+    # data is split into max_points/2 buckets and the minimum and maximum of each bucket are
+    # kept (in their original order), so that peaks survive. Buckets containing NaNs keep
+    # their first NaN, so that gaps still break the plotted line.
+    values = np.asarray(values, dtype='float64')
+    n = len(values)
+    buckets = max(max_points // 2, 1)
+    if n <= max_points:
+        return np.arange(n)
+    bucket = (np.arange(n) * buckets) // n
+    first = np.searchsorted(bucket, np.arange(buckets))
+    nan = np.isnan(values)
+    low = np.where(nan, np.inf, values)
+    high = np.where(nan, -np.inf, values)
+    counts = np.diff(np.append(first, n))
+    is_min = low == np.repeat(np.minimum.reduceat(low, first), counts)
+    is_max = high == np.repeat(np.maximum.reduceat(high, first), counts)
+    keep = []
+    for mask in (is_min & ~nan, is_max & ~nan, nan):
+        positions = np.flatnonzero(mask)
+        keep.append(positions[np.unique(bucket[positions], return_index=True)[1]])
+    return np.unique(np.concatenate(keep))
+
+# create_plot layout: scatter axes and boxplot axes to its right (figure fractions)
+LEFT, WIDTH = 0.1, 0.7
+BOTTOM, HEIGHT = 0.15, 0.75
+SPACING = 0.005
+FIGSIZE = (12, 6)
+
+def plot_axes(figure):
+    # Adds the scatter and boxplot axes of create_plot to a figure; returns (ax_scatter, ax_box)
+    box_width = 1 - (1.5*LEFT + WIDTH + SPACING)
+    ax_scatter = figure.add_axes([LEFT, BOTTOM, WIDTH, HEIGHT])
+    ax_box = figure.add_axes([LEFT + WIDTH + SPACING, BOTTOM, box_width, HEIGHT])
+    return ax_scatter, ax_box
+
+def clear_axes(ax_scatter, ax_box):
+    # Removes the previous plot from the axes of plot_axes and resets what my_date_formater
+    # sets. Unlike cla() this keeps the tick objects of the scatter axes, whose re-creation
+    # is most of the cost of drawing a figure again (the boxplot axes are simply cleared).
+    for artist in list(ax_scatter.lines) + list(ax_scatter.patches) + list(ax_scatter.texts):
+        artist.remove()
+    ax_scatter.relim()
+    ax_scatter.autoscale()
+    ax_scatter.set_prop_cycle(None)
+    ax_box.cla()
+    ax_scatter.xaxis.set_minor_locator(NullLocator())
+    ax_scatter.xaxis.set_minor_formatter(NullFormatter())
+    ax_scatter.xaxis.grid(False, which='minor')
+    ax_scatter.tick_params(axis="x", which="major", pad=matplotlib.rcParams['xtick.major.pad'])
+    ax_scatter.tick_params(direction='in', top=True, right=True)
+    ax_box.tick_params(direction='in', labelleft=False, labelbottom=False)
+
+def draw_plot(ax_scatter, ax_box, y, x=None, yunits='ng/m$^3$', title="Aethalometer", ytitle='eBC', max_points=None):
+    # Draws the line and boxplot of create_plot into the axes of plot_axes, replacing the
+    # previous plot (clear_axes), so that one figure can be reused for many plots
+    register_matplotlib_converters()
+    clear_axes(ax_scatter, ax_box)
+
+    # the scatter plot:
+    keep = slice(None)
+    if max_points and len(y) > max_points:
+        keep = decimate(y, max_points)
+    if x is None:
+        ax_scatter.plot(y.iloc[keep]) # change plot type to scatter to have markers
+        tdelta = y.index.max() - y.index.min()
+    else:
+        ax_scatter.plot(np.asarray(x)[keep], np.asarray(y)[keep]) # change plot type to scatter to have markers
+        tdelta = x.max() - x.min()
+    ax_scatter.set(xlabel='date', ylabel=ytitle + ' (' + yunits + ')')
+    ax_scatter.set_title(title, y=1.0)  # fixed position: no tick labels on top (saves a layout pass per draw)
+    my_date_formater(ax_scatter, tdelta)
+
+    # now determine nice limits by hand:
+    lim0 = y.min()
+    lim1 = y.max()
+    if x is None:
+        tlim0 = y.index.min()
+        tlim1 = y.index.max()
+    else:
+        tlim0 = x.min()
+        tlim1 = x.max()
+    extra_space = (lim1 - lim0)/10
+    extra_t = (tlim1 - tlim0)/10
+    if extra_t:
+        ax_scatter.set_xlim((tlim0-extra_t, tlim1+extra_t))
+    if extra_space:
+        ax_scatter.set_ylim((lim0-extra_space, lim1+extra_space))
+
+    meanpointprops = dict(marker='D')
+    ax_box.boxplot(y.dropna(), showmeans=True, meanprops=meanpointprops)
+    ax_box.set_ylim(ax_scatter.get_ylim())
+    mu = y.mean()
+    sigma = y.std()
+    text = r'$\mu={0:.2f},\ \sigma={1:.3f}$'.format(mu, sigma)
+    ax_box.text(1, lim1 + extra_space/2, text, horizontalalignment="center", verticalalignment="center")
+
+def plot_figure():
+    # A Figure with the create_plot layout for rendering files without pyplot (no figure
+    # manager, Agg canvas): returns (figure, ax_scatter, ax_box). draw_plot() the axes and
+    # figure.savefig() as often as needed.
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    matplotlib.style.use('ggplot')
+    figure = Figure(figsize=FIGSIZE)
+    FigureCanvasAgg(figure)
+    return (figure,) + plot_axes(figure)
+
+def create_plot(y, x=None, yunits='ng/m$^3$', title="Aethalometer", ytitle='eBC', outfile=None, max_points=None):
+    # outfile: write the figure to this file (format from the extension, e.g. png, svg, pdf)
+    #          using a non-interactive backend instead of showing it.
+    # max_points: decimate the plotted line to about this many points (see decimate); the
+    #          limits, boxplot and statistics always use all data.
+    plt = pyplot('Agg' if outfile else None)
+    plt.style.use('ggplot')
+
+    # start with a rectangular Figure
+    box = plt.figure("boxplot", figsize=FIGSIZE)
+    ax_scatter, ax_box = plot_axes(box)
+    draw_plot(ax_scatter, ax_box, y, x, yunits=yunits, title=title, ytitle=ytitle, max_points=max_points)
+
+    if outfile:
+        box.savefig(outfile)
+    else:
+        plt.show()
+    plt.close()
@@ -0,0 +1,182 @@
+#!/usr/bin/env python
+# Throughput benchmark for aeth.py on synthetic datafiles (see synth.py)
+#
+# For each dataset size the files are generated once (kept in --data) and the stages below are
+# timed (best of --repeat runs), then run once more under tracemalloc for the peak memory:
+#
+#   read            Aethalometer.from_files, default reader (datetime format inferred)
+#   read_fast       Aethalometer.from_files, fast reader (usecols, dtypes, fixed datetime format)
+#   datetime        parse_datetime on the Date and Time columns (fixed format)
+#   datetime_infer  pd.to_datetime on the same strings, format inferred
+#   hourly, minutely, secondly10, hourly_compat
+#                   calculate_intervals at each frequency (10 s intervals for SECONDLY)
+#   hourly_stats    calculate_intervals with count, mean, std, min, max, median and 4 percentiles
+#   csv10, csv1k, csv100k
+#                   calculate_intervals_csv with 10, 1000 and 100000 random intervals
+#   subset          1000 getSubset calls
+#   output          minutely intervals written as CSV (ResultWriter)
+#   output_parquet  the same as Parquet (needs pyarrow)
+#
+# Results can be saved as a baseline (--save) and compared against one (--baseline). A stage
+# slower or using more memory than the baseline by more than --tolerance fails (exit status 1):
+#
+#   python benchmarks/bench.py --sizes day week --save benchmarks/baseline.json
+#   python benchmarks/bench.py --sizes day week --baseline benchmarks/baseline.json
+
+import argparse, importlib.util, json, os, platform, resource, sys, tempfile, time, tracemalloc, warnings
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import aeth
+import synth
+
+SIZES = {
+    # name: (model, days, timebase in s)
+    'day':   ('AE33', 1, 1),        # 86k rows, one file
+    'week':  ('AE33', 7, 1),        # 605k rows
+    'month': ('AE33', 30, 1),       # 2.6M rows
+    'year':  ('AE33', 365, 60),     # 525k rows in 365 files (a year at 1 s would be ~14 GB)
+    'ae31-day':  ('AE31', 1, 60),
+    'ae31-year': ('AE31', 365, 300),
+    }
+
+STATS = ['count', 'mean', 'std', 'min', 'max', 'median', 'p5', 'p25', 'p75', 'p95']
+
+def dataset(directory, size):
+    # Generates the files of one size (once) and returns their paths
+    model, days, timebase = SIZES[size]
+    path = os.path.join(directory, size)
+    done = os.path.join(path, '.complete')
+    if not os.path.exists(done):
+        print('generating {} ({} days, {} s, {})'.format(size, days, timebase, model), file=sys.stderr)
+        write = synth.write_ae33 if model == 'AE33' else synth.write_ae31
+        write(path, days = days, timebase = timebase)
+        open(done, 'w').close()
+    return model, sorted(os.path.join(path, f) for f in os.listdir(path) if f.startswith(model + '_'))
+
+def interval_file(directory, data, n, seed = 0):
+    # 'n' random intervals of 1 minute to 6 hours within the data
+    path = os.path.join(directory, 'intervals{}.csv'.format(n))
+    rng = np.random.default_rng(seed)
+    first, last = data.df.index[0].value, data.df.index[-1].value
+    starts = rng.integers(first, last, n)
+    ends = starts + rng.integers(60, 6*3600, n) * 10**9
+    pd.DataFrame({'start': pd.to_datetime(starts).floor('s'),
+                  'end': pd.to_datetime(ends).floor('s')}).to_csv(path, index=False)
+    return path
+
+def stages(model, paths, workdir):
+    # Returns [(name, rows, function)]; the data is loaded once for the stages that need it
+    data = aeth.Aethalometer.from_files(paths, model, workers = 1, fast = True)
+    rows = len(data.df)
+    raw = pd.concat([pd.read_csv(p, **aeth.read_options(model, True, ['Date', 'Time'])) for p in paths])
+    minutely = aeth.calculate_intervals(data, 'MINUTELY', 1)
+    files = {n: interval_file(workdir, data, n) for n in [10, 1000, 100000]}
+    rng = np.random.default_rng(1)
+    subsets = [(pd.Timestamp(t), pd.Timestamp(t) + pd.Timedelta(hours=1))
+               for t in rng.integers(data.df.index[0].value, data.df.index[-1].value, 1000)]
+    text = raw['Date'] + " " + raw['Time'] + aeth.MODELS[model]['append_text']
+
+    def subset():
+        for start, end in subsets:
+            data.getSubset(start, end)
+
+    def write(df, format):
+        with aeth.ResultWriter(os.path.join(workdir, 'output.' + format), format, data.units) as writer:
+            writer.write(df)
+
+    functions = [
+        ('read',           rows, lambda: aeth.Aethalometer.from_files(paths, model, workers = 1)),
+        ('read_fast',      rows, lambda: aeth.Aethalometer.from_files(paths, model, workers = 1, fast = True)),
+        ('datetime',       rows, lambda: aeth.parse_datetime(raw['Date'], raw['Time'], model)),
+        ('datetime_infer', rows, lambda: pd.to_datetime(text)),
+        ('hourly',         rows, lambda: aeth.calculate_intervals(data, 'HOURLY', 1)),
+        ('minutely',       rows, lambda: aeth.calculate_intervals(data, 'MINUTELY', 1)),
+        ('secondly10',     rows, lambda: aeth.calculate_intervals(data, 'SECONDLY', 10)),
+        ('hourly_compat',  rows, lambda: aeth.calculate_intervals(data, 'HOURLY', 1, compat = True)),
+        ('hourly_stats',   rows, lambda: aeth.calculate_intervals(data, 'HOURLY', 1, stats = STATS)),
+        ('csv10',          10, lambda: aeth.calculate_intervals_csv(files[10], data)),
+        ('csv1k',          1000, lambda: aeth.calculate_intervals_csv(files[1000], data)),
+        ('csv100k',        100000, lambda: aeth.calculate_intervals_csv(files[100000], data)),
+        ('subset',         1000, subset),
+        ('output',         len(minutely), lambda: write(minutely, 'csv')),
+        ]
+    if importlib.util.find_spec('pyarrow'):
+        functions.append(('output_parquet', len(minutely), lambda: write(minutely, 'parquet')))
+    return functions
+
+def measure(function, repeat):
+    # Returns (best wall time in s, peak traced memory in MB)
+    best = float('inf')
+    for i in range(repeat):
+        t0 = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - t0)
+    tracemalloc.start()
+    function()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return best, peak / 2**20
+
+def compare(results, baseline, tolerance, min_seconds):
+    # Returns the list of regressions against the baseline results
+    failures = []
+    for key, result in results.items():
+        if key not in baseline:
+            continue
+        base = baseline[key]
+        if base['seconds'] >= min_seconds and result['seconds'] > base['seconds'] * (1 + tolerance):
+            failures.append('{}: {:.3f} s > {:.3f} s'.format(key, result['seconds'], base['seconds']))
+        if result['peak_mb'] > base['peak_mb'] * (1 + tolerance) + 1:
+            failures.append('{}: {:.1f} MB > {:.1f} MB'.format(key, result['peak_mb'], base['peak_mb']))
+    return failures
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='aeth.py throughput benchmark')
+    parser.add_argument('--sizes', nargs='+', choices=list(SIZES), default=['day'],
+                        help='Dataset sizes (default: day)')
+    parser.add_argument('--stages', nargs='+', help='Run only these stages (default: all)')
+    parser.add_argument('--data', default=os.path.join(tempfile.gettempdir(), 'aeth_bench'),
+                        help='Directory of the generated datafiles (default: %(default)s)')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='Number of timed runs per stage, the best is reported (default: 3)')
+    parser.add_argument('--save', metavar='FILE', help='Saves the results as a JSON baseline')
+    parser.add_argument('--baseline', metavar='FILE', help='Compares against a JSON baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='Allowed slowdown / memory growth against the baseline (default: 0.25)')
+    parser.add_argument('--min-seconds', type=float, default=0.05, dest='min_seconds',
+                        help='Baseline stages faster than this are not checked for time (default: 0.05)')
+    args = parser.parse_args()
+    # the default reader warns about the per-row datetime parsing of AE31 files
+    warnings.simplefilter('ignore', UserWarning)
+
+    results = {}
+    print('{0:<24}{1:>12}{2:>12}{3:>14}{4:>12}'.format('stage', 'rows', 'time [s]', 'rows/s', 'peak [MB]'))
+    for size in args.sizes:
+        model, paths = dataset(args.data, size)
+        for name, rows, function in stages(model, paths, os.path.join(args.data, size)):
+            if args.stages and name not in args.stages:
+                continue
+            seconds, peak = measure(function, args.repeat)
+            key = '{}@{}'.format(name, size)
+            results[key] = {'rows': rows, 'seconds': seconds, 'rows_per_s': rows / seconds, 'peak_mb': peak}
+            print('{0:<24}{1:>12}{2:>12.4f}{3:>14.0f}{4:>12.1f}'.format(key, rows, seconds, rows / seconds, peak))
+            sys.stdout.flush()
+    # ru_maxrss is in kB on Linux, in bytes on macOS
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (2**20 if sys.platform == 'darwin' else 2**10)
+    print('max RSS: {:.0f} MB'.format(maxrss))
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump({'python': platform.python_version(), 'numpy': np.__version__,
+                       'pandas': pd.__version__, 'results': results}, f, indent=2, sort_keys=True)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+        failures = compare(results, baseline, args.tolerance, args.min_seconds)
+        for failure in failures:
+            print('FAIL: ' + failure, file=sys.stderr)
+        sys.exit(1 if failures else 0)
@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+# Fake instrument for testing the network ingest of aeth.py (--connect)
+#
+# A TCP server sending the records of aethalometer datafiles to every client that connects,
+# paced by their timestamps and accelerated by --speed (--speed 0 sends them at once). The
+# header lines of the files are sent first with --header. For example, one day of sample.dat
+# replayed in 24 s:
+#
+#   python benchmarks/fake_instrument.py sample.dat --port 3000 --speed 3600 --once &
+#   python aeth.py --connect localhost:3000 --reconnect 0 --freq minutely --ilength 10
+
+import argparse, asyncio, os, sys, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import aeth
+
+def load_records(paths, model = 'AE33'):
+    # Returns (header lines, [(seconds since the first record, line)]) of the files
+    header = []
+    records = []
+    first = None
+    for path in paths:
+        with open(path, 'rb') as f:
+            lines = f.read().splitlines(keepends=True)
+        if not header:
+            header = lines[:aeth.MODELS[model]['skiprows']]
+        for line in lines[aeth.MODELS[model]['skiprows']:]:
+            t = aeth.line_datetime(line, model)
+            if t is None:
+                continue
+            if first is None:
+                first = t
+            records.append(((t - first).total_seconds(), line))
+    return header, records
+
+async def replay(writer, header, records, speed, send_header):
+    # Sends the records, sleeping whenever more than 10 ms of (accelerated) time has passed
+    if send_header:
+        writer.write(b''.join(header))
+    t0 = time.perf_counter()
+    for seconds, line in records:
+        writer.write(line)
+        if speed:
+            delay = t0 + seconds / speed - time.perf_counter()
+            if delay > 0.01:
+                await writer.drain()
+                await asyncio.sleep(delay)
+    await writer.drain()
+
+async def serve(args, header, records):
+    done = asyncio.Event()
+
+    async def client(reader, writer):
+        peer = writer.get_extra_info('peername')
+        print('client {0} connected'.format(peer), file=sys.stderr)
+        try:
+            await replay(writer, header, records, args.speed, args.header)
+            print('client {0}: {1} records sent'.format(peer, len(records)), file=sys.stderr)
+        except ConnectionError as e:
+            print('client {0}: {1}'.format(peer, e), file=sys.stderr)
+        finally:
+            writer.close()
+        if args.once:
+            done.set()
+
+    server = await asyncio.start_server(client, args.host, args.port)
+    for socket in server.sockets:
+        print('listening on {0}:{1}'.format(*socket.getsockname()[:2]), file=sys.stderr)
+    sys.stderr.flush()
+    async with server:
+        if args.once:
+            await done.wait()
+        else:
+            await server.serve_forever()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Replays aethalometer datafiles over TCP')
+    parser.add_argument('datafile', nargs='+', help='Files to replay, in time order')
+    parser.add_argument('--ae31', action='store_true', help='The files are AE31 files (default: AE33)')
+    parser.add_argument('--host', default='localhost', help='Address to listen on (default: localhost)')
+    parser.add_argument('--port', type=int, default=3000, help='TCP port (default: 3000, 0 for any free port)')
+    parser.add_argument('--speed', type=float, default=60,
+                        help='Replay speed relative to the record timestamps, 0 for no delays (default: 60)')
+    parser.add_argument('--header', action='store_true', help='Sends the file header before the records')
+    parser.add_argument('--once', action='store_true', help='Exits after the first client was served')
+    args = parser.parse_args()
+
+    model = 'AE31' if args.ae31 else 'AE33'
+    header, records = load_records(args.datafile, model)
+    print('{0} records, {1:.0f} s at speed {2:g}'.format(
+        len(records), records[-1][0] / args.speed if records and args.speed else 0, args.speed), file=sys.stderr)
+    try:
+        asyncio.run(serve(args, header, records))
+    except KeyboardInterrupt:
+        pass
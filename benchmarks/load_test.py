@@ -0,0 +1,151 @@
+#!/usr/bin/env python
+# Load test of the aeth.py query daemon (aeth.py --serve)
+#
+# Sends a mix of dashboard queries from --concurrency threads and reports the latency (median,
+# 95th percentile and maximum) per query type and the throughput. With --data a daemon is
+# started on the files of that directory (through a temporary INI-file) and stopped at the
+# end; otherwise --url must point to a running daemon. --cli N also times N runs of aeth.py
+# answering the first query from the files, for comparison:
+#
+#   python benchmarks/synth.py /tmp/aeth_bench/year --days 365 --timebase 60
+#   python benchmarks/load_test.py --data /tmp/aeth_bench/year --requests 500 --cli 3
+
+import argparse, json, os, random, socket, statistics, subprocess, sys, tempfile, time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+AETH = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'aeth.py'))
+
+INI = '''[GENERAL_SETTINGS]
+DATA_PATH: {data!r}
+FILE_EXT: {ext!r}
+FREQ: 'HOURLY'
+INTERVAL: 1
+CACHE_PATH: ''
+CACHE_SIZE: 2048
+'''
+
+def queries(first, last, rng):
+    # (name, query string) of the query mix; ranges relative to the newest sample or random days
+    start = first + timedelta(seconds=rng.uniform(0, max((last - first).total_seconds() - 86400, 0)))
+    end = start + timedelta(days=1)
+    return [
+        ('hourly BC6, last 24 h', 'freq=hourly&keys=BC6&last=24h'),
+        ('10 s all keys, last hour', 'freq=secondly&interval=10&last=1h'),
+        ('minutely BC6, last 7 days', 'freq=minutely&keys=BC6&last=7D'),
+        ('hourly BC6, random day', 'freq=hourly&keys=BC6&start={0:%Y-%m-%d %H:%M}&end={1:%Y-%m-%d %H:%M}'.format(
+            start, end)),
+        ('4-hourly BC6, last 30 days', 'freq=hourly&interval=4&keys=BC6&last=30D'),
+        ]
+
+def get(url):
+    with urllib.request.urlopen(url) as response:
+        return response.read()
+
+def timed(url):
+    t0 = time.perf_counter()
+    body = get(url)
+    return time.perf_counter() - t0, len(body)
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('localhost', 0))
+        return s.getsockname()[1]
+
+def start_daemon(data, ext, memory, wait):
+    # Starts 'aeth.py --serve' on the files of 'data' and returns (process, url, INI-file)
+    ini = tempfile.NamedTemporaryFile('w', suffix='.ini', delete=False)
+    ini.write(INI.format(data=os.path.abspath(data), ext=ext))
+    ini.close()
+    port = free_port()
+    process = subprocess.Popen([sys.executable, AETH, '--inifile', ini.name, '--serve', ':{}'.format(port),
+                                '--memory', str(memory)], stderr=subprocess.DEVNULL)
+    url = 'http://localhost:{}'.format(port)
+    t0 = time.perf_counter()
+    while time.perf_counter() - t0 < wait:
+        try:
+            get(url + '/status')
+            print('daemon ready after {0:.1f} s'.format(time.perf_counter() - t0), file=sys.stderr)
+            return process, url, ini.name
+        except OSError:
+            if process.poll() is not None:
+                sys.exit('the daemon exited with status {}'.format(process.returncode))
+            time.sleep(0.2)
+    process.terminate()
+    sys.exit('the daemon did not answer within {} s'.format(wait))
+
+def run_cli(ini, status, runs):
+    # Wall times of 'aeth.py' answering 'hourly, last 24 h' from the files
+    last = datetime.strptime(status['last'], '%Y-%m-%d %H:%M:%S')
+    command = [sys.executable, AETH, '--inifile', ini, '--freq', 'hourly', '--no-plot', '--bckey', 'BC6',
+               '--start', (last - timedelta(hours=24)).strftime('%Y-%m-%d %H:%M:%S'),
+               '--end', last.strftime('%Y-%m-%d %H:%M:%S')]
+    times = []
+    for i in range(runs):
+        t0 = time.perf_counter()
+        subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+        times.append(time.perf_counter() - t0)
+    return times
+
+def report(name, times, sizes = None):
+    times = sorted(times)
+    p95 = times[min(len(times) - 1, int(round(0.95 * (len(times) - 1))))]
+    print('{0:<30}{1:>8}{2:>12.1f}{3:>12.1f}{4:>12.1f}{5:>12}'.format(
+        name, len(times), statistics.median(times)*1000, p95*1000, times[-1]*1000,
+        int(statistics.mean(sizes)) if sizes else '-'))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Load test of the aeth.py query daemon')
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--url', help='URL of a running daemon (e.g. http://localhost:8033)')
+    target.add_argument('--data', help='Starts a daemon on the files of this directory')
+    parser.add_argument('--ext', default='.dat', help='Extension of the files in --data (default: .dat)')
+    parser.add_argument('--memory', type=int, default=512, help='--memory of the started daemon in MB (default: 512)')
+    parser.add_argument('--wait', type=float, default=600,
+                        help='Seconds to wait for the started daemon to load the files (default: 600)')
+    parser.add_argument('--requests', type=int, default=200, help='Number of queries (default: 200)')
+    parser.add_argument('--concurrency', type=int, default=4, help='Parallel clients (default: 4)')
+    parser.add_argument('--cli', type=int, default=0, metavar='N',
+                        help='Also times N aeth.py runs answering "hourly BC6, last 24 h" from the files '
+                             '(needs --data)')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    if args.cli and not args.data:
+        parser.error('--cli needs --data')
+
+    process = ini = None
+    url = args.url
+    if args.data:
+        process, url, ini = start_daemon(args.data, args.ext, args.memory, args.wait)
+    try:
+        status = json.loads(get(url + '/status'))
+        first = datetime.strptime(status['first'], '%Y-%m-%d %H:%M:%S')
+        last = datetime.strptime(status['last'], '%Y-%m-%d %H:%M:%S')
+        rng = random.Random(args.seed)
+        names = [name for name, query in queries(first, last, rng)]
+        tasks = []
+        for i in range(args.requests):
+            name, query = queries(first, last, rng)[i % len(names)]
+            tasks.append((name, url + '/intervals?' + query.replace(' ', '%20')))
+
+        t0 = time.perf_counter()
+        with ThreadPoolExecutor(max_workers = args.concurrency) as pool:
+            results = list(pool.map(lambda task: (task[0],) + timed(task[1]), tasks))
+        wall = time.perf_counter() - t0
+
+        print('{0:<30}{1:>8}{2:>12}{3:>12}{4:>12}{5:>12}'.format(
+            'query', 'n', 'median [ms]', 'p95 [ms]', 'max [ms]', 'bytes'))
+        for name in names:
+            report(name, [t for n, t, size in results if n == name], [size for n, t, size in results if n == name])
+        report('all', [t for n, t, size in results])
+        print('{0} queries in {1:.2f} s ({2:.0f} queries/s, {3} clients)'.format(
+            len(results), wall, len(results) / wall, args.concurrency))
+        if args.cli:
+            report('aeth.py, hourly last 24 h', run_cli(ini, status, args.cli))
+        print(json.dumps(json.loads(get(url + '/status'))), file=sys.stderr)
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+            os.remove(ini)
@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+# Startup time benchmark for aeth.py
+#
+# Runs aeth.py in fresh interpreters with 'python -X importtime' and reports the wall time
+# and the import time breakdown (cumulative time per top-level package). Fails (exit status 1)
+# if a run is slower than --max-ms or if it imports one of the --forbid packages, e.g.
+#
+#   python benchmarks/startup.py                        # aeth.py --help, no pandas/numpy/matplotlib
+#   python benchmarks/startup.py --args "sample.dat --no-plot --no-cache" --forbid matplotlib
+
+import argparse, os, shlex, statistics, subprocess, sys, time
+
+AETH = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'aeth.py'))
+
+def run_importtime(args):
+    # Returns (wall time in s, {package: cumulative import time in us}) of one aeth.py run
+    command = [sys.executable, '-X', 'importtime', AETH] + args
+    t0 = time.perf_counter()
+    result = subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                            universal_newlines=True, cwd=os.path.dirname(AETH))
+    wall = time.perf_counter() - t0
+    packages = {}
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        fields = line[len('import time:'):].split('|')
+        try:
+            cumulative = int(fields[1])
+        except ValueError:
+            continue
+        name = fields[2].rstrip()
+        if len(name) - len(name.lstrip(' ')) == 1:
+            # top-level import (nested imports are indented further)
+            package = name.strip().split('.')[0]
+            packages[package] = packages.get(package, 0) + cumulative
+    return wall, packages
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='aeth.py startup time benchmark')
+    parser.add_argument('--args', default='--help',
+                        help='Arguments passed to aeth.py (default: "--help")')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='Number of runs, the median is reported (default: 5)')
+    parser.add_argument('--top', type=int, default=10,
+                        help='Number of packages listed in the import breakdown (default: 10)')
+    parser.add_argument('--max-ms', type=float, dest='max_ms',
+                        help='Fails if the median wall time exceeds this many milliseconds')
+    parser.add_argument('--forbid', nargs='*', default=None,
+                        help='Packages that must not be imported '
+                             '(default with --help: pandas numpy matplotlib)')
+    args = parser.parse_args()
+
+    aeth_args = shlex.split(args.args)
+    forbid = args.forbid
+    if forbid is None:
+        forbid = ['pandas', 'numpy', 'matplotlib'] if aeth_args == ['--help'] else []
+
+    walls = []
+    for i in range(args.repeat):
+        wall, packages = run_importtime(aeth_args)
+        walls.append(wall)
+    median = statistics.median(walls)
+
+    print('aeth.py {0}: median {1:.1f} ms over {2} runs (min {3:.1f} ms)'.format(
+        args.args, median*1000, len(walls), min(walls)*1000))
+    print('{0:<28}{1:>12}'.format('package', 'import [ms]'))
+    for package, us in sorted(packages.items(), key=lambda item: -item[1])[:args.top]:
+        print('{0:<28}{1:>12.1f}'.format(package, us/1000))
+
+    failed = False
+    for package in forbid:
+        if package in packages:
+            print('FAIL: {0} was imported'.format(package), file=sys.stderr)
+            failed = True
+    if args.max_ms is not None and median*1000 > args.max_ms:
+        print('FAIL: median {0:.1f} ms > {1:.1f} ms'.format(median*1000, args.max_ms), file=sys.stderr)
+        failed = True
+    sys.exit(1 if failed else 0)
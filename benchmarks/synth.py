@@ -0,0 +1,155 @@
+#!/usr/bin/env python
+# Synthetic aethalometer datafiles for benchmarks
+#
+# write_ae33(directory, start, days, timebase): writes one space-separated AE33 file per day
+#                                (8 header lines, the 70-column aeth.AE33_COLUMNS layout). Each
+#                                file also contains the midnight record of the next day, as the
+#                                instrument files do, and random gaps of missing records.
+# write_ae31(directory, start, days, timebase): writes one comma-separated AE31 file per day
+#                                ("dd-mmm-yy","hh:mm" date and time, aeth.AE31_COLUMNS layout).
+# Both return the list of written files.
+
+import argparse, os, sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import aeth
+
+AE33_HEADER = '''AETHALOMETER
+Serial number = AE33-S00-00000
+Application version = 1.1.0.0
+Number of channels = 7
+
+{columns};
+
+
+'''
+
+def ae33_header():
+    # Column line of the instrument, with units as in sample.dat
+    names = {'Date': 'Date(yyyy/MM/dd)', 'Time': 'Time(hh:mm:ss)', 'Pressure': 'Pressure(Pa)',
+             'Temperature': 'Temperature(°C)', 'BB': 'BB(%)'}
+    columns = [names.get(c, c) for c in aeth.AE33_COLUMNS if not c.startswith('ID_com')]
+    return AE33_HEADER.format(columns='; '.join(columns))
+
+def timestamps(start, days, timebase, gaps, rng):
+    # Sampling times of one file: 'days' days starting at 'start' plus the next midnight,
+    # with about 'gaps' gaps of 1 s to 10 minutes (at least one record)
+    n = int(days * 86400 // timebase) + 1
+    t = pd.Timestamp(start) + pd.to_timedelta(np.arange(n) * timebase, unit='s')
+    keep = np.ones(n, dtype=bool)
+    for first in rng.integers(1, n - 1, gaps):
+        keep[first:first + max(1, rng.integers(1, 600) // timebase)] = False
+    keep[-1] = True
+    return t[keep]
+
+def random_walk(rng, n, columns, scale, start):
+    steps = rng.normal(0, scale, (n, columns))
+    return np.round(start + np.cumsum(steps, axis=0))
+
+def ae33_frame(t, rng):
+    n = len(t)
+    df = pd.DataFrame({'Date': t.strftime('%Y/%m/%d'), 'Time': t.strftime('%H:%M:%S')})
+    df['Timebase'] = int(round((t[1] - t[0]).total_seconds())) if n > 1 else 1
+    signals = random_walk(rng, n, 21, 5, 500000)
+    for i in range(7):
+        for j, name in enumerate(['RefCh', 'Sen1Ch', 'Sen2Ch']):
+            df['{}{}'.format(name, i + 1)] = signals[:, 3*i + j].astype('int64')
+    df['Flow1'] = 3500 + rng.integers(-5, 5, n)
+    df['Flow2'] = 1500 + rng.integers(-5, 5, n)
+    df['FlowC'] = 5000 + rng.integers(-5, 5, n)
+    df['Pressure'] = 101325
+    df['Temperature'] = np.round(21 + rng.normal(0, 0.1, n), 2)
+    df['BB'] = np.round(rng.uniform(0, 40, n), 1)
+    df['ContTemp'] = 28
+    df['SupplyTemp'] = 39
+    # a tape advance every ~8 hours: status 1 for 3 minutes, then TapeAdvCount increments
+    seconds = np.asarray(t, dtype='datetime64[s]').astype('int64')
+    advance = seconds // (8*3600)
+    elapsed = seconds % (8*3600)
+    df['Status'] = np.where(elapsed < 180, 1, 0)
+    df['ContStatus'] = 0
+    df['DetectStatus'] = 10
+    df['LedStatus'] = 10
+    df['ValveStatus'] = 0
+    df['LedTemp'] = 32
+    bc = random_walk(rng, n, 7, 30, 1500)
+    for i in range(7):
+        df['BC{}1'.format(i + 1)] = bc[:, i].astype('int64') + rng.integers(-50, 50, n)
+        df['BC{}2'.format(i + 1)] = bc[:, i].astype('int64') + rng.integers(-50, 50, n)
+        df['BC{}'.format(i + 1)] = bc[:, i].astype('int64')
+    for i in range(7):
+        df['K{}'.format(i + 1)] = np.round(0.005 + 0.0008*i + rng.normal(0, 1e-5, n), 5)
+    df['TapeAdvCount'] = 1000 + advance
+    df['ID_com1'] = 5
+    df['ID_com2'] = 0
+    df['ID_com3'] = 0
+    return df[aeth.AE33_COLUMNS]
+
+def ae31_frame(t, rng):
+    n = len(t)
+    df = pd.DataFrame({'Date': t.strftime('%d-%b-%y').str.lower(), 'Time': t.strftime('%H:%M')})
+    bc = random_walk(rng, n, 7, 30, 1500)
+    for i in range(7):
+        df['BC{}'.format(i + 1)] = bc[:, i]
+    df['vflow'] = np.round(4 + rng.normal(0, 0.01, n), 2)
+    for i in range(7):
+        df['Sample zero signal {}'.format(i + 1)] = np.round(rng.normal(0.01, 0.001, n), 4)
+        df['sensing beam signal {}'.format(i + 1)] = np.round(2.5 - np.linspace(0, 0.5, n), 4)
+        df['reference zero signal {}'.format(i + 1)] = np.round(rng.normal(0.01, 0.001, n), 4)
+        df['reference beam signal {}'.format(i + 1)] = np.round(3.0 + rng.normal(0, 0.001, n), 4)
+        df['fra {}'.format(i + 1)] = 1
+        df['optical attenuation {}'.format(i + 1)] = np.round(np.linspace(5, 60, n), 3)
+    df['massfl'] = np.round(4 + rng.normal(0, 0.01, n), 2)
+    return df[aeth.AE31_COLUMNS]
+
+def write_ae33(directory, start = '2018-01-01', days = 1, timebase = 1, gaps = 3, seed = 0):
+    rng = np.random.default_rng(seed)
+    os.makedirs(directory, exist_ok=True)
+    header = ae33_header()
+    files = []
+    for day in pd.date_range(start, periods=days, freq='D'):
+        path = os.path.join(directory, 'AE33_{}.dat'.format(day.strftime('%Y%m%d')))
+        df = ae33_frame(timestamps(day, 1, timebase, gaps, rng), rng)
+        with open(path, 'w') as f:
+            f.write(header)
+            # the instrument ends each record with a space
+            df.to_csv(f, sep=' ', header=False, index=False, lineterminator=' \n')
+        files.append(path)
+    return files
+
+def write_ae31(directory, start = '2018-01-01', days = 1, timebase = 60, gaps = 3, seed = 0):
+    rng = np.random.default_rng(seed)
+    os.makedirs(directory, exist_ok=True)
+    files = []
+    for day in pd.date_range(start, periods=days, freq='D'):
+        path = os.path.join(directory, 'AE31_{}.csv'.format(day.strftime('%Y%m%d')))
+        df = ae31_frame(timestamps(day, 1, timebase, gaps, rng), rng)
+        df.to_csv(path, header=False, index=False, quoting=0)
+        # AE31 files quote the date and time fields
+        text = open(path).read().splitlines()
+        with open(path, 'w') as f:
+            for line in text:
+                date, time, rest = line.split(',', 2)
+                f.write('"{}","{}",{}\n'.format(date, time, rest))
+        files.append(path)
+    return files
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Writes synthetic aethalometer datafiles')
+    parser.add_argument('directory', help='Output directory')
+    parser.add_argument('--model', choices=['AE33', 'AE31'], default='AE33')
+    parser.add_argument('--start', default='2018-01-01', help='First day (default: 2018-01-01)')
+    parser.add_argument('--days', type=int, default=1, help='Number of daily files (default: 1)')
+    parser.add_argument('--timebase', type=int,
+                        help='Seconds between records (default: 1 for AE33, 60 for AE31)')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    if args.model == 'AE33':
+        files = write_ae33(args.directory, args.start, args.days, args.timebase or 1, seed=args.seed)
+    else:
+        files = write_ae31(args.directory, args.start, args.days, args.timebase or 60, seed=args.seed)
+    print('\n'.join(files))
@@ -0,0 +1,34 @@
+# Shared fixtures of the tests: the AE33 sample file of the repository
+import os, sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import aeth
+
+SAMPLE = os.path.join(ROOT, 'sample.dat')
+
+@pytest.fixture(scope='session')
+def sample():
+    # sample.dat read with the default reader (all columns, float64)
+    return aeth.Aethalometer(SAMPLE)
+
+@pytest.fixture
+def data(sample):
+    # a copy of the sample that a test may modify
+    data = aeth.Aethalometer(model = sample.model)
+    data.df = sample.df.copy()
+    return data
+
+def write_sample(path, rows = slice(None), header = True):
+    # Writes the data lines 'rows' (a slice) of the sample, with its header lines, to path
+    with open(SAMPLE, 'rb') as f:
+        lines = f.readlines()
+    skip = aeth.MODELS['AE33']['skiprows']
+    with open(path, 'wb') as f:
+        if header:
+            f.writelines(lines[:skip])
+        f.writelines(lines[skip:][rows])
+    return str(path)
@@ -0,0 +1,55 @@
+# --batch: stations of the INI-file processed on a pool, a failing station isolated
+import configparser, io, shutil
+
+import pytest
+
+import aeth
+from conftest import SAMPLE
+
+def stations(tmp_path):
+    data_path = tmp_path / 'good'
+    data_path.mkdir()
+    shutil.copy(SAMPLE, data_path / 'sample.dat')
+    config = configparser.ConfigParser()
+    config.read_string("""
+[GENERAL_SETTINGS]
+FILE_EXT: '.dat'
+FREQ: 'HOURLY'
+INTERVAL: 1
+CACHE_PATH: '{cache}'
+
+[STATION:good]
+DATA_PATH: '{good}'
+
+[STATION:missing]
+DATA_PATH: '{missing}'
+
+[STATION:invalid]
+DATA_PATH: '{good}'
+FREQ: 'WEEKLY'
+""".format(cache = tmp_path / 'cache', good = data_path, missing = tmp_path / 'missing'))
+    return aeth.read_stations(config)
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_failing_stations_are_isolated(tmp_path, sample, workers):
+    options = {'out_dir': str(tmp_path / 'out')}
+    results = {station['name']: (result, error)
+               for station, result, error in aeth.run_stations(stations(tmp_path), workers, options)}
+    assert sorted(results) == ['good', 'invalid', 'missing']
+    result, error = results['good']
+    assert error is None
+    assert (result['files'], result['rows'], result['intervals']) == (1, len(sample.df), 24)
+    assert (tmp_path / 'out' / 'good.csv').exists()
+    assert results['missing'][0] is None and 'no directory' in results['missing'][1]
+    assert results['invalid'][0] is None and 'FREQ' in results['invalid'][1]
+
+def test_batch_summary(tmp_path):
+    results = list(aeth.run_stations(stations(tmp_path), 1, {'out_dir': str(tmp_path / 'out')}))
+    out = io.StringIO()
+    aeth.batch_summary(results, out)
+    lines = out.getvalue().splitlines()
+    assert lines[0].split()[:3] == ['station', 'model', 'files']
+    rows = {line.split()[0]: line for line in lines[1:]}
+    assert 'ok (' in rows['good'] and rows['good'].split()[1:5] == ['AE33', '1', '1440', '24']
+    assert 'FileNotFoundError' in rows['missing']
+    assert 'invalid [STATION:invalid] settings' in rows['invalid']
@@ -0,0 +1,16 @@
+# FileCache eviction
+import os
+
+import aeth
+from conftest import SAMPLE
+
+def test_evict_keeps_catalog_and_new_entry(tmp_path):
+    catalog = aeth.FileCatalog(str(tmp_path), os.path.dirname(SAMPLE) + '/', '*.dat').update()
+    cache = aeth.FileCache(str(tmp_path), max_size = 1)
+    cache.load(SAMPLE)
+    first = cache.entry(SAMPLE)
+    assert os.path.exists(catalog.entry) and os.path.exists(first)
+    cache.load(SAMPLE, fast = True)
+    assert os.path.exists(catalog.entry)
+    assert os.path.exists(cache.entry(SAMPLE, fast = True))
+    assert not os.path.exists(first)
@@ -0,0 +1,39 @@
+# Command line checks of aeth.py
+import os, shutil, subprocess, sys
+
+from conftest import ROOT, SAMPLE
+
+def run(*args, cwd):
+    return subprocess.run([sys.executable, os.path.join(ROOT, 'aeth.py'), '--no-plot', '--no-cache'] + list(args),
+                          cwd = cwd, capture_output = True, text = True)
+
+def test_profile_does_not_take_the_datafile(tmp_path):
+    datafile = str(tmp_path / 'sample.dat')
+    shutil.copy(SAMPLE, datafile)
+    result = run('--profile', datafile, cwd = tmp_path)
+    assert result.returncode == 0
+    assert 'total' in result.stderr
+    with open(datafile, 'rb') as f, open(SAMPLE, 'rb') as g:
+        assert f.read() == g.read()
+
+def test_profile_json_refuses_an_input(tmp_path):
+    datafile = str(tmp_path / 'sample.dat')
+    shutil.copy(SAMPLE, datafile)
+    result = run('--profile-json', datafile, datafile, cwd = tmp_path)
+    assert result.returncode == 2
+    assert 'would overwrite' in result.stderr
+    result = run('--profile-json', str(tmp_path / 'profile.json'), datafile, cwd = tmp_path)
+    assert result.returncode == 0
+    assert os.path.exists(tmp_path / 'profile.json')
+
+def test_cache_is_not_created_in_data_path(tmp_path):
+    # explicit files and a DATA_PATH that does not exist: the cache goes to the user cache directory
+    ini = tmp_path / 'config.ini'
+    ini.write_text("[GENERAL_SETTINGS]\nDATA_PATH: '{0}'\nFILE_EXT: '.dat'\nFREQ: 'HOURLY'\nINTERVAL: 1\n"
+                   .format(tmp_path / 'nodir' / 'data'))
+    env = dict(os.environ, XDG_CACHE_HOME = str(tmp_path / 'cache'))
+    result = subprocess.run([sys.executable, os.path.join(ROOT, 'aeth.py'), '--no-plot', '--inifile', str(ini),
+                             SAMPLE], cwd = tmp_path, capture_output = True, text = True, env = env)
+    assert result.returncode == 0
+    assert not os.path.exists(tmp_path / 'nodir')
+    assert os.listdir(tmp_path / 'cache' / 'aeth')
@@ -0,0 +1,49 @@
+# Compact storage: downcasting while reading and the memory-mapped SignalStore
+import numpy as np
+import pandas as pd
+
+import aeth
+from conftest import SAMPLE
+
+def memory_usage_ratio(df, full):
+    return aeth.memory_usage(df) / aeth.memory_usage(full)
+
+def test_compact_dtypes_is_lossless(sample):
+    df = aeth.compact_dtypes(sample.df.drop(columns = ['Date', 'Time']).copy())
+    assert df['Status'].dtype.itemsize <= 2
+    assert memory_usage_ratio(df, sample.df) < 0.5
+    pd.testing.assert_frame_equal(df, sample.df.drop(columns = ['Date', 'Time']), check_dtype = False)
+
+def test_compact_reader_equals_default(sample):
+    # several chunks, each downcast before the next one is read
+    df = aeth.read_datafile(SAMPLE, compact = True, chunksize = 100)
+    assert 'Date' not in df and 'Time' not in df
+    assert aeth.memory_usage(df) == aeth.memory_usage(aeth.compact_frame(sample.df))
+    pd.testing.assert_frame_equal(df, sample.df.drop(columns = ['Date', 'Time']), check_dtype = False)
+
+def assert_same_series(series, expected):
+    np.testing.assert_array_equal(series.index.to_numpy(dtype='datetime64[ns]'),
+                                  expected.index.to_numpy(dtype='datetime64[ns]'))
+    np.testing.assert_array_equal(np.asarray(series), expected.to_numpy())
+    assert series.dtype == expected.dtype
+
+def test_signal_store_round_trip(tmp_path, sample):
+    store = aeth.SignalStore(str(tmp_path / 'signals'))
+    columns = ['RefCh1', 'Sen1Ch1', 'Status']
+    store.put(sample.df[columns])
+    assert store.size() > 0
+    for column in columns:
+        series = store.get(column)
+        assert_same_series(series, sample.df[column])
+    # aligned to a subset of the rows
+    index = sample.df.index[::7]
+    assert_same_series(store.get('RefCh1', index), sample.df['RefCh1'].iloc[::7])
+
+def test_compact_keeps_the_signals(data, sample):
+    before, after = data.compact()
+    assert after < before
+    assert 'RefCh1' not in data.df
+    np.testing.assert_array_equal(data.signal('RefCh1').to_numpy(), sample.df['RefCh1'].to_numpy())
+    # rows dropped afterwards (e.g. by quality()): the signals follow the rows
+    data.df = data.df.iloc[10:]
+    np.testing.assert_array_equal(data.signal('Sen1Ch7').to_numpy(), sample.df['Sen1Ch7'].to_numpy()[10:])
@@ -0,0 +1,34 @@
+# Aethalometer.from_files: parallel loading and overlapping files
+import pandas as pd
+
+import aeth
+from conftest import write_sample
+
+def split_sample(tmp_path):
+    # three files in the wrong order, the second one overlapping both others
+    return [write_sample(tmp_path / 'c.dat', slice(990, None)),
+            write_sample(tmp_path / 'a.dat', slice(0, 600)),
+            write_sample(tmp_path / 'b.dat', slice(500, 1000))]
+
+def test_parallel_equals_serial(tmp_path, sample):
+    paths = split_sample(tmp_path)
+    serial = aeth.Aethalometer.from_files(paths, workers = 1)
+    parallel = aeth.Aethalometer.from_files(paths, workers = 3)
+    pd.testing.assert_frame_equal(parallel.df, serial.df)
+    assert parallel.sources == serial.sources
+
+def test_overlapping_timestamps_are_dropped(tmp_path, sample):
+    paths = split_sample(tmp_path)
+    data = aeth.Aethalometer.from_files(paths, workers = 2)
+    assert data.df.index.is_monotonic_increasing
+    assert not data.df.index.has_duplicates
+    pd.testing.assert_frame_equal(data.df, sample.df)
+    assert [source['first'] for source in data.sources] == [sample.df.index[i] for i in (990, 0, 500)]
+
+def test_cached_load_equals_parsed(tmp_path, sample):
+    paths = split_sample(tmp_path)
+    cache = aeth.FileCache(str(tmp_path / 'cache'))
+    first = aeth.Aethalometer.from_files(paths, workers = 2, cache = cache)
+    second = aeth.Aethalometer.from_files(paths, workers = 2, cache = cache)
+    assert cache.hits == 3
+    pd.testing.assert_frame_equal(second.df, first.df)
@@ -0,0 +1,52 @@
+# follow_intervals: lines appended to the followed file and rollover to a newer file
+import queue, threading
+
+import pandas as pd
+
+import aeth
+from conftest import SAMPLE, write_sample
+from test_stream import assert_same_table
+
+def take(rows, timeout = 10):
+    # next() of the endless generator, failing instead of hanging
+    result = queue.Queue()
+    threading.Thread(target = lambda: result.put(next(rows)), daemon = True).start()
+    return result.get(timeout = timeout)
+
+def test_appended_lines_and_newer_file(tmp_path, sample):
+    data_path = tmp_path / 'data'
+    data_path.mkdir()
+    path = write_sample(data_path / 'a.dat', slice(0, 131))
+    catalog = aeth.FileCatalog(str(tmp_path / 'cache'), str(data_path) + '/', '*.dat', 'AE33')
+    rows = aeth.follow_intervals(path, catalog, freq = 'HOURLY', poll = 0.01)
+    tables = [take(rows)]
+    # lines appended, the last one incomplete
+    with open(SAMPLE, 'rb') as f:
+        lines = f.readlines()[aeth.MODELS['AE33']['skiprows']:]
+    with open(path, 'ab') as f:
+        f.writelines(lines[131:700])
+        f.write(lines[700][:20])
+    tables.append(take(rows))
+    # the instrument starts a new file
+    write_sample(data_path / 'b.dat', slice(700, None))
+    tables.append(take(rows))
+    result = pd.concat(tables)
+    expected = aeth.calculate_intervals(sample, 'HOURLY')
+    assert list(map(len, tables)) == [2, 9, 12]
+    assert_same_table(result, expected.iloc[:-1], sample.BCKeys)
+
+def test_file_follower_reads_appended_lines(tmp_path, sample):
+    path = write_sample(tmp_path / 'a.dat', slice(0, 10))
+    follower = aeth.FileFollower(path, **aeth.stream_options(sample.BCKeys))
+    assert len(follower.read()) == 10
+    assert follower.read() is None
+    with open(SAMPLE, 'rb') as f:
+        lines = f.readlines()[aeth.MODELS['AE33']['skiprows']:]
+    with open(path, 'ab') as f:
+        f.writelines(lines[10:15])
+    df = follower.read()
+    pd.testing.assert_frame_equal(df[sample.BCKeys], sample.df[sample.BCKeys].iloc[10:15],
+                                  check_dtype = False, check_freq = False)
+    # replaced by a shorter file: read again from the start
+    write_sample(path, slice(0, 3))
+    assert len(follower.read()) == 3
@@ -0,0 +1,36 @@
+# calculate_intervals_incremental against a full recompute
+import numpy as np
+
+import aeth
+from conftest import SAMPLE
+
+def write_lines(path, lines):
+    with open(path, 'wb') as f:
+        f.writelines(lines)
+
+def test_incremental_equals_full(tmp_path, capsys):
+    with open(SAMPLE, 'rb') as f:
+        lines = f.readlines()
+    path = str(tmp_path / 'data.dat')
+    store = aeth.IntervalStore(str(tmp_path / 'intervals'))
+    for n in [700, 705, 1000, len(lines)]:
+        write_lines(path, lines[:n])
+        data = aeth.Aethalometer.from_files([path], workers = 1)
+        result = aeth.calculate_intervals_incremental(data, store, 'MINUTELY', interval = 10)
+        expected = aeth.calculate_intervals(data, 'MINUTELY', interval = 10)
+        assert result.index.equals(expected.index)
+        np.testing.assert_array_equal(result.to_numpy(dtype='float64', na_value=np.nan)[:, 1:],
+                                      expected.to_numpy(dtype='float64', na_value=np.nan)[:, 1:])
+    # the last run reused the saved intervals
+    recomputed, total = capsys.readouterr().err.strip().split('\n')[-1].split()[1:4:2]
+    assert int(recomputed) < int(total) == len(expected)
+
+def test_store_key_depends_on_options(tmp_path):
+    store = aeth.IntervalStore(str(tmp_path))
+    keys = set()
+    for options in [{}, aeth.fast_options('AE33'), aeth.stream_options(['BC6'])]:
+        data = aeth.Aethalometer.from_files([SAMPLE], workers = 1, **options)
+        keys.add(store.key(data, 'HOURLY', 1, 0, False))
+        data.quality(tape_window = 60)
+        keys.add(store.key(data, 'HOURLY', 1, 0, False))
+    assert len(keys) == 6
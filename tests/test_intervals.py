@@ -0,0 +1,51 @@
+# calculate_intervals against the per-interval loops of earlier versions
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+from dateutil import rrule
+
+import aeth
+
+def legacy_intervals(data, freq, interval):
+    # calculate_hourly/minutely/secondly_intervals as they were before the vectorized engine
+    if freq == 'HOURLY':
+        rounder, width = aeth.hour_rounder, timedelta(hours=1)
+    else:
+        rounder, width = aeth.minute_rounder, timedelta(minutes=1)
+    tmin = rounder(data.df.first_valid_index())
+    tmax = rounder(data.df.last_valid_index()) - width
+    df = pd.DataFrame(columns=['start','end'])
+    for dt in rrule.rrule(getattr(rrule, freq), interval = interval, dtstart=tmin, until=tmax):
+        subset = data.getSubset(dt, dt + width)
+        index = len(df)
+        df.loc[index, 'start'] = dt
+        df.loc[index, 'end'] = dt + width
+        for key, value in subset.mean().round(0).items():
+            df.loc[index, key] = value
+    return df.set_index('end')
+
+def assert_same_table(result, expected, keys):
+    assert len(result) == len(expected)
+    assert (result.index.to_numpy(dtype='datetime64[ns]') == expected.index.to_numpy(dtype='datetime64[ns]')).all()
+    assert (result['start'].to_numpy(dtype='datetime64[ns]') == expected['start'].to_numpy(dtype='datetime64[ns]')).all()
+    np.testing.assert_array_equal(result[keys].to_numpy(dtype='float64'), expected[keys].to_numpy(dtype='float64'))
+
+@pytest.mark.parametrize('freq, interval', [('HOURLY', 1), ('HOURLY', 4), ('MINUTELY', 1), ('MINUTELY', 7)])
+def test_compat_equals_legacy(sample, freq, interval):
+    result = aeth.calculate_intervals(sample, freq, interval = interval, compat = True)
+    assert_same_table(result, legacy_intervals(sample, freq, interval), sample.BCKeys)
+
+def test_compat_secondly_equals_legacy(data):
+    data.df = data.df.iloc[:120]
+    result = aeth.calculate_secondly_intervals(data, interval = 10)
+    assert_same_table(result, legacy_intervals(data, 'SECONDLY', 10), data.BCKeys)
+
+def test_aligned_windows(sample):
+    result = aeth.calculate_intervals(sample, 'HOURLY', interval = 1)
+    df = sample.df[sample.BCKeys]
+    expected = df.groupby(df.index.floor('h')).mean().round(0)
+    np.testing.assert_array_equal(result['start'].to_numpy(dtype='datetime64[ns]'),
+                                  expected.index.to_numpy(dtype='datetime64[ns]'))
+    np.testing.assert_array_equal(result[sample.BCKeys].to_numpy(), expected.to_numpy())
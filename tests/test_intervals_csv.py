@@ -0,0 +1,37 @@
+# calculate_intervals_csv: means, sample counts and coverage of user-defined windows
+import io
+
+import numpy as np
+
+import aeth
+
+INTERVALS = """start,end
+2018-02-27 10:00,2018-02-27 11:00
+2018-02-27 23:00,2018-02-28 01:00
+2018-02-27 06:30,2018-02-27 06:00
+2018-02-26 20:00,2018-02-26 22:00
+2018-02-27 05:00,2018-02-27 12:00
+"""
+
+def test_counts_and_coverage(sample):
+    result = aeth.calculate_intervals_csv(io.StringIO(INTERVALS), sample)
+    # full window: 61 samples (both ends included) for 60 minutes
+    assert result['count'].iloc[0] == 61
+    assert result['coverage'].iloc[0] == 1
+    # partial window: the data ends at 23:59, 60 samples for 120 minutes
+    assert result['count'].iloc[1] == 60
+    assert result['coverage'].iloc[1] == 0.5
+    # end before start and a window without data
+    assert result['count'].iloc[2] == 0
+    assert result['count'].iloc[3] == 0
+    assert np.isnan(result['BC6'].iloc[3])
+    # overlapping windows are independent
+    assert result['count'].iloc[4] == 421
+
+def test_means_equal_subsets(sample):
+    result = aeth.calculate_intervals_csv(io.StringIO(INTERVALS), sample)
+    for i in [0, 1, 4]:
+        start, end = result['start'].iloc[i], result.index[i]
+        expected = sample.df.loc[start:end, sample.BCKeys].mean().round(0)
+        np.testing.assert_array_equal(result[sample.BCKeys].iloc[i].to_numpy(dtype='float64'),
+                                      expected.to_numpy(dtype='float64'))
@@ -0,0 +1,60 @@
+# ResultWriter: each output format round-trips an interval table
+import json
+
+import pandas as pd
+import pytest
+
+import aeth
+
+FORMATS = ['csv', 'csv.gz', 'parquet', 'feather']
+
+@pytest.fixture(scope='module')
+def table(sample):
+    table = aeth.calculate_intervals(sample, 'MINUTELY', interval = 10, stats = ['mean', 'count'])
+    table.iloc[3, 1:] = float('nan')     # an interval without data
+    return table
+
+def read_back(path, format):
+    # the table written by ResultWriter and its units
+    if format.startswith('csv'):
+        units = pd.read_csv(path, nrows = 1).iloc[0].to_dict()
+        df = pd.read_csv(path, skiprows = [1], index_col = 'end', parse_dates = ['end', 'start'])
+        return df, units
+    if format == 'parquet':
+        import pyarrow.parquet as pq
+        arrow = pq.read_table(path)
+    else:
+        import pyarrow as pa
+        with pa.memory_map(path) as source:
+            arrow = pa.ipc.open_file(source).read_all()
+    units = json.loads(arrow.schema.metadata[b'units'])
+    return arrow.to_pandas().set_index('end'), units
+
+@pytest.mark.parametrize('format', FORMATS)
+def test_round_trip(tmp_path, sample, table, format):
+    if format in ('parquet', 'feather'):
+        pytest.importorskip('pyarrow')
+    path = str(tmp_path / ('result.' + format))
+    with aeth.ResultWriter(path, units = sample.units, chunksize = 50) as writer:
+        for i in range(0, len(table), 70):
+            writer.write(table.iloc[i:i + 70])
+    assert writer.format == format
+    assert writer.rows == len(table)
+    df, units = read_back(path, format)
+    assert list(df.columns) == list(table.columns)
+    pd.testing.assert_index_equal(df.index.as_unit('ns'), table.index.as_unit('ns'), exact = False)
+    pd.testing.assert_series_equal(df['start'].dt.as_unit('ns'), table['start'].dt.as_unit('ns'),
+                                   check_index = False, check_freq = False)
+    pd.testing.assert_frame_equal(df.iloc[:, 1:].reset_index(drop = True), table.iloc[:, 1:].reset_index(drop = True),
+                                  check_dtype = False)
+    assert units['end'] == '-' and units['BC6_mean'] == 'ng/m$^3$' and units['BC6_count'] == '-'
+
+def test_midnights_keep_the_time(tmp_path):
+    # a chunk of midnights only is still written with the time of day
+    starts = pd.date_range('2018-02-27', periods = 3, freq = 'D')
+    table = aeth.interval_table(starts, starts + pd.Timedelta(days = 1), pd.DataFrame({'BC6': [1.0, 2.0, 3.0]}))
+    path = str(tmp_path / 'days.csv')
+    with aeth.ResultWriter(path) as writer:
+        writer.write(table)
+    with open(path) as f:
+        assert f.readlines()[2].startswith('2018-02-28 00:00:00,2018-02-27 00:00:00,')
@@ -0,0 +1,34 @@
+# decimate: min/max preserving reduction of the plotted line
+import numpy as np
+
+from aeth_plot import decimate
+
+def test_short_series_is_kept():
+    assert (decimate(np.arange(10.0), 10) == np.arange(10)).all()
+
+def test_extremes_survive():
+    rng = np.random.default_rng(1)
+    values = rng.normal(size = 100000)
+    values[12345], values[67890] = 50, -50
+    keep = decimate(values, 1000)
+    assert len(keep) <= 1000
+    assert (np.diff(keep) > 0).all()
+    assert 12345 in keep and 67890 in keep
+    # the minimum and maximum of every bucket are kept
+    buckets = np.array_split(values, 500)
+    kept = values[keep]
+    for bucket in buckets:
+        assert bucket.min() in kept and bucket.max() in kept
+
+def test_nan_gaps_survive():
+    values = np.sin(np.arange(100000) / 1000.0)
+    values[30000:30010] = np.nan
+    values[99999] = np.nan
+    keep = decimate(values, 500)
+    kept = values[keep]
+    assert np.isnan(kept).sum() == 2
+    gap = keep[np.isnan(kept)][0]
+    assert 30000 <= gap < 30010
+    # points on both sides of the gap: the plotted line is broken there
+    assert (keep < 30000).any() and (keep >= 30010).any()
+    assert keep[-1] == 99999
@@ -0,0 +1,39 @@
+# quality_mask rules and tape advance windows
+import numpy as np
+import pandas as pd
+
+import aeth
+
+def frame(status, counter, step = 60):
+    index = pd.date_range('2018-02-27', periods = len(status), freq = '{}s'.format(step), name = 'Datetime')
+    return pd.DataFrame({'Status': status, 'TapeAdvCount': counter}, index = index)
+
+def test_status_bits():
+    df = frame([0, 1, 2, 4, 0x80, 0x100, 0x180, 0x200, 0x1000, 0x81], [0] * 10)
+    mask = aeth.quality_mask(df, aeth.MODELS['AE33']['quality'])
+    # tape low (0x80) and tape critical (0x100) are warnings only
+    np.testing.assert_array_equal(mask, [False, True, True, True, False, False, False, True, True, True])
+    np.testing.assert_array_equal(aeth.quality_mask(df, {'Status': 0x180}),
+                                  [False, False, False, False, True, True, True, False, False, True])
+    assert not aeth.quality_mask(df, {'Status': 0}).any()
+    assert not aeth.quality_mask(df, {'ValveStatus': 0xff}).any()     # missing column
+
+def test_missing_status_is_kept():
+    df = frame([np.nan, 1.0, np.nan], [0] * 3)
+    np.testing.assert_array_equal(aeth.quality_mask(df, {'Status': 0x1}), [False, True, False])
+
+def test_tape_window():
+    # tape advance between the rows at 5 and 6 minutes
+    df = frame([0] * 12, [3] * 6 + [4] * 6)
+    mask = aeth.quality_mask(df, {}, 'TapeAdvCount', tape_window = 120)
+    np.testing.assert_array_equal(np.flatnonzero(mask), [4, 5, 6, 7, 8])
+    assert not aeth.quality_mask(df, {}, 'TapeAdvCount', tape_window = 0).any()
+
+def test_quality_drops_and_counts(data):
+    data.df = data.df.copy()
+    data.df.iloc[100:110, data.df.columns.get_loc('Status')] = 0x4
+    rows = len(data.df)
+    rejected = data.quality(tape_window = 0)
+    assert rejected == 10 and len(data.df) == rows - 10
+    intervals = aeth.calculate_intervals(data, 'HOURLY')
+    assert intervals['rejected'].sum() == 10
@@ -0,0 +1,37 @@
+# read_range (byte range bisection) against filtering the whole file
+from datetime import datetime
+
+import pandas as pd
+import pytest
+
+import aeth
+from conftest import SAMPLE, write_sample
+
+RANGES = [
+    (datetime(2018, 2, 27, 10, 30), datetime(2018, 2, 27, 12, 0)),         # on sample timestamps
+    (datetime(2018, 2, 27, 10, 30, 30), datetime(2018, 2, 27, 12, 0, 30)), # between samples
+    (datetime(2018, 2, 27, 23, 0), datetime(2018, 2, 27, 23, 59)),         # end in the last line
+    (datetime(2018, 2, 27, 23, 59), None),                                 # only the last line
+    (None, datetime(2018, 2, 27, 0, 0)),                                   # only the first line
+    (None, None),
+    ]
+
+def assert_same_rows(result, expected):
+    pd.testing.assert_frame_equal(result, expected, check_freq = False)
+
+@pytest.mark.parametrize('start, end', RANGES)
+def test_range_equals_filtered(sample, start, end):
+    assert_same_rows(aeth.read_range(SAMPLE, start = start, end = end), sample.df.loc[start:end])
+
+@pytest.mark.parametrize('start, end', [(datetime(2018, 2, 26), datetime(2018, 2, 26, 23)),
+                                        (datetime(2018, 2, 28), datetime(2018, 3, 1)),
+                                        (datetime(2018, 2, 27, 12), datetime(2018, 2, 27, 11))])
+def test_range_without_data(start, end):
+    assert aeth.read_range(SAMPLE, start = start, end = end).empty
+
+def test_last_line_without_newline(tmp_path, sample):
+    path = write_sample(tmp_path / 'a.dat')
+    with open(path, 'rb+') as f:
+        f.truncate(f.seek(0, 2) - 2)     # CR LF
+    start, end = datetime(2018, 2, 27, 23, 50), datetime(2018, 2, 27, 23, 59)
+    assert_same_rows(aeth.read_range(path, start = start, end = end), sample.df.loc[start:end])
@@ -0,0 +1,20 @@
+# The fast reader (--fast) against the default reader
+import numpy as np
+import pytest
+
+import aeth
+from conftest import SAMPLE
+from test_intervals import assert_same_table
+
+def test_fast_reads_the_same_values(sample):
+    fast = aeth.Aethalometer(SAMPLE, **aeth.fast_options())
+    assert (fast.df.index == sample.df.index).all()
+    assert (fast.df[sample.BCKeys].dtypes == 'float64').all()
+    np.testing.assert_array_equal(fast.df[sample.BCKeys].to_numpy(), sample.df[sample.BCKeys].to_numpy())
+
+@pytest.mark.parametrize('freq, interval, compat', [('HOURLY', 1, True), ('MINUTELY', 1, True),
+                                                    ('MINUTELY', 7, False), ('SECONDLY', 10, False)])
+def test_fast_intervals_equal_default(sample, freq, interval, compat):
+    fast = aeth.Aethalometer(SAMPLE, **aeth.fast_options())
+    assert_same_table(aeth.calculate_intervals(fast, freq, interval = interval, compat = compat),
+                      aeth.calculate_intervals(sample, freq, interval = interval, compat = compat), sample.BCKeys)
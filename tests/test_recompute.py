@@ -0,0 +1,20 @@
+# recompute_bc against the BC reported by the instrument
+import numpy as np
+import pytest
+
+import aeth
+
+def test_ae33_reproduces_instrument_bc(sample):
+    df, starts = aeth.recompute_bc(sample, correction = 'ae33')
+    for key in ['BC{0}'.format(i) for i in range(1, 8)]:
+        instrument = sample.df[key].to_numpy(dtype='float64')
+        recomputed = df[key].to_numpy(dtype='float64')
+        assert np.isfinite(recomputed).sum() == len(recomputed) - starts.sum()
+        valid = np.isfinite(recomputed) & (instrument > 100)     # ratios of the clean hours are noise
+        assert np.median(recomputed[valid] / instrument[valid]) == pytest.approx(1, abs = 0.01)
+
+def test_recompute_adds_attenuation(data):
+    spots = data.recompute(correction = 'none')
+    assert spots >= 1
+    assert ['ATN{0}'.format(i) for i in range(1, 8)] == [c for c in data.df.columns if c.startswith('ATN')]
+    assert ('recompute', [('correction', 'none')]) in data.options.items()
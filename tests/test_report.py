@@ -0,0 +1,19 @@
+# report_periods of raw data (indexed by the sample time) and of interval tables (indexed by the window end)
+import pandas as pd
+
+import aeth
+
+def test_three_days_of_hourly_intervals():
+    ends = pd.date_range('2018-02-27 01:00', '2018-03-02 00:00', freq = 'h')
+    periods = aeth.report_periods(ends, 'day', closed = 'right')
+    assert [label for start, end, label in periods] == ['2018-02-27', '2018-02-28', '2018-03-01']
+    assert periods[0][:2] == (pd.Timestamp('2018-02-27'), pd.Timestamp('2018-02-28'))
+    # each period holds its 24 windows
+    for start, end, label in periods:
+        assert ((ends > start) & (ends <= end)).sum() == 24
+
+def test_three_days_of_samples():
+    times = pd.date_range('2018-02-27 00:00', '2018-03-01 23:59', freq = 'min')
+    assert len(aeth.report_periods(times, 'day')) == 3
+    assert len(aeth.report_periods(times, 'month')) == 2
+    assert aeth.report_periods(times, 'all')[0][2] == 'all'
@@ -0,0 +1,70 @@
+# RingBuffer and the --connect intervals averaged from it (RingIntervals)
+import numpy as np
+import pandas as pd
+
+import aeth
+from conftest import SAMPLE
+from test_stream import assert_same_table
+
+def records(start, n, column = 'BC6'):
+    index = pd.date_range(start, periods = n, freq = 'min', name = 'Datetime')
+    return pd.DataFrame({column: np.arange(n, dtype='float64')}, index = index)
+
+def test_wraparound_past_capacity():
+    buffer = aeth.RingBuffer(['BC6'], capacity = 5)
+    for i in range(0, 12, 3):
+        buffer.append(records('2018-02-27 00:00', 12).iloc[i:i + 3])
+    assert len(buffer) == 5
+    assert buffer.total == 12
+    frame = buffer.frame()
+    pd.testing.assert_index_equal(frame.index, pd.date_range('2018-02-27 00:07', periods = 5, freq = 'min',
+                                                             name = 'Datetime', unit = 'ns'))
+    np.testing.assert_array_equal(frame['BC6'].to_numpy(), np.arange(7, 12))
+    assert buffer.evicted == pd.Timestamp('2018-02-27 00:06').value
+    # a block longer than the capacity keeps its last records
+    buffer.append(records('2018-02-27 01:00', 8))
+    np.testing.assert_array_equal(buffer.frame()['BC6'].to_numpy(), np.arange(3, 8))
+    assert buffer.total == 20
+
+def test_frame_start_and_end():
+    buffer = aeth.RingBuffer(['BC6', 'BB'], capacity = 10)
+    buffer.append(records('2018-02-27 00:00', 14))
+    frame = buffer.frame(start = '2018-02-27 00:08')
+    assert frame.index[0] == pd.Timestamp('2018-02-27 00:08')
+    assert len(frame) == 6
+    np.testing.assert_array_equal(frame['BC6'].to_numpy(), np.arange(8, 14))
+    assert frame['BB'].isna().all()
+    frame = buffer.frame('2018-02-27 00:05', '2018-02-27 00:09')
+    np.testing.assert_array_equal(frame['BC6'].to_numpy(), np.arange(5, 9))
+    assert buffer.frame(start = '2018-02-27 01:00').empty
+    # out of order records are dropped, the buffer stays sorted
+    buffer.append(records('2018-02-27 00:10', 6))
+    assert buffer.dropped == 4
+    assert buffer.frame().index.is_monotonic_increasing
+    assert len(buffer.frame(start = '2018-02-27 00:14')) == 2
+
+def test_intervals_from_buffer_equal_batch(sample):
+    keys = sample.BCKeys
+    with open(SAMPLE, 'rb') as f:
+        text = f.read()
+    parser = aeth.RecordParser('AE33', **aeth.stream_options(keys))
+    accumulator = aeth.RingIntervals(aeth.RingBuffer(keys, capacity = 30), 'MINUTELY', 10)
+    frames = []
+    for i in range(0, len(text), 4096):
+        df = parser.feed(text[i:i + 4096])
+        if df is not None:
+            frames.append(accumulator.add(df))
+    frames.append(accumulator.flush())
+    expected = aeth.calculate_intervals(sample, 'MINUTELY', interval = 10)
+    assert_same_table(pd.concat(frames), expected, keys)
+    assert accumulator.truncated == 0
+
+def test_intervals_longer_than_the_buffer():
+    buffer = aeth.RingBuffer(['BC6'], capacity = 20)
+    accumulator = aeth.RingIntervals(buffer, 'HOURLY', 1)
+    rows = accumulator.add(records('2018-02-27 00:00', 61))
+    assert len(rows) == 1
+    # the first hour is averaged from its last 19 records (41 ... 59)
+    assert rows['BC6'].iloc[0] == np.arange(41, 60).mean().round()
+    assert accumulator.truncated == 1
+    assert accumulator.flush()['BC6'].iloc[0] == 60
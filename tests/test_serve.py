@@ -0,0 +1,93 @@
+# IntervalServer (the --serve daemon) against calculate_intervals
+import shutil, socket, threading, time, urllib.error, urllib.request
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import aeth
+from conftest import SAMPLE
+from test_intervals import assert_same_table
+
+@pytest.fixture
+def server(tmp_path):
+    data_path = tmp_path / 'data'
+    data_path.mkdir()
+    shutil.copy(SAMPLE, data_path / 'sample.dat')
+    catalog = aeth.FileCatalog(str(tmp_path / 'cache'), str(data_path) + '/', '*.dat', 'AE33')
+    server = aeth.IntervalServer(catalog, 'AE33')
+    server.refresh()
+    return server
+
+@pytest.fixture
+def url(server):
+    with socket.socket() as s:
+        s.bind(('localhost', 0))
+        port = s.getsockname()[1]
+    threading.Thread(target = aeth.serve_intervals, args = (server, 'localhost', port, 60), daemon = True).start()
+    for i in range(100):
+        try:
+            socket.create_connection(('localhost', port), timeout = 1).close()
+            break
+        except OSError:
+            time.sleep(0.05)
+    return 'http://localhost:{0}'.format(port)
+
+def status(url):
+    try:
+        return urllib.request.urlopen(url).status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+@pytest.mark.parametrize('interval', ['0', '-1', 'x', '1.5'])
+def test_bad_interval_is_rejected(url, interval):
+    assert status(url + '/intervals?freq=minutely&interval=' + interval) == 400
+
+def test_good_interval_is_answered(url):
+    assert status(url + '/intervals?freq=minutely&interval=10') == 200
+
+@pytest.mark.parametrize('freq, interval', [('HOURLY', 1), ('HOURLY', 4), ('MINUTELY', 1), ('SECONDLY', 60)])
+def test_query_equals_batch(server, sample, freq, interval):
+    result = server.query(freq = freq, interval = interval)
+    expected = aeth.calculate_intervals(sample, freq, interval = interval)
+    assert_same_table(result, expected, sample.BCKeys)
+
+def epoch_windows(sample, rule):
+    # means of windows counted from the epoch, in the calculate_intervals format
+    means = sample.df[sample.BCKeys].astype('float64').resample(rule, origin = 'epoch').mean().round(0)
+    starts = pd.DatetimeIndex(means.index)
+    return aeth.interval_table(starts, starts + pd.Timedelta(rule), means.reset_index(drop = True))
+
+@pytest.mark.parametrize('freq, interval, rule', [('HOURLY', 7, '7h'), ('HOURLY', 5, '5h'), ('MINUTELY', 7, '7min')])
+def test_other_lengths_are_epoch_aligned(server, sample, freq, interval, rule):
+    expected = epoch_windows(sample, rule)
+    assert_same_table(server.query(freq = freq, interval = interval), expected, sample.BCKeys)
+    # a start or end within a window returns the whole window
+    result = server.query(pd.Timestamp('2018-02-27 10:30'), pd.Timestamp('2018-02-27 16:10'), freq, interval)
+    inside = (expected.index > pd.Timestamp('2018-02-27 10:30')) & (expected['start'] <= pd.Timestamp('2018-02-27 16:10'))
+    assert_same_table(result, expected[inside], sample.BCKeys)
+
+def test_7_hourly_window_around_start(server, sample):
+    result = server.query(start = pd.Timestamp('2018-02-27 10:30'), freq = 'HOURLY', interval = 7)
+    assert result['start'].iloc[0] == pd.Timestamp('2018-02-27 06:00')
+    assert result.index[0] == pd.Timestamp('2018-02-27 13:00')
+    expected = sample.df.loc['2018-02-27 06:00':'2018-02-27 12:59', sample.BCKeys].mean().round(0)
+    np.testing.assert_array_equal(result[sample.BCKeys].iloc[0].to_numpy(dtype='float64'),
+                                  expected.to_numpy(dtype='float64'))
+
+def test_status_without_data(tmp_path):
+    data_path = tmp_path / 'data'
+    data_path.mkdir()
+    (data_path / 'empty.dat').write_bytes(b'')
+    catalog = aeth.FileCatalog(str(tmp_path / 'cache'), str(data_path) + '/', '*.dat', 'AE33')
+    server = aeth.IntervalServer(catalog, 'AE33')
+    server.refresh()
+    status = server.status()
+    assert status['first'] is None and status['last'] is None
+    catalog.entries['x'] = {'path': 'x', 'model': 'AE33', 'first': pd.Timestamp('2018-02-27'), 'last': None}
+    assert server.status()['last'] is None
+
+def test_segments_are_float64(server):
+    server.warm()
+    for segment in server.segments.values():
+        assert (segment['df'].dtypes == 'float64').all()
@@ -0,0 +1,56 @@
+# window_stats against pandas
+import numpy as np
+import pandas as pd
+import pytest
+
+import aeth
+
+STATS = ['count', 'mean', 'std', 'min', 'max', 'median', 'p5', 'p95']
+
+def pandas_stats(df):
+    # the STATS of a dataframe, as window_stats orders them (per key)
+    row = {}
+    for key in df.columns:
+        values = df[key]
+        for stat, value in [('count', values.count()), ('mean', values.mean()), ('std', values.std()),
+                            ('min', values.min()), ('max', values.max()), ('median', values.median()),
+                            ('p5', values.quantile(0.05)), ('p95', values.quantile(0.95))]:
+            row['{}_{}'.format(key, stat)] = value
+    return row
+
+def test_hourly_stats(sample):
+    keys = sample.BCKeys
+    result = aeth.calculate_intervals(sample, 'HOURLY', stats = STATS, decimals = 9)
+    df = sample.df[keys]
+    expected = pd.DataFrame([pandas_stats(group) for hour, group in df.groupby(df.index.floor('h'))])
+    assert list(result.columns[1:]) == list(expected.columns)
+    np.testing.assert_allclose(result[expected.columns].to_numpy(dtype='float64'),
+                               expected.to_numpy(dtype='float64'), rtol = 1e-9, atol = 1e-6)
+
+def test_overlapping_windows(sample):
+    # unsorted and overlapping windows, both ends included, some without samples
+    keys = ['BC6', 'BB']
+    df = sample.df[keys].copy()
+    df.iloc[::7, 0] = np.nan
+    rng = np.random.default_rng(0)
+    first = df.index[0]
+    starts = first + pd.to_timedelta(rng.integers(-60, 1500, 50), unit='min')
+    ends = starts + pd.to_timedelta(rng.integers(0, 300, 50), unit='min')
+    result = aeth.window_stats(df, keys, starts, ends, STATS, closed = 'both', decimals = 9)
+    expected = pd.DataFrame([pandas_stats(df.loc[start:end]) for start, end in zip(starts, ends)])
+    np.testing.assert_allclose(result[expected.columns].to_numpy(dtype='float64'),
+                               expected.to_numpy(dtype='float64'), rtol = 1e-9, atol = 1e-6)
+
+def test_quantiles_in_batches(sample):
+    # windows expanded max_rows samples at a time (a longer window alone) give the same quantiles
+    keys = ['BC6', 'BB']
+    df = sample.df[keys].copy()
+    df.iloc[::5, 1] = np.nan
+    starts = list(df.index[::60]) + [df.index[0]]
+    ends = list(df.index[59::60]) + [df.index[-1]]
+    stats = ['median', 'p5', 'p95']
+    exact = aeth.window_stats(df, keys, starts, ends, stats, decimals = 9)
+    batched = aeth.window_stats(df, keys, starts, ends, stats, decimals = 9, max_rows = 100)
+    pd.testing.assert_frame_equal(batched, exact)
+    assert exact['BC6_median'].iloc[-1] == df['BC6'].median()
+    assert exact['BB_p95'].iloc[-1] == df['BB'].quantile(0.95)
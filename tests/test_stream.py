@@ -0,0 +1,41 @@
+# Streaming modes against calculate_intervals (aligned windows)
+import numpy as np
+import pandas as pd
+import pytest
+
+import aeth
+from conftest import SAMPLE
+
+LEVELS = [('HOURLY', 1), ('HOURLY', 5), ('MINUTELY', 1), ('MINUTELY', 10), ('SECONDLY', 90)]
+
+def assert_same_table(result, expected, keys):
+    np.testing.assert_array_equal(result.index.to_numpy(dtype='datetime64[ns]'),
+                                  expected.index.to_numpy(dtype='datetime64[ns]'))
+    np.testing.assert_array_equal(result['start'].to_numpy(dtype='datetime64[ns]'),
+                                  expected['start'].to_numpy(dtype='datetime64[ns]'))
+    np.testing.assert_array_equal(result[keys].to_numpy(dtype='float64'), expected[keys].to_numpy(dtype='float64'))
+
+@pytest.mark.parametrize('freq, interval', LEVELS)
+def test_stream_equals_batch(sample, freq, interval):
+    keys = sample.BCKeys
+    rows = aeth.stream_intervals([SAMPLE], freq = freq, interval = interval, chunksize = 97,
+                                 **aeth.stream_options(keys))
+    result = pd.concat(list(rows))
+    expected = aeth.calculate_intervals(sample, freq, interval = interval)
+    assert_same_table(result, expected, keys)
+
+def test_record_parser_equals_batch(sample):
+    # records of a live stream, fed in blocks cutting lines
+    keys = sample.BCKeys
+    with open(SAMPLE, 'rb') as f:
+        text = f.read()
+    parser = aeth.RecordParser('AE33', **aeth.stream_options(keys))
+    accumulator = aeth.IntervalAccumulator(keys, 'MINUTELY', 10)
+    frames = []
+    for i in range(0, len(text), 4096):
+        df = parser.feed(text[i:i + 4096])
+        if df is not None:
+            frames.append(accumulator.add(df))
+    frames.append(accumulator.flush())
+    expected = aeth.calculate_intervals(sample, 'MINUTELY', interval = 10)
+    assert_same_table(pd.concat(frames), expected, keys)